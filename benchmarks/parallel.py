@@ -0,0 +1,97 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Parallel Benchmark
+
+Matches synthetic events against synthetic rules with ParallelMatcher at increasing worker counts
+and reports throughput and speedup over a single worker:
+
+    python benchmarks/parallel.py --events 200000 --rules 200
+"""
+import argparse
+import os
+import random
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import RuleSet
+from sigma.backends.dictquery.parallel import ParallelMatcher
+
+RULE = """
+title: Rule {index}
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: event{event}
+        username|contains: user{user}
+    filter:
+        sourceip|startswith: '10.'
+    condition: sel and not filter
+"""
+
+
+def make_rules(count: int) -> SigmaCollection:
+    """Collection of count generated rules over a few shared event names and users."""
+    return SigmaCollection.from_yaml(
+        "---".join(
+            RULE.format(index=index, event=index % 50, user=index % 97)
+            for index in range(count)
+        )
+    )
+
+
+def make_events(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """count random events, the same for the same seed."""
+    rng = random.Random(seed)
+    return [
+        {
+            "eventname": f"event{rng.randrange(60)}",
+            "username": f"user{rng.randrange(120)}@example.com",
+            "sourceip": f"{rng.choice((10, 172, 192))}.0.{rng.randrange(256)}.1",
+        }
+        for _ in range(count)
+    ]
+
+
+def main() -> None:
+    """Print the throughput of ParallelMatcher for 1 up to max-workers processes."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--rules", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    ruleset = RuleSet.from_collection(make_rules(args.rules), substring_prefilter=True)
+    events = make_events(args.events)
+
+    workers = [1]
+    while workers[-1] * 2 <= args.max_workers:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != args.max_workers:
+        workers.append(args.max_workers)
+
+    baseline = None
+    print(f"{'workers':>8} {'seconds':>9} {'events/s':>12} {'speedup':>8}")
+    for count in workers:
+        with ParallelMatcher(ruleset, count, args.chunk_size) as matcher:
+            # start every worker process before timing
+            for _ in matcher.match(events[: count * args.chunk_size]):
+                pass
+            start = time.perf_counter()
+            for _ in matcher.match(events):
+                pass
+            elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(
+            f"{count:>8} {elapsed:>9.3f} {args.events / elapsed:>12.0f} {baseline / elapsed:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Benchmark Suite
+
+Measures conversion time per rule, evaluation time per event for every expression type the backend
+emits, and peak memory, and writes the results as JSON. All metrics are "lower is better". Compare
+against a previous run to catch regressions, e.g. after upgrading pySigma or dictquery:
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --baseline baseline.json --threshold 0.25
+
+The second run exits with status 1 if any metric is more than 25% worse than in the baseline.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from importlib import metadata
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import dictquery
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import DictQueryBackend
+
+RULE = """
+title: Rule {index}
+id: 00000000-0000-4000-8000-{index:012d}
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: event{index}
+        CommandLine|contains|all:
+            - '-enc'
+            - payload{index}
+    filter:
+        user|re: 'svc_[a-z]+{index}'
+    condition: sel and not filter
+"""
+
+# Expression type -> (detection, matching event)
+EXPRESSIONS = {
+    "eq": ("field: value", {"field": "value"}),
+    "like": ("field|contains: alu", {"field": "value"}),
+    "match": ("field|re: 'v.*e$'", {"field": "value"}),
+    "in": ("field: [one, two, three, value]", {"field": "value"}),
+    "lt": ("field|lt: 10", {"field": 5}),
+    "lte": ("field|lte: 10", {"field": 5}),
+    "gt": ("field|gt: 1", {"field": 5}),
+    "gte": ("field|gte: 1", {"field": 5}),
+    "null": ("field: null", {"other": "value"}),
+    "exists": ("field|exists: true", {"field": "value"}),
+}
+
+EXPRESSION_RULE = """
+title: Expression
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        {detection}
+    condition: sel
+"""
+
+
+def collection(size: int) -> SigmaCollection:
+    """Collection of size generated rules mixing the expression types the backend emits."""
+    return SigmaCollection.from_yaml(
+        "---".join(RULE.format(index=index) for index in range(size))
+    )
+
+
+def best_of(function: Callable[[], Any], repeat: int, number: int = 1) -> float:
+    """Fastest of repeat runs of number calls, in seconds per call."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+
+def peak_memory(function: Callable[[], Any]) -> int:
+    """Peak traced memory allocated while running function, in bytes."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_conversion(sizes: List[int], repeat: int) -> Dict[str, float]:
+    """Conversion time per rule and peak memory for collections of each size."""
+    results = {}
+    for size in sizes:
+        rules = collection(size)
+        rounds = repeat if size < 1000 else 1
+        seconds = best_of(lambda: DictQueryBackend().convert(rules), rounds)
+        results[f"convert.{size}.seconds_per_rule"] = seconds / size
+        results[f"convert.{size}.peak_bytes"] = peak_memory(
+            lambda: DictQueryBackend().convert(rules)
+        )
+    return results
+
+
+def bench_evaluation(events: int, repeat: int) -> Dict[str, float]:
+    """Evaluation time per event of each expression type with dictquery and python_callable."""
+    results = {}
+    backend = DictQueryBackend()
+    for name, (detection, event) in EXPRESSIONS.items():
+        rules = SigmaCollection.from_yaml(EXPRESSION_RULE.format(detection=detection))
+        query = backend.convert(rules)[0]
+        function = backend.convert(rules, "python_callable")[0]
+        if not function(event):
+            raise AssertionError(f"Benchmark event doesn't match {query}")
+        results[f"evaluate.python_callable.{name}.seconds_per_event"] = best_of(
+            lambda: function(event), repeat, events
+        )
+        try:
+            compiled = dictquery.compile(query)
+        except Exception:  # dictquery can't parse some backend output, e.g. "is null"
+            continue
+        results[f"evaluate.dictquery.{name}.seconds_per_event"] = best_of(
+            lambda: compiled.match(event), repeat, events
+        )
+    rules = collection(100)
+    ruleset = backend.convert(rules, "ruleset")
+    event = {"eventname": "event50", "CommandLine": "x -enc payload50", "user": "root"}
+    results["evaluate.ruleset.100.seconds_per_event"] = best_of(
+        lambda: ruleset.match(event), repeat, max(events // 10, 1)
+    )
+    results["evaluate.ruleset.100.peak_bytes"] = peak_memory(
+        lambda: [ruleset.match(event) for _ in range(1000)]
+    )
+    return results
+
+
+def version(name: str) -> Optional[str]:
+    """Installed version of a distribution, None if it isn't installed."""
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def compare(
+    results: Dict[str, float], baseline: Dict[str, float], threshold: float
+) -> List[str]:
+    """Descriptions of all metrics more than threshold worse than in baseline."""
+    regressions = []
+    for name, value in results.items():
+        previous = baseline.get(name)
+        if previous and value > previous * (1 + threshold):
+            regressions.append(
+                f"{name}: {value:.4g} vs {previous:.4g} ({value / previous - 1:+.0%})"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the suite, write the results and compare them against a baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1, 100, 10000],
+        help="rule collection sizes to convert (default: 1 100 10000)",
+    )
+    parser.add_argument(
+        "--events",
+        type=int,
+        default=10000,
+        help="events evaluated per measurement (default: 10000)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="measurements per metric, the best counts"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument(
+        "--baseline", help="JSON results of a previous run to compare to"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative slowdown or memory growth counted as regression (default: 0.2)",
+    )
+    args = parser.parse_args(argv)
+
+    results: Dict[str, float] = {}
+    results.update(bench_conversion(args.sizes, args.repeat))
+    results.update(bench_evaluation(args.events, args.repeat))
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pysigma": version("pysigma"),
+            "dictquery": version("dictquery"),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
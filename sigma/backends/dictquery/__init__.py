@@ -2,6 +2,7 @@
 Unqork Security - Threat Detection and Response - PySigma DictQuery Backend
 """
 from .dictquery import DictQueryBackend
+from .ruleset import RuleSet
 
 backends = {  # Mapping between backend identifiers and classes. This is used by the pySigma plugin system to recognize backends and expose them with the identifier.
     "dictquery": DictQueryBackend,
@@ -0,0 +1,568 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Aggregations
+"""
+import math
+import operator
+import re
+import time
+from collections import OrderedDict
+from collections import deque
+from collections.abc import Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaConditionError
+from sigma.rule import SigmaRule
+
+from sigma.backends.dictquery.expression import Expression
+from sigma.backends.dictquery.ruleset import RuleSet
+from sigma.backends.dictquery.runtime import field_keys
+from sigma.backends.dictquery.runtime import lookup
+
+FUNCTIONS = ("count", "sum", "avg", "min", "max")
+COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+}
+# Seconds per timeframe unit, a month counts as 30 days
+TIMEFRAME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "M": 30 * 86400}
+TIMEFRAME_PATTERN = re.compile(r"^\s*(\d+)\s*([smhdM])\s*$")
+AGGREGATION_PATTERN = re.compile(
+    r"^\s*(?P<function>\w+)\(\s*(?P<field>[^()\s]*)\s*\)"
+    r"(?:\s+by\s+(?P<group_by>[^<>=]+?))?"
+    r"\s*(?P<op><=|>=|==|=|<|>)\s*(?P<threshold>-?\d+(?:\.\d+)?)\s*$"
+)
+
+
+@dataclass(frozen=True)
+class Aggregation:
+    """
+    Aggregation - the part of a condition after the pipe, e.g. ``count() by user > 10``
+
+    function is one of count, sum, avg, min or max over field; ``count(field)`` counts the distinct
+    values of field. timeframe is the length of the sliding window in seconds, None if the rule has
+    no timeframe.
+    """
+
+    function: str
+    field: Optional[str]
+    group_by: Tuple[str, ...]
+    op: str
+    threshold: float
+    timeframe: Optional[float] = None
+
+    def compare(self, value: float) -> bool:
+        """Check the aggregated value against the threshold."""
+        return COMPARISONS[self.op](value, self.threshold)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable aggregation spec."""
+        return {
+            "function": self.function,
+            "field": self.field,
+            "group_by": list(self.group_by),
+            "op": self.op,
+            "threshold": self.threshold,
+            "timeframe": self.timeframe,
+        }
+
+
+@dataclass(frozen=True)
+class AggregationRule:
+    """Converted rule condition: the dictquery filter and the aggregation of the events it matches."""
+
+    rule: str
+    query: str
+    expression: Expression
+    aggregation: Optional[Aggregation]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable filter query and aggregation spec."""
+        return {
+            "id": self.rule,
+            "query": self.query,
+            "aggregation": None
+            if self.aggregation is None
+            else self.aggregation.to_dict(),
+        }
+
+
+@dataclass(frozen=True)
+class Alert:
+    """A rule firing: for aggregations, the group that crossed the threshold and its value."""
+
+    rule: str
+    group: Dict[str, Any]
+    value: Optional[float]
+    timestamp: float
+
+
+def parse_timeframe(text: str) -> float:
+    """Seconds of a Sigma timeframe such as ``30s``, ``5m``, ``12h`` or ``7d``."""
+    match = TIMEFRAME_PATTERN.match(str(text))
+    if match is None:
+        raise SigmaConditionError(
+            f"Invalid timeframe '{text}', expected a number followed by s, m, h, d or M"
+        )
+    seconds = int(match.group(1)) * TIMEFRAME_UNITS[match.group(2)]
+    if seconds <= 0:
+        raise SigmaConditionError(
+            f"Invalid timeframe '{text}', must be longer than zero"
+        )
+    return seconds
+
+
+def parse_aggregation(text: str, timeframe: Optional[float] = None) -> Aggregation:
+    """Parse the aggregation expression following the pipe of a condition."""
+    match = AGGREGATION_PATTERN.match(text)
+    if match is None or match["function"] not in FUNCTIONS:
+        raise SigmaConditionError(
+            f"Unsupported aggregation '{text.strip()}', expected e.g. 'count() by user > 10'"
+        )
+    function, field = match["function"], match["field"] or None
+    if field is None and function != "count":
+        raise SigmaConditionError(f"Aggregation {function}() requires a field")
+    group_by = match["group_by"]
+    return Aggregation(
+        function,
+        field,
+        tuple(name.strip() for name in group_by.split(",")) if group_by else (),
+        "==" if match["op"] == "=" else match["op"],
+        float(match["threshold"]),
+        timeframe,
+    )
+
+
+def rule_timeframe(rule: SigmaRule) -> Optional[float]:
+    """Timeframe of a rule, given in its detection or at the top level."""
+    detection = rule.detection.detections.get("timeframe")
+    if detection is not None:
+        return parse_timeframe(str(detection.detection_items[0].value[0]))
+    if "timeframe" in rule.custom_attributes:
+        return parse_timeframe(rule.custom_attributes["timeframe"])
+    return None
+
+
+@contextmanager
+def split_aggregations(rule: SigmaRule) -> Iterator[List[Optional[Aggregation]]]:
+    """
+    Split the aggregations off the conditions of rule, yielding one per condition (None for plain
+    conditions). pySigma rejects the pipe syntax, so within the context the conditions are just
+    their filter part and the timeframe is no detection; the rule is restored afterwards. Field
+    mappings of the processing pipeline don't apply to aggregation and group-by fields.
+    """
+    conditions = rule.detection.parsed_condition
+    originals = [cond.condition for cond in conditions]
+    detections = rule.detection.detections
+    try:
+        aggregations: List[Optional[Aggregation]] = [None] * len(conditions)
+        if any("|" in condition for condition in originals):
+            timeframe = rule_timeframe(rule)
+            for index, cond in enumerate(conditions):
+                if "|" in cond.condition:
+                    condition, _, aggregation = cond.condition.partition("|")
+                    cond.condition = condition.strip()
+                    aggregations[index] = parse_aggregation(aggregation, timeframe)
+            rule.detection.detections = {
+                name: detection
+                for name, detection in detections.items()
+                if name != "timeframe"
+            }
+        yield aggregations
+    finally:
+        for cond, condition in zip(conditions, originals):
+            cond.condition = condition
+        rule.detection.detections = detections
+
+
+def freeze(value: Any) -> Any:
+    """Hashable equivalent of a field value, lists and mappings become tuples."""
+    if isinstance(value, (list, tuple)):
+        return tuple(map(freeze, value))
+    elif isinstance(value, Mapping):
+        return tuple((key, freeze(item)) for key, item in value.items())
+    return value
+
+
+def event_time(value: Any) -> Optional[float]:
+    """Seconds since the epoch of a number or an ISO 8601 string, else None."""
+    if isinstance(value, bool):
+        return None
+    elif isinstance(value, (int, float)):
+        return float(value)
+    elif isinstance(value, str):
+        try:
+            # fromisoformat only accepts the Z suffix from Python 3.11 on
+            parsed = datetime.fromisoformat(
+                value[:-1] + "+00:00" if value.endswith("Z") else value
+            )
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+class WindowCounter:
+    """
+    WindowCounter - count, sum, minimum and maximum of the values of one group in a sliding window
+
+    The window is split into buckets of a fixed width, so a group holds at most one entry per
+    bucket however many events it sees, and values stay in the window for its length rounded up to
+    the bucket width.
+    """
+
+    __slots__ = ("buckets", "count", "total", "expires", "firing")
+
+    def __init__(self):
+        # [bucket, count, sum, minimum, maximum], oldest first
+        self.buckets: Deque[List[Any]] = deque()
+        self.count = 0
+        self.total = 0.0
+        self.expires = 0.0
+        self.firing = False
+
+    def add(self, values: List[float], now: float, width: float, horizon: int) -> None:
+        """Add values seen at now, dropping the buckets that left the window."""
+        bucket = int(now // width)
+        buckets = self.buckets
+        if buckets and buckets[-1][0] > bucket:
+            bucket = buckets[-1][0]  # late values count in the newest bucket
+        while buckets and buckets[0][0] <= bucket - horizon:
+            _, count, total, _, _ = buckets.popleft()
+            self.count -= count
+            self.total -= total
+        if not buckets or buckets[-1][0] != bucket:
+            buckets.append([bucket, 0, 0.0, math.inf, -math.inf])
+        entry = buckets[-1]
+        entry[1] += len(values)
+        entry[2] += sum(values)
+        entry[3] = min(entry[3], *values)
+        entry[4] = max(entry[4], *values)
+        self.count += len(values)
+        self.total += sum(values)
+        self.expires = (bucket + horizon) * width
+
+    def value(self, function: str) -> float:
+        """Aggregated value of the window."""
+        if function == "count":
+            return self.count
+        elif function == "sum":
+            return self.total
+        elif function == "avg":
+            return self.total / self.count
+        elif function == "min":
+            return min(entry[3] for entry in self.buckets)
+        return max(entry[4] for entry in self.buckets)
+
+
+class DistinctCounter:
+    """
+    DistinctCounter - distinct values of one group in a sliding window, for ``count(field)``
+
+    Holds each value with the time it was last seen, at most max_values of them: beyond that the
+    values seen longest ago are dropped first, so the count saturates at max_values.
+    """
+
+    __slots__ = ("seen", "expires", "firing")
+
+    def __init__(self):
+        self.seen: "OrderedDict[Any, float]" = OrderedDict()
+        self.expires = 0.0
+        self.firing = False
+
+    def add(
+        self, values: List[Any], now: float, timeframe: Optional[float], max_values: int
+    ) -> None:
+        """Add values seen at now, dropping those that left the window."""
+        seen = self.seen
+        for value in values:
+            seen.pop(value, None)
+            seen[value] = now
+        while len(seen) > max_values:
+            seen.popitem(last=False)
+        if timeframe is not None:
+            horizon = now - timeframe
+            while seen and next(iter(seen.values())) <= horizon:
+                seen.popitem(last=False)
+            self.expires = now + timeframe
+        else:
+            self.expires = math.inf
+
+    def value(self, function: str) -> float:
+        """Number of distinct values in the window."""
+        return len(self.seen)
+
+
+Counter = Union[WindowCounter, DistinctCounter]
+
+
+class WindowedAggregator:
+    """
+    WindowedAggregator - sliding window counters per group-by key of one aggregation
+
+    Groups are kept in the order they were last updated. Groups with nothing left in the window are
+    dropped, and beyond max_keys groups the one updated longest ago is evicted, so memory stays
+    bounded however many distinct keys the events carry. An evicted group starts from zero if it
+    shows up again. The aggregation fires when its comparison becomes true for a group and again
+    only after it was false for that group.
+    """
+
+    def __init__(
+        self,
+        aggregation: Aggregation,
+        buckets: int = 60,
+        max_keys: int = 100000,
+        max_values: int = 10000,
+    ):
+        self.aggregation = aggregation
+        self.function = aggregation.function
+        self.distinct = (
+            aggregation.function == "count" and aggregation.field is not None
+        )
+        self.field_keys = (
+            None if aggregation.field is None else field_keys(aggregation.field)
+        )
+        self.group_keys = [field_keys(field) for field in aggregation.group_by]
+        self.timeframe = aggregation.timeframe
+        # Without a timeframe the window never ends: one bucket that is never dropped
+        self.width = math.inf if self.timeframe is None else self.timeframe / buckets
+        self.horizon = buckets
+        self.max_keys = max_keys
+        self.max_values = max_values
+        self.groups: "OrderedDict[Tuple[Any, ...], Counter]" = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def values(self, event: Any, fields: Dict[Tuple[str, ...], List[Any]]) -> List[Any]:
+        """Values the event adds to its group, none if it doesn't count."""
+        if self.field_keys is None:
+            return [1]
+        values = lookup(fields, event, self.field_keys)
+        if self.distinct:
+            return list(map(freeze, values))
+        return [
+            value
+            for value in values
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+
+    def group(
+        self, event: Any, fields: Dict[Tuple[str, ...], List[Any]]
+    ) -> Tuple[Any, ...]:
+        """Group-by key of the event, the value of each group-by field (None if missing)."""
+        key = []
+        for keys in self.group_keys:
+            values = lookup(fields, event, keys)
+            if not values:
+                key.append(None)
+            else:
+                key.append(freeze(values[0]) if len(values) == 1 else freeze(values))
+        return tuple(key)
+
+    def expire(self, now: float) -> None:
+        """Drop the groups with nothing left in the window."""
+        groups = self.groups
+        while groups:
+            key, counter = next(iter(groups.items()))
+            if counter.expires > now:
+                break
+            del groups[key]
+            self.expired += 1
+
+    def update(
+        self, event: Any, fields: Dict[Tuple[str, ...], List[Any]], now: float
+    ) -> Optional[Tuple[Tuple[Any, ...], float]]:
+        """
+        Add an event matching the rule condition, returning its group key and aggregated value if
+        the aggregation fires.
+        """
+        values = self.values(event, fields)
+        if not values:
+            return None
+        key = self.group(event, fields)
+        self.expire(now)
+        counter = self.groups.pop(key, None)
+        if counter is None:
+            counter = DistinctCounter() if self.distinct else WindowCounter()
+            if len(self.groups) >= self.max_keys:
+                self.groups.popitem(last=False)
+                self.evicted += 1
+        self.groups[key] = counter
+        if self.distinct:
+            counter.add(values, now, self.timeframe, self.max_values)
+        else:
+            counter.add(values, now, self.width, self.horizon)
+        value = counter.value(self.function)
+        if not self.aggregation.compare(value):
+            counter.firing = False
+        elif not counter.firing:
+            counter.firing = True
+            return key, value
+        return None
+
+
+class AggregationEngine:
+    """
+    AggregationEngine - streaming evaluation of rules with count/sum/avg/min/max aggregations
+
+    Built from the ``aggregation`` output format, usually with ``DictQueryBackend().convert(
+    collection, "aggregation")``. The filters of all rules are matched in one pass by a RuleSet; each
+    condition with an aggregation keeps sliding window counters per group-by key (see
+    WindowedAggregator), rules without one fire on every matching event. Event time is read from
+    time_field (seconds since the epoch or an ISO 8601 string), or passed to process; without either
+    the wall clock is used, and events without a valid time count at the latest time seen.
+
+    Memory is bounded by max_keys groups per aggregation, max_values distinct values per group for
+    ``count(field)`` and buckets entries per group for the other functions. Groups idle for their
+    timeframe are dropped as time advances.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[AggregationRule],
+        case_sensitive: bool = True,
+        time_field: Optional[str] = None,
+        buckets: int = 60,
+        max_keys: int = 100000,
+        max_values: int = 10000,
+    ):
+        if buckets < 1 or max_keys < 1 or max_values < 1:
+            raise ValueError("buckets, max_keys and max_values must be at least 1")
+        self.rules = list(rules)
+        # Rule positions serve as ids, so each condition of a rule keeps its own aggregation
+        self.ruleset = RuleSet(
+            [(position, rule.expression) for position, rule in enumerate(self.rules)],
+            case_sensitive=case_sensitive,
+        )
+        self.aggregators: Dict[int, WindowedAggregator] = {
+            position: WindowedAggregator(
+                rule.aggregation, buckets, max_keys, max_values
+            )
+            for position, rule in enumerate(self.rules)
+            if rule.aggregation is not None
+        }
+        self.time_keys = None if time_field is None else field_keys(time_field)
+        self.now: Optional[float] = None
+        # Idle groups of all aggregations are dropped once per smallest bucket width of event time
+        self.sweep_interval = min(
+            (aggregator.width for aggregator in self.aggregators.values()),
+            default=math.inf,
+        )
+        self.swept = -math.inf
+
+    @classmethod
+    def from_collection(
+        cls,
+        rule_collection: SigmaCollection,
+        backend: Optional[Any] = None,
+        **options: Any,
+    ) -> "AggregationEngine":
+        """Convert a collection with the given (or a default) backend into an engine."""
+        if backend is None:
+            from sigma.backends.dictquery.dictquery import DictQueryBackend
+
+            backend = DictQueryBackend()
+        options = {"case_sensitive": backend.case_sensitive, **options}
+        return cls(
+            [
+                query
+                for rule in rule_collection.rules
+                for query in backend.convert_rule(rule, "aggregation")
+            ],
+            **options,
+        )
+
+    def __len__(self) -> int:
+        """Number of groups held by all aggregations."""
+        return sum(map(len, self.aggregators.values()))
+
+    def specs(self) -> List[Dict[str, Any]]:
+        """Filter query and aggregation spec of every rule condition."""
+        return [rule.to_dict() for rule in self.rules]
+
+    def stats(self) -> Dict[str, int]:
+        """Groups held, and groups dropped because they expired or to stay within max_keys."""
+        aggregators = self.aggregators.values()
+        return {
+            "groups": len(self),
+            "expired": sum(aggregator.expired for aggregator in aggregators),
+            "evicted": sum(aggregator.evicted for aggregator in aggregators),
+        }
+
+    def timestamp(self, event: Any, fields: Dict[Tuple[str, ...], List[Any]]) -> float:
+        """Event time of event, see the class description."""
+        if self.time_keys is None:
+            now = time.time()
+        else:
+            values = lookup(fields, event, self.time_keys)
+            now = event_time(values[0]) if values else None
+            if now is None:
+                now = time.time() if self.now is None else self.now
+        if self.now is not None and now < self.now:
+            return self.now
+        self.now = now
+        return now
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """Drop the idle groups of all aggregations, as of now or the latest event time seen."""
+        now = self.now if now is None else now
+        if now is None:
+            return
+        for aggregator in self.aggregators.values():
+            aggregator.expire(now)
+        self.swept = now
+
+    def process(self, event: Any, timestamp: Optional[float] = None) -> List[Alert]:
+        """Alerts of all rules firing for event, in collection order."""
+        fields: Dict[Tuple[str, ...], List[Any]] = {}
+        positions = self.ruleset.match(event, fields)
+        if timestamp is None:
+            now = self.timestamp(event, fields)
+        else:
+            now = timestamp if self.now is None else max(timestamp, self.now)
+            self.now = now
+        if now - self.swept >= self.sweep_interval:
+            self.expire(now)
+        alerts = []
+        fired = set()
+        for position in positions:
+            rule = self.rules[position]
+            aggregator = self.aggregators.get(position)
+            if aggregator is None:
+                if rule.rule not in fired:
+                    fired.add(rule.rule)
+                    alerts.append(Alert(rule.rule, {}, None, now))
+                continue
+            result = aggregator.update(event, fields, now)
+            if result is not None:
+                key, value = result
+                group = dict(zip(rule.aggregation.group_by, key))
+                alerts.append(Alert(rule.rule, group, value, now))
+        return alerts
+
+    def process_events(self, events: Iterable[Any]) -> Iterator[Alert]:
+        """Alerts for a stream of events, lazily."""
+        for event in events:
+            yield from self.process(event)
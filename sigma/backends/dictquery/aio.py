@@ -0,0 +1,150 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Asyncio Matcher
+"""
+import asyncio
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any
+from typing import AsyncIterable
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from sigma.backends.dictquery.parallel import Chunk
+from sigma.backends.dictquery.parallel import _init_worker
+from sigma.backends.dictquery.parallel import _match_chunk
+from sigma.backends.dictquery.ruleset import RuleSet
+
+
+class _End:
+    """Queue sentinel closing a stream, carrying the error that ended the input if any."""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+def _match_with(ruleset: RuleSet, chunk: Chunk) -> List[Tuple[Any, str]]:
+    """Match a chunk of ``(key, event)`` pairs with ruleset."""
+    match = ruleset.match
+    return [(key, rule_id) for key, event in chunk for rule_id in match(event)]
+
+
+class AsyncMatcher:
+    """
+    AsyncMatcher - matches events from an async iterable without blocking the event loop
+
+    Events are read into a queue of at most queue_size events and taken from it in micro-batches:
+    whatever has queued up since the last batch, up to batch_size events. Each batch is evaluated
+    in an executor while the next one is collected, with at most max_batches batches in flight.
+    When either queue is full the input isn't read any further, so a burst is absorbed by
+    backpressure instead of memory. Batches are evaluated in a single worker thread by default;
+    pass processes to evaluate them in a process pool instead, which the rule set is sent to once.
+    """
+
+    def __init__(
+        self,
+        ruleset: RuleSet,
+        batch_size: int = 256,
+        queue_size: int = 1024,
+        max_batches: int = 4,
+        executor: Optional[Executor] = None,
+        processes: int = 0,
+    ):
+        if batch_size < 1 or queue_size < 1 or max_batches < 1:
+            raise ValueError(
+                "batch_size, queue_size and max_batches must be at least 1"
+            )
+        self.ruleset = ruleset
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.max_batches = max_batches
+        self.owned = executor is None
+        self.evaluate: Callable[[Chunk], List[Tuple[Any, str]]]
+        if processes:
+            if executor is not None:
+                raise ValueError("Either pass an executor or a number of processes")
+            self.executor: Executor = ProcessPoolExecutor(
+                processes, initializer=_init_worker, initargs=(ruleset,)
+            )
+            self.evaluate = _match_chunk
+        else:
+            self.executor = executor or ThreadPoolExecutor(
+                1, thread_name_prefix="dictquery"
+            )
+            self.evaluate = partial(_match_with, ruleset)
+
+    async def __aenter__(self) -> "AsyncMatcher":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the executor, unless it was passed in."""
+        if self.owned:
+            self.executor.shutdown(wait=False)
+
+    async def match(self, event: Any) -> List[str]:
+        """Ids of all rules matching a single event, evaluated in the executor."""
+        hits = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.evaluate, [(0, event)]
+        )
+        return [rule_id for _, rule_id in hits]
+
+    async def stream(
+        self, events: AsyncIterable[Any]
+    ) -> AsyncIterator[Tuple[Any, List[str]]]:
+        """Yield ``(event, ids of matching rules)`` for every matching event, in input order."""
+        loop = asyncio.get_running_loop()
+        inbox: asyncio.Queue = asyncio.Queue(self.queue_size)
+        outbox: asyncio.Queue = asyncio.Queue(self.max_batches)
+
+        async def read() -> None:
+            try:
+                async for event in events:
+                    await inbox.put(event)
+            except Exception as e:
+                await inbox.put(_End(e))
+            else:
+                await inbox.put(_End())
+
+        async def batches() -> None:
+            while True:
+                item = await inbox.get()
+                batch: List[Any] = []
+                while not isinstance(item, _End):
+                    batch.append(item)
+                    if len(batch) >= self.batch_size or inbox.empty():
+                        break
+                    item = inbox.get_nowait()
+                if batch:
+                    future = loop.run_in_executor(
+                        self.executor, self.evaluate, list(enumerate(batch))
+                    )
+                    await outbox.put((batch, future))
+                if isinstance(item, _End):
+                    await outbox.put(item)
+                    return
+
+        tasks = [asyncio.ensure_future(read()), asyncio.ensure_future(batches())]
+        try:
+            while True:
+                entry = await outbox.get()
+                if isinstance(entry, _End):
+                    if entry.error is not None:
+                        raise entry.error
+                    return
+                batch_events, future = entry
+                matches: Dict[int, List[str]] = {}
+                for position, rule_id in await future:
+                    matches.setdefault(position, []).append(rule_id)
+                for position, rule_ids in matches.items():
+                    yield batch_events[position], rule_ids
+        finally:
+            for task in tasks:
+                task.cancel()
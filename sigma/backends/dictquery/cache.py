@@ -0,0 +1,191 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Conversion Cache
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from importlib import metadata
+from pathlib import Path
+from typing import Any
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Union
+
+from sigma.collection import SigmaCollection
+from sigma.processing.pipeline import ProcessingPipeline
+
+# Bump when the layout of cache entries changes.
+CACHE_FORMAT = 1
+
+
+def distribution_version(name: str) -> str:
+    """Installed version of a distribution, or "unknown" when running from a source tree."""
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def rule_files(paths: Iterable[Union[str, Path]]) -> List[Path]:
+    """Rule files and the ``*.yml`` files below rule directories, directories in sorted order."""
+    files: List[Path] = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("**/*.yml")) if path.is_dir() else [path])
+    return files
+
+
+def read_documents(paths: Iterable[Union[str, Path]]) -> Iterable[str]:
+    """Text of every rule file in paths, see rule_files."""
+    for path in rule_files(paths):
+        yield path.read_text(encoding="utf-8")
+
+
+def format_pipeline(backend: Any, output_format: str) -> ProcessingPipeline:
+    """The processing pipeline backend applies for output_format."""
+    return (
+        backend.backend_processing_pipeline
+        + backend.processing_pipeline
+        + backend.output_format_processing_pipeline[output_format]
+    )
+
+
+class ConversionCache:
+    """
+    ConversionCache - on-disk cache of the per-rule conversion output of rule documents
+
+    Each YAML document (usually a rule file) is keyed by a hash of its text, the output format, the
+    backend and pySigma versions, the backend options and the configuration of the processing
+    pipelines, and its converted queries are stored in one file per key. Only documents that changed
+    are parsed and converted again. Entries are written to a temporary file and atomically renamed
+    into place, so several processes can share a cache directory and start at the same time. Output
+    formats whose queries can't be pickled, such as python_callable, are converted without being
+    cached.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        backend: Optional[Any] = None,
+        pipeline_key: Optional[str] = None,
+    ):
+        if backend is None:
+            from sigma.backends.dictquery.dictquery import DictQueryBackend
+
+            backend = DictQueryBackend()
+        self.directory = Path(directory)
+        self.backend = backend
+        self.pipeline_key = pipeline_key
+        self.hits = 0
+        self.misses = 0
+
+    def pipeline(self, output_format: str) -> ProcessingPipeline:
+        """The processing pipeline the backend applies for output_format."""
+        return format_pipeline(self.backend, output_format)
+
+    def prefix(self, output_format: str) -> bytes:
+        """Key material shared by all documents converted to output_format."""
+        pipeline_key = self.pipeline_key
+        if pipeline_key is None:
+            pipeline = self.pipeline(output_format)
+            pipeline_key = repr(
+                (
+                    pipeline.items,
+                    pipeline.postprocessing_items,
+                    pipeline.finalizers,
+                    pipeline.vars,
+                )
+            )
+        return repr(
+            (
+                CACHE_FORMAT,
+                output_format,
+                f"{self.backend.__class__.__module__}.{self.backend.__class__.__name__}",
+                getattr(self.backend, "conversion_key", lambda: None)(),
+                distribution_version("pySigma-backend-dictquery"),
+                distribution_version("pysigma"),
+                pipeline_key,
+            )
+        ).encode()
+
+    def path(self, key: str) -> Path:
+        """File of the entry with key, spread over subdirectories by the first key characters."""
+        return self.directory / key[:2] / f"{key}.pickle"
+
+    def load(self, key: str) -> Optional[List[Any]]:
+        """Cached queries of key, or None if there is no (readable) entry."""
+        try:
+            with open(self.path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def store(self, key: str, queries: List[Any]) -> None:
+        """Write an entry atomically, skipping queries that can't be pickled."""
+        try:
+            data = pickle.dumps(queries, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def convert_document(
+        self, document: str, output_format: str, prefix: bytes
+    ) -> List[Any]:
+        """Converted queries of one YAML document, from the cache if possible."""
+        key = hashlib.sha256(prefix + b"\0" + document.encode()).hexdigest()
+        queries = self.load(key)
+        if queries is not None:
+            self.hits += 1
+            return queries
+        self.misses += 1
+        errors = len(self.backend.errors)
+        collection = SigmaCollection.from_yaml(
+            document, collect_errors=self.backend.collect_errors
+        )
+        queries = [
+            query
+            for rule in collection.rules
+            for query in self.backend.convert_rule(rule, output_format)
+        ]
+        # Documents with parse errors, or conversion errors the backend collected, are converted
+        # again every time so their errors are reported on every run
+        if not any(rule.errors for rule in collection.rules) and errors == len(
+            self.backend.errors
+        ):
+            self.store(key, queries)
+        return queries
+
+    def queries(
+        self, documents: Iterable[str], output_format: str = "default"
+    ) -> List[Any]:
+        """Per-rule queries of all YAML documents, as backend.convert_rule returns them."""
+        prefix = self.prefix(output_format)
+        return [
+            query
+            for document in documents
+            for query in self.convert_document(document, output_format, prefix)
+        ]
+
+    def convert(self, documents: Iterable[str], output_format: str = "default") -> Any:
+        """Same as ``backend.convert(SigmaCollection.from_yaml(...), output_format)``, cached."""
+        queries = self.queries(documents, output_format)
+        # finalize applies the pipeline convert_rule would have set up, even if every rule was cached
+        self.backend.last_processing_pipeline = self.pipeline(output_format)
+        return self.backend.finalize(queries, output_format)
+
+    def convert_paths(
+        self, paths: Sequence[Union[str, Path]], output_format: str = "default"
+    ) -> Any:
+        """Convert rule files and directories, caching every file separately."""
+        return self.convert(read_documents(paths), output_format)
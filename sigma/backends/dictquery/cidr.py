@@ -0,0 +1,120 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend CIDR Table
+"""
+import ipaddress
+import socket
+from bisect import bisect_right
+from collections import Counter
+from typing import Any
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# Address family of each IP version, for socket.inet_pton
+FAMILIES = {4: socket.AF_INET, 6: socket.AF_INET6}
+EMPTY: FrozenSet[int] = frozenset()
+
+
+def parse_address(value: Any) -> Optional[Tuple[int, int]]:
+    """``(IP version, address as integer)`` of an IPv4 or IPv6 address string, else None."""
+    if not isinstance(value, str):
+        return None
+    for version, family in FAMILIES.items():
+        try:
+            return version, int.from_bytes(socket.inet_pton(family, value), "big")
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+class CidrTable:
+    """
+    CidrTable - merged, sorted interval table of the networks of the CIDR predicates on a field
+
+    Each predicate adds its networks and gets a key. The networks of all predicates are merged
+    into disjoint address intervals per IP version, each labelled with the keys of the predicates
+    covering it, so an address is parsed once and found with a single binary search no matter how
+    many networks or predicates there are. The table is (re)built on the first lookup after a
+    change. The keys matching the last list of values looked up are cached, so predicates sharing
+    the values of a field within one event don't parse them again.
+    """
+
+    def __init__(self):
+        self.keys: Dict[Tuple[str, ...], int] = {}
+        self.intervals: Dict[int, Tuple[List[int], List[FrozenSet[int]]]] = {}
+        self.built = True
+        self.last: Tuple[Any, FrozenSet[int]] = (None, EMPTY)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, networks: Iterable[str]) -> int:
+        """Key of the predicate testing for an address in any of networks."""
+        networks = tuple(networks)
+        key = self.keys.get(networks)
+        if key is None:
+            key = self.keys[networks] = len(self.keys)
+            self.built = False
+        return key
+
+    def build(self) -> None:
+        """Merge the networks of all predicates into the interval tables."""
+        bounds: Dict[int, List[Tuple[int, int, int]]] = {}
+        for networks, key in self.keys.items():
+            for network in map(ipaddress.ip_network, networks):
+                first = int(network.network_address)
+                last = int(network.broadcast_address)
+                bounds.setdefault(network.version, []).append((first, last, key))
+        intervals = {}
+        for version, ranges in bounds.items():
+            opening: Dict[int, List[int]] = {}
+            closing: Dict[int, List[int]] = {}
+            for first, last, key in ranges:
+                opening.setdefault(first, []).append(key)
+                closing.setdefault(last + 1, []).append(key)
+            active: Counter = Counter()
+            starts: List[int] = []
+            labels: List[FrozenSet[int]] = []
+            for point in sorted(opening.keys() | closing.keys()):
+                active.subtract(closing.get(point, ()))
+                active.update(opening.get(point, ()))
+                label = frozenset(key for key, count in active.items() if count > 0)
+                if labels and labels[-1] == label:
+                    continue
+                starts.append(point)
+                labels.append(label)
+            intervals[version] = (starts, labels)
+        self.intervals = intervals
+        self.built = True
+        self.last = (None, EMPTY)
+
+    def lookup(self, value: Any) -> FrozenSet[int]:
+        """Keys of the predicates with a network containing value."""
+        if not self.built:
+            self.build()
+        address = parse_address(value)
+        if address is None:
+            return EMPTY
+        version, number = address
+        table = self.intervals.get(version)
+        if table is None:
+            return EMPTY
+        starts, labels = table
+        index = bisect_right(starts, number) - 1
+        return labels[index] if index >= 0 else EMPTY
+
+    def matching(self, values: List[Any]) -> FrozenSet[int]:
+        """Keys of the predicates with a network containing any of values."""
+        last, keys = self.last
+        if last is values and self.built:
+            return keys
+        if len(values) == 1:
+            keys = self.lookup(values[0])
+        else:
+            keys = EMPTY.union(*map(self.lookup, values))
+        # Holding on to values keeps another list from reusing its identity
+        self.last = (values, keys)
+        return keys
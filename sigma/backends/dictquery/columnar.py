@@ -0,0 +1,324 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Columnar Evaluation
+
+Requires NumPy. Batches are a mapping from field name to a column (anything ``numpy.asarray``
+accepts) or a pyarrow Table, with one column per field. Dotted fields name flat columns, e.g. a
+``process.name`` column; nested values inside a column are not walked.
+"""
+import fnmatch
+import re
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Pattern
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery.cidr import CidrTable
+from sigma.backends.dictquery.expression import CIDR
+from sigma.backends.dictquery.expression import CONTAINS
+from sigma.backends.dictquery.expression import ENDSWITH
+from sigma.backends.dictquery.expression import EQ
+from sigma.backends.dictquery.expression import EXISTS
+from sigma.backends.dictquery.expression import GT
+from sigma.backends.dictquery.expression import GTE
+from sigma.backends.dictquery.expression import IN
+from sigma.backends.dictquery.expression import LIKE
+from sigma.backends.dictquery.expression import LT
+from sigma.backends.dictquery.expression import LTE
+from sigma.backends.dictquery.expression import MATCH
+from sigma.backends.dictquery.expression import NULL
+from sigma.backends.dictquery.expression import STARTSWITH
+from sigma.backends.dictquery.expression import And
+from sigma.backends.dictquery.expression import Expression
+from sigma.backends.dictquery.expression import Not
+from sigma.backends.dictquery.expression import Or
+from sigma.backends.dictquery.expression import Predicate
+from sigma.backends.dictquery.expression import walk
+from sigma.backends.dictquery.regex import RegexTable
+
+NUMERIC_KINDS = "biuf"
+STRING_KINDS = "US"
+
+compare_ufuncs = {
+    LT: np.less,
+    LTE: np.less_equal,
+    GT: np.greater,
+    GTE: np.greater_equal,
+}
+
+string_tests = {
+    STARTSWITH: (np.char.startswith, str.startswith),
+    ENDSWITH: (np.char.endswith, str.endswith),
+    CONTAINS: (
+        lambda column, literal: np.char.find(column, literal) >= 0,
+        lambda value, literal: literal in value,
+    ),
+}
+
+
+def _elementwise(column: np.ndarray, test) -> np.ndarray:
+    """Apply a Python test to every element, for columns NumPy can't compare natively."""
+    return np.fromiter((test(value) for value in column), dtype=bool, count=len(column))
+
+
+def _is_scalar_number(value: Any) -> bool:
+    """Plain numbers (and booleans) as they compare in dictquery."""
+    return isinstance(value, (int, float, np.number, np.bool_))
+
+
+def _present(column: np.ndarray) -> np.ndarray:
+    """Mask of rows holding a value, treating None and NaN as missing."""
+    if column.dtype.kind == "f":
+        return ~np.isnan(column)
+    elif column.dtype.kind == "O":
+        return _elementwise(column, lambda value: value is not None and value == value)
+    return np.ones(len(column), dtype=bool)
+
+
+def fold_operands(expr: Expression) -> Expression:
+    """Expression with the string operands of its predicates case folded, regexes excepted."""
+    if isinstance(expr, And):
+        return And(tuple(map(fold_operands, expr.args)))
+    elif isinstance(expr, Or):
+        return Or(tuple(map(fold_operands, expr.args)))
+    elif isinstance(expr, Not):
+        return Not(fold_operands(expr.arg))
+    elif expr.op in (MATCH, CIDR):
+        return expr
+    elif isinstance(expr.value, str):
+        return Predicate(expr.op, expr.field, expr.value.casefold())
+    elif isinstance(expr.value, tuple):
+        return Predicate(
+            expr.op,
+            expr.field,
+            tuple(
+                value.casefold() if isinstance(value, str) else value
+                for value in expr.value
+            ),
+        )
+    return expr
+
+
+def fold_column(column: np.ndarray) -> np.ndarray:
+    """Column with its strings case folded, other columns as they are."""
+    if column.dtype.kind == "U":
+        return np.array([value.casefold() for value in column.tolist()], dtype=str)
+    elif column.dtype.kind == "O":
+        folded = np.empty(len(column), dtype=object)
+        folded[:] = [
+            value.casefold() if isinstance(value, str) else value for value in column
+        ]
+        return folded
+    return column
+
+
+class ColumnarEvaluator:
+    """
+    ColumnarEvaluator - evaluates expression trees over columnar batches of events
+
+    Equality, IN, comparisons, null and exists checks as well as prefix, suffix and substring tests
+    on string columns are computed with NumPy array operations, LIKE and MATCH run their
+    precompiled pattern over the column, CIDR predicates look up each row of a field once in its
+    CidrTable, and AND, OR and NOT combine the
+    resulting boolean masks. Predicates shared between rules are computed once per batch.
+
+    With case_sensitive disabled, string operands are case folded once and the string columns of
+    the fields the rules use once per batch, as the python_callable format does per event; regular
+    expressions then ignore case.
+    """
+
+    def __init__(
+        self, rules: Sequence[Tuple[str, Expression]], case_sensitive: bool = True
+    ):
+        self.rules: List[Tuple[str, Expression]] = list(rules)
+        self.case_sensitive = case_sensitive
+        if not case_sensitive:
+            self.rules = [
+                (rule_id, fold_operands(expr)) for rule_id, expr in self.rules
+            ]
+        self.fields = {
+            node.field
+            for _, expr in self.rules
+            for node in walk(expr)
+            if isinstance(node, Predicate)
+        }
+        self.regexes = RegexTable()
+        self.globs: Dict[str, Pattern] = {}
+        self.networks: Dict[str, CidrTable] = {}
+        for _, expr in self.rules:
+            for node in walk(expr):
+                if isinstance(node, Predicate) and node.op == CIDR:
+                    self.networks.setdefault(node.field, CidrTable()).add(node.value)
+        self.cidr_keys: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def from_collection(
+        cls, rule_collection: SigmaCollection, backend: Optional[Any] = None
+    ) -> "ColumnarEvaluator":
+        """Convert a collection with the given (or a default) backend into an evaluator."""
+        if backend is None:
+            from sigma.backends.dictquery.dictquery import DictQueryBackend
+
+            backend = DictQueryBackend()
+        return backend.convert(rule_collection, "columnar")
+
+    def evaluate(self, batch: Any) -> Dict[str, np.ndarray]:
+        """Boolean mask per rule id over the rows of batch."""
+        columns = self.columns(batch)
+        length = len(next(iter(columns.values()))) if columns else 0
+        if not self.case_sensitive:
+            columns = {
+                name: fold_column(column) if name in self.fields else column
+                for name, column in columns.items()
+            }
+        memo: Dict[Expression, np.ndarray] = {}
+        masks: Dict[str, np.ndarray] = {}
+        for rule_id, expr in self.rules:
+            mask = self.mask(expr, columns, length, memo)
+            if rule_id in masks:
+                masks[rule_id] = masks[rule_id] | mask
+            else:
+                masks[rule_id] = mask
+        return masks
+
+    @staticmethod
+    def columns(batch: Any) -> Dict[str, np.ndarray]:
+        """Columns of a mapping or pyarrow Table as NumPy arrays."""
+        if hasattr(batch, "column_names"):  # pyarrow.Table
+            return {
+                name: batch.column(name).to_numpy(zero_copy_only=False)
+                for name in batch.column_names
+            }
+        elif isinstance(batch, Mapping):
+            return {name: np.asarray(column) for name, column in batch.items()}
+        raise TypeError(
+            "Columnar batches must be a mapping of columns or a pyarrow Table, not "
+            + batch.__class__.__name__
+        )
+
+    def mask(
+        self,
+        expr: Expression,
+        columns: Dict[str, np.ndarray],
+        length: int,
+        memo: Dict[Expression, np.ndarray],
+    ) -> np.ndarray:
+        """Boolean mask of expr, memoized per batch."""
+        mask = memo.get(expr)
+        if mask is not None:
+            return mask
+        if isinstance(expr, And):
+            mask = np.ones(length, dtype=bool)
+            for arg in expr.args:
+                mask = mask & self.mask(arg, columns, length, memo)
+        elif isinstance(expr, Or):
+            mask = np.zeros(length, dtype=bool)
+            for arg in expr.args:
+                mask = mask | self.mask(arg, columns, length, memo)
+        elif isinstance(expr, Not):
+            mask = ~self.mask(expr.arg, columns, length, memo)
+        else:
+            column = columns.get(expr.field)
+            if column is None:
+                mask = np.full(length, expr.op == NULL, dtype=bool)
+            else:
+                mask = self.predicate(expr, column)
+        memo[expr] = mask
+        return mask
+
+    def addresses(self, field: str, column: np.ndarray) -> np.ndarray:
+        """Keys of the CIDR predicates on field matching each row, computed once per column."""
+        cached = self.cidr_keys.get(field)
+        if cached is None or cached[0] is not column:
+            table = self.networks.setdefault(field, CidrTable())
+            keys = np.empty(len(column), dtype=object)
+            keys[:] = [table.lookup(value) for value in column]
+            cached = self.cidr_keys[field] = (column, keys)
+        return cached[1]
+
+    def predicate(self, pred: Predicate, column: np.ndarray) -> np.ndarray:
+        """Boolean mask of a single predicate over its column."""
+        kind = column.dtype.kind
+        if pred.op == EQ:
+            if kind in NUMERIC_KINDS:
+                if _is_scalar_number(pred.value):
+                    return np.asarray(column == pred.value, dtype=bool)
+                return np.zeros(len(column), dtype=bool)
+            elif kind in STRING_KINDS:
+                if isinstance(pred.value, str):
+                    return np.asarray(column == pred.value, dtype=bool)
+                return np.zeros(len(column), dtype=bool)
+            return _elementwise(column, lambda value: bool(value == pred.value))
+        elif pred.op == IN:
+            if kind in NUMERIC_KINDS:
+                choices = [value for value in pred.value if _is_scalar_number(value)]
+                return np.isin(column, choices)
+            elif kind in STRING_KINDS:
+                choices = [value for value in pred.value if isinstance(value, str)]
+                return np.isin(column, choices)
+            lookup = frozenset(pred.value)
+            return _elementwise(
+                column,
+                lambda value: value.__hash__ is not None and value in lookup,
+            )
+        elif pred.op in compare_ufuncs:
+            if kind in NUMERIC_KINDS:
+                return compare_ufuncs[pred.op](column, pred.value)
+            elif kind in STRING_KINDS:
+                return np.zeros(len(column), dtype=bool)
+            ufunc = compare_ufuncs[pred.op]
+            return _elementwise(
+                column,
+                lambda value: _is_scalar_number(value)
+                and bool(ufunc(value, pred.value)),
+            )
+        elif pred.op == NULL:
+            return ~_present(column)
+        elif pred.op == EXISTS:
+            if kind in NUMERIC_KINDS:
+                return _present(column) & (column != 0)
+            elif kind in STRING_KINDS:
+                return np.char.str_len(column) > 0
+            return _present(column) & _elementwise(column, bool)
+        elif pred.op in string_tests:
+            vectorized, test = string_tests[pred.op]
+            if kind == "U":
+                return np.asarray(vectorized(column, pred.value), dtype=bool)
+            elif kind == "O":
+                return _elementwise(
+                    column,
+                    lambda value: isinstance(value, str) and test(value, pred.value),
+                )
+            return np.zeros(len(column), dtype=bool)
+        elif pred.op == CIDR:
+            if kind in NUMERIC_KINDS:
+                return np.zeros(len(column), dtype=bool)
+            key = self.networks.setdefault(pred.field, CidrTable()).add(pred.value)
+            return _elementwise(
+                self.addresses(pred.field, column), lambda keys: key in keys
+            )
+        elif pred.op in (LIKE, MATCH):
+            if pred.op == LIKE:
+                pattern = self.globs.get(pred.value)
+                if pattern is None:
+                    pattern = self.globs[pred.value] = re.compile(
+                        fnmatch.translate(pred.value)
+                    )
+            else:
+                pattern = self.regexes.add(pred.field, pred.value)
+                if not self.case_sensitive:
+                    pattern = re.compile(pattern.pattern, pattern.flags | re.IGNORECASE)
+            if kind in NUMERIC_KINDS:
+                return np.zeros(len(column), dtype=bool)
+            return _elementwise(
+                column,
+                lambda value: isinstance(value, str)
+                and pattern.match(value) is not None,
+            )
+        raise NotImplementedError(f"Predicate operator '{pred.op}' is not supported.")
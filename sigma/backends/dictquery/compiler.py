@@ -0,0 +1,288 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Compiler
+"""
+import fnmatch
+import math
+import re
+from collections import Counter
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+
+from sigma.backends.dictquery import runtime
+from sigma.backends.dictquery.cidr import CidrTable
+from sigma.backends.dictquery.expression import CIDR
+from sigma.backends.dictquery.expression import CONTAINS
+from sigma.backends.dictquery.expression import ENDSWITH
+from sigma.backends.dictquery.expression import EQ
+from sigma.backends.dictquery.expression import EXISTS
+from sigma.backends.dictquery.expression import GT
+from sigma.backends.dictquery.expression import GTE
+from sigma.backends.dictquery.expression import IN
+from sigma.backends.dictquery.expression import LIKE
+from sigma.backends.dictquery.expression import LT
+from sigma.backends.dictquery.expression import LTE
+from sigma.backends.dictquery.expression import MATCH
+from sigma.backends.dictquery.expression import NULL
+from sigma.backends.dictquery.expression import STARTSWITH
+from sigma.backends.dictquery.expression import And
+from sigma.backends.dictquery.expression import Expression
+from sigma.backends.dictquery.expression import Not
+from sigma.backends.dictquery.expression import Or
+from sigma.backends.dictquery.expression import Predicate
+from sigma.backends.dictquery.expression import walk
+from sigma.backends.dictquery.regex import RegexTable
+
+
+class PythonCallableCompiler:
+    """
+    PythonCallableCompiler - compiles expression trees into plain Python functions
+
+    Each expression becomes the body of ``def match(event) -> bool``. Field keys, glob patterns and
+    IN lookups are prepared once at compile time and shared by every function built with the same
+    compiler instance. Regular expressions come from a RegexTable, which may be shared further.
+    Field lookups and sub-expressions that appear more than once are evaluated at most once per
+    call: the first occurrence stores the result in a local variable which later ones reuse. The
+    same goes for path prefixes shared by several fields, e.g. ``process`` of ``process.name`` and
+    ``process.pid``, which are walked once and continued from for each field.
+
+    Prefix, suffix and substring patterns are tested with ``str.startswith``, ``str.endswith`` and
+    ``in`` instead of a glob match. With case_sensitive disabled, string operands are case folded
+    at compile time and the values of a field once per lookup, like dictquery's
+    ``case_sensitive=False`` (which lower-cases instead of folding); regular expressions then
+    ignore case. The networks of all CIDR predicates on a field go into one CidrTable, which
+    parses the field's values once per call.
+    """
+
+    helpers: Dict[str, Callable] = {
+        "_get": runtime.query_value,
+        "_walk": runtime.query_values,
+        "_eq": runtime.eq,
+        "_like": runtime.like,
+        "_startswith": runtime.startswith,
+        "_endswith": runtime.endswith,
+        "_contains": runtime.contains,
+        "_fold": runtime.fold,
+        "_match": runtime.match,
+        "_in": runtime.is_in,
+        "_cidr": runtime.cidr,
+        "_lt": runtime.lt,
+        "_lte": runtime.lte,
+        "_gt": runtime.gt,
+        "_gte": runtime.gte,
+        "_exists": runtime.exists,
+        "_null": runtime.null,
+    }
+    value_ops: Dict[str, str] = {
+        EQ: "_eq",
+        LT: "_lt",
+        LTE: "_lte",
+        GT: "_gt",
+        GTE: "_gte",
+        STARTSWITH: "_startswith",
+        ENDSWITH: "_endswith",
+        CONTAINS: "_contains",
+    }
+
+    def __init__(
+        self, regexes: Optional[RegexTable] = None, case_sensitive: bool = True
+    ):
+        self.case_sensitive = case_sensitive
+        self.namespace: Dict[str, Any] = dict(self.helpers)
+        self.constants: Dict[Hashable, str] = {}
+        self.regexes = regexes if regexes is not None else RegexTable()
+        self.fields: Dict[str, str] = {}
+        self.nodes: Dict[Expression, str] = {}
+        self.prefixes: Dict[Tuple[str, ...], str] = {}
+        self.seeded: Set[str] = set()
+
+    def constant(self, key: Hashable, factory: Callable[[], Any]) -> str:
+        """Name of the shared constant for key, created by factory on first use."""
+        name = self.constants.get(key)
+        if name is None:
+            name = f"_c{len(self.constants)}"
+            self.constants[key] = name
+            self.namespace[name] = factory()
+        return name
+
+    def literal(self, value: Any) -> str:
+        """Source for a literal value."""
+        if isinstance(value, float) and not math.isfinite(value):
+            return self.constant(("float", repr(value)), lambda: value)
+        return repr(value)
+
+    def fold(self, value: Any) -> Any:
+        """Operand as compared at runtime, case folded unless matching is case-sensitive."""
+        if isinstance(value, str) and not self.case_sensitive:
+            return value.casefold()
+        return value
+
+    def share(self, exprs: Sequence[Expression], seeded: Iterable[str] = ()) -> None:
+        """
+        Allocate local variables for fields and nodes used more than once and for path prefixes
+        shared by several fields. Fields in seeded get one as well, which starts out with their
+        values from the ``fields`` mapping of paths resolved before the call, if present.
+        """
+        nodes = Counter(node for expr in exprs for node in walk(expr))
+        fields = Counter(
+            node.field
+            for node, count in nodes.items()
+            if isinstance(node, Predicate)
+            for _ in range(count)
+        )
+        # Values from outside aren't case folded, so case-insensitive lookups start from scratch
+        self.seeded = set(seeded) & set(fields) if self.case_sensitive else set()
+        self.nodes = {
+            node: f"_m{index}"
+            for index, node in enumerate(
+                node for node, count in nodes.items() if count > 1
+            )
+        }
+        self.fields = {
+            field: f"_f{index}"
+            for index, field in enumerate(
+                field
+                for field, count in fields.items()
+                if count > 1 or field in self.seeded
+            )
+        }
+        paths = Counter(
+            keys[:length]
+            for keys in map(runtime.field_keys, fields)
+            for length in range(1, len(keys) + 1)
+        )
+        self.prefixes = {
+            prefix: f"_p{index}"
+            for index, prefix in enumerate(
+                prefix for prefix, count in paths.items() if count > 1
+            )
+        }
+
+    def slots(self) -> List[str]:
+        """Source lines initializing the local variables allocated by share."""
+        lines = [
+            f"    {self.fields[field]} = fields.get({self.keys(field)})"
+            for field in sorted(self.seeded)
+        ]
+        slots = [
+            name for field, name in self.fields.items() if field not in self.seeded
+        ]
+        slots.extend(self.prefixes.values())
+        slots.extend(self.nodes.values())
+        if slots:
+            lines.append("    " + " = ".join(slots) + " = None")
+        return lines
+
+    @staticmethod
+    def memoized(name: Optional[str], source: str) -> str:
+        """Source evaluating source once, storing the result in the local variable name."""
+        if name is None:
+            return source
+        return f"({name} if {name} is not None else ({name} := {source}))"
+
+    def generate(self, expr: Expression) -> str:
+        """Python expression source, reusing the memoized result of shared nodes."""
+        return self.memoized(self.nodes.get(expr), self.generate_node(expr))
+
+    def generate_node(self, expr: Expression) -> str:
+        """Python expression source evaluating expr against the local name ``event``."""
+        if isinstance(expr, And):
+            if not expr.args:
+                return "True"
+            return "(" + " and ".join(self.generate(arg) for arg in expr.args) + ")"
+        elif isinstance(expr, Or):
+            if not expr.args:
+                return "False"
+            return "(" + " or ".join(self.generate(arg) for arg in expr.args) + ")"
+        elif isinstance(expr, Not):
+            return "(not " + self.generate(expr.arg) + ")"
+        return self.generate_predicate(expr)
+
+    def keys(self, field: str) -> str:
+        """Name of the constant holding the nested keys of field."""
+        return self.constant(("keys", field), lambda: runtime.field_keys(field))
+
+    def generate_path(self, keys: Tuple[str, ...]) -> str:
+        """Source looking up the values at a path, continuing from its longest shared prefix."""
+        for length in range(len(keys) - 1, 0, -1):
+            if keys[:length] in self.prefixes:
+                rest = self.constant(("path", keys[length:]), lambda: keys[length:])
+                lookup = f"_walk({self.generate_path(keys[:length])}, {rest})"
+                break
+        else:
+            lookup = f"_get(event, {self.constant(('path', keys), lambda: keys)})"
+        return self.memoized(self.prefixes.get(keys), lookup)
+
+    def generate_values(self, field: str) -> str:
+        """Source looking up all values of field, memoized if the field is shared."""
+        keys = runtime.field_keys(field)
+        if any(keys[:length] in self.prefixes for length in range(1, len(keys) + 1)):
+            lookup = self.generate_path(keys)
+        else:
+            lookup = f"_get(event, {self.keys(field)})"
+        if not self.case_sensitive:
+            lookup = f"_fold({lookup})"
+        return self.memoized(self.fields.get(field), lookup)
+
+    def generate_predicate(self, pred: Predicate) -> str:
+        """Source for a single predicate."""
+        values = self.generate_values(pred.field)
+        if pred.op in self.value_ops:
+            operand = self.literal(self.fold(pred.value))
+            return f"{self.value_ops[pred.op]}({values}, {operand})"
+        elif pred.op == LIKE:
+            glob = self.fold(pred.value)
+            pattern = self.constant(
+                (LIKE, glob), lambda: re.compile(fnmatch.translate(glob))
+            )
+            return f"_like({values}, {pattern})"
+        elif pred.op == MATCH:
+            compiled = self.regexes.add(pred.field, pred.value)
+            if self.case_sensitive:
+                pattern = self.constant((MATCH, pred.value), lambda: compiled)
+            else:
+                pattern = self.constant(
+                    (MATCH, "i", pred.value),
+                    lambda: re.compile(
+                        compiled.pattern, compiled.flags | re.IGNORECASE
+                    ),
+                )
+            return f"_match({values}, {pattern})"
+        elif pred.op == IN:
+            operands = tuple(self.fold(value) for value in pred.value)
+            choices = self.constant((IN, operands), lambda: operands)
+            lookup = self.constant(("lookup", operands), lambda: frozenset(operands))
+            return f"_in({values}, {choices}, {lookup})"
+        elif pred.op == CIDR:
+            table = self.constant((CIDR, pred.field), CidrTable)
+            key = self.namespace[table].add(pred.value)
+            return f"_cidr({values}, {table}, {key})"
+        elif pred.op == EXISTS:
+            return f"_exists({values})"
+        elif pred.op == NULL:
+            return f"_null({values})"
+        raise NotImplementedError(f"Predicate operator '{pred.op}' is not supported.")
+
+    def source(self, expr: Expression, name: str = "match") -> str:
+        """Source of the function definition for expr."""
+        self.share([expr])
+        lines = [
+            f"def {name}(event):",
+            *self.slots(),
+            f"    return {self.generate(expr)}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def compile(self, expr: Expression, name: str = "match") -> Callable[[Any], bool]:
+        """Compile expr into ``def match(event) -> bool``."""
+        code = compile(self.source(expr, name), f"<dictquery {name}>", "exec")
+        scope: Dict[str, Any] = {}
+        exec(code, self.namespace, scope)
+        return scope[name]
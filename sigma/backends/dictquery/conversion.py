@@ -0,0 +1,274 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Parallel Conversion
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from functools import partial
+from pathlib import Path
+from typing import Any
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery.cache import format_pipeline
+from sigma.backends.dictquery.cache import rule_files
+from sigma.backends.dictquery.ruleset import rule_id
+
+# Output formats whose queries can't be sent back from a worker process, and the format converted
+# there instead; the parent finishes the conversion (see ParallelConverter.finish)
+WORKER_FORMATS = {"python_callable": "expression"}
+
+_worker_backend: Optional[Any] = None
+
+
+@dataclass
+class RuleConversion:
+    """Outcome of converting one rule: its queries, or the errors that prevented them."""
+
+    source: str
+    rule: Optional[str]
+    queries: List[Any] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+@dataclass
+class ConversionReport:
+    """Finalized output of a parallel conversion, with the outcome of every rule in order."""
+
+    output: Any
+    rules: List[RuleConversion]
+
+    @property
+    def errors(self) -> List[RuleConversion]:
+        """Rules (or documents) that failed to convert."""
+        return [rule for rule in self.rules if rule.errors]
+
+    def slowest(self, count: int = 10) -> List[RuleConversion]:
+        """The count rules that took longest to convert."""
+        return sorted(self.rules, key=lambda rule: rule.seconds, reverse=True)[:count]
+
+
+def describe(error: BaseException) -> str:
+    """Error message reported for a rule, with the exception type."""
+    return f"{error.__class__.__name__}: {error}"
+
+
+def _init_worker(backend: Any) -> None:
+    """Pool initializer, keeps the backend sent once per worker process."""
+    global _worker_backend
+    _worker_backend = backend
+
+
+def convert_document(
+    backend: Any, source: str, document: str, output_format: str
+) -> List[RuleConversion]:
+    """
+    Parse and convert one YAML document rule by rule. Errors are recorded per rule, a document
+    that doesn't parse at all is reported as a single entry without a rule.
+    """
+    start = time.perf_counter()
+    try:
+        collection = SigmaCollection.from_yaml(document, collect_errors=True)
+    except Exception as e:
+        return [
+            RuleConversion(
+                source, None, errors=[describe(e)], seconds=time.perf_counter() - start
+            )
+        ]
+    results = []
+    for rule in collection.rules:
+        result = RuleConversion(source, rule_id(rule))
+        if rule.errors:
+            result.errors = [describe(error) for error in rule.errors]
+        else:
+            collected = len(backend.errors)
+            try:
+                result.queries = backend.convert_rule(rule, output_format)
+            except Exception as e:
+                result.errors = [describe(e)]
+            # A backend with collect_errors records errors instead of raising them, they are moved
+            # to the rule they belong to so they reach the report from worker processes as well
+            result.errors.extend(
+                describe(error) for _, error in backend.errors[collected:]
+            )
+            del backend.errors[collected:]
+        result.seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        results.append(result)
+    return results
+
+
+def _convert_document(
+    item: Tuple[str, str], output_format: str
+) -> List[RuleConversion]:
+    """Convert a ``(source, document)`` pair in a worker process."""
+    return convert_document(_worker_backend, *item, output_format)
+
+
+class ParallelConverter:
+    """
+    ParallelConverter - converts rule documents across a pool of worker processes
+
+    Each YAML document (usually a rule file) is parsed and converted in a worker, which receives
+    the backend once, when the pool starts. Results come back in input order, so the finalized
+    output is the same as converting the documents one after another in a single process. A rule
+    that fails to parse or convert is recorded with its errors and left out of the output instead
+    of aborting the batch. The time spent on each rule, parsing its document included for the
+    first one, is recorded as well. Use it as a context manager or call close() to shut the pool
+    down.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[Any] = None,
+        workers: Optional[int] = None,
+        chunk_size: int = 4,
+    ):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        if backend is None:
+            from sigma.backends.dictquery.dictquery import DictQueryBackend
+
+            backend = DictQueryBackend()
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.pool = ProcessPoolExecutor(
+            self.workers, initializer=_init_worker, initargs=(backend,)
+        )
+
+    def __enter__(self) -> "ParallelConverter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self.pool.shutdown()
+
+    def convert_documents(
+        self, documents: Iterable[Tuple[str, str]], output_format: str = "default"
+    ) -> ConversionReport:
+        """Convert ``(source name, YAML document)`` pairs and finalize the output."""
+        worker_format = WORKER_FORMATS.get(output_format, output_format)
+        results = [
+            result
+            for document in self.pool.map(
+                partial(_convert_document, output_format=worker_format),
+                documents,
+                chunksize=self.chunk_size,
+            )
+            for result in document
+        ]
+        return ConversionReport(self.finish(results, output_format), results)
+
+    def convert_paths(
+        self, paths: Sequence[Union[str, Path]], output_format: str = "default"
+    ) -> ConversionReport:
+        """Convert rule files and directories, in the order SigmaCollection.load_ruleset uses."""
+        return self.convert_documents(
+            (
+                (str(path), path.read_text(encoding="utf-8"))
+                for path in rule_files(paths)
+            ),
+            output_format,
+        )
+
+    def finish(self, results: List[RuleConversion], output_format: str) -> Any:
+        """Finalize the queries of all rules as backend.convert would."""
+        if output_format in WORKER_FORMATS:
+            for result in results:
+                result.queries = [
+                    self.backend.compile_expression(expr) for expr in result.queries
+                ]
+        # finalize applies the pipeline convert_rule would have set up
+        self.backend.last_processing_pipeline = format_pipeline(
+            self.backend, output_format
+        )
+        return self.backend.finalize(
+            [query for result in results for query in result.queries], output_format
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """sigma-dictquery-convert command line entry point"""
+    parser = argparse.ArgumentParser(
+        prog="sigma-dictquery-convert",
+        description="Convert Sigma rules to dictquery queries in parallel, printing one JSON object"
+        " per rule.",
+    )
+    parser.add_argument("rules", nargs="+", help="Sigma rule files or directories")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=4,
+        help="rule files sent to a worker process at a time (default: 4)",
+    )
+    parser.add_argument(
+        "--ignore-case", action="store_true", help="compare strings case-insensitively"
+    )
+    parser.add_argument(
+        "--pack",
+        metavar="FILE",
+        help="write the converted rules to a rule pack FILE instead of printing their queries",
+    )
+    parser.add_argument(
+        "--slowest",
+        type=int,
+        default=0,
+        metavar="N",
+        help="print the N rules that took longest to convert to stderr",
+    )
+    args = parser.parse_args(argv)
+
+    from sigma.backends.dictquery.dictquery import DictQueryBackend
+
+    backend = DictQueryBackend(case_sensitive=not args.ignore_case)
+    with ParallelConverter(backend, args.workers, args.chunk_size) as converter:
+        report = converter.convert_paths(args.rules, "pack" if args.pack else "default")
+    if args.pack:
+        Path(args.pack).write_bytes(report.output)
+    out = sys.stdout
+    for result in report.rules:
+        record = {"source": result.source, "rule": result.rule}
+        if result.errors:
+            record["errors"] = result.errors
+        elif not args.pack:
+            record["queries"] = result.queries
+        record["seconds"] = round(result.seconds, 6)
+        out.write(json.dumps(record) + "\n")
+    out.flush()
+    for result in report.errors:
+        print(
+            f"{result.source}: {result.rule or 'invalid document'}: "
+            + "; ".join(result.errors),
+            file=sys.stderr,
+        )
+    for result in report.slowest(args.slowest) if args.slowest > 0 else ():
+        print(
+            f"{result.seconds:10.6f}  {result.source}: {result.rule}", file=sys.stderr
+        )
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
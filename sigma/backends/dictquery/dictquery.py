@@ -2,8 +2,13 @@
 Unqork Security - Threat Detection and Response - PySigma Dictquery Backend
 """
 import re
+from typing import Any
+from typing import Callable
 from typing import ClassVar
 from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
 from typing import Pattern
 from typing import Tuple
 from typing import Union
@@ -16,16 +21,42 @@ from sigma.conditions import ConditionOR
 from sigma.conversion.base import TextQueryBackend
 from sigma.conversion.deferred import DeferredQueryExpression
 from sigma.conversion.state import ConversionState
+from sigma.exceptions import SigmaError
+from sigma.processing.pipeline import ProcessingPipeline
+from sigma.rule import SigmaRule
 from sigma.types import SigmaCompareExpression
 from sigma.types import SigmaRegularExpressionFlag
 from sigma.types import SpecialChars
 
+from sigma.backends.dictquery.aggregation import Aggregation
+from sigma.backends.dictquery.aggregation import AggregationEngine
+from sigma.backends.dictquery.aggregation import AggregationRule
+from sigma.backends.dictquery.aggregation import split_aggregations
+from sigma.backends.dictquery.compiler import PythonCallableCompiler
+from sigma.backends.dictquery.expression import Expression
+from sigma.backends.dictquery.expression import ExpressionBuilder
+from sigma.backends.dictquery.optimize import CostModel
+from sigma.backends.dictquery.optimize import simplify
+from sigma.backends.dictquery.prefilter import PrefilterIndex
+from sigma.backends.dictquery.regex import RegexTable
+from sigma.backends.dictquery.ruleset import RuleSet
+from sigma.backends.dictquery.ruleset import rule_id
+
 
 class DictQueryBackend(TextQueryBackend):
     """dictquery backend."""
 
     name: ClassVar[str] = "dictquery backend"
-    formats: Dict[str, str] = {"default": "Plain dictquery queries"}
+    formats: Dict[str, str] = {
+        "default": "Plain dictquery queries",
+        "python_callable": "Compiled Python predicate functions",
+        "ruleset": "Rule set matching all rules against an event in one pass",
+        "prefilter": "Dictquery queries with a field value prefilter index",
+        "columnar": "Evaluator computing rule masks over columnar batches (requires NumPy)",
+        "expression": "Expression trees with plain string operators, for custom evaluators",
+        "pack": "Binary rule pack that processes load into a rule set without conversion",
+        "aggregation": "Filters with count/sum/avg/min/max aggregation specs, evaluated over windows",
+    }
     requires_pipeline: bool = False
 
     precedence: ClassVar[Tuple[ConditionItem, ConditionItem, ConditionItem]] = (
@@ -100,7 +131,7 @@ class DictQueryBackend(TextQueryBackend):
     ] = "\\"  # Character used for escaping in regular expressions
     re_escape: ClassVar[Tuple[str]] = ()  # List of strings that are escaped
     re_escape_escape_char: bool = True  # If True, the escape character is also escaped
-    re_flag_prefix: bool = False  # If True, the flags are prepended as (?x) group at the beginning of the regular expression, e.g. (?i). If this is not supported by the target, it should be set to False.
+    re_flag_prefix: bool = True  # If True, the flags are prepended as (?x) group at the beginning of the regular expression, e.g. (?i). If this is not supported by the target, it should be set to False.
     # Mapping from SigmaRegularExpressionFlag values to static string templates that are used in
     # flag_x placeholders in re_expression template.
     # By default, i, m and s are defined. If a flag is not supported by the target query language,
@@ -171,6 +202,75 @@ class DictQueryBackend(TextQueryBackend):
         str
     ] = "*"  # String used as query if final query only contains deferred expression
 
+    def __init__(
+        self,
+        processing_pipeline: Optional[ProcessingPipeline] = None,
+        collect_errors: bool = False,
+        reorder: bool = True,
+        selectivity: Optional[Mapping[str, float]] = None,
+        simplify: bool = True,
+        case_sensitive: bool = True,
+    ):
+        super().__init__(processing_pipeline, collect_errors)
+        # Regular expressions of all rules compiled by this backend, each compiled only once
+        self.regexes = RegexTable()
+        # Orders AND/OR children of the compiled formats cheapest and most selective first, None
+        # keeps the rule order
+        self.cost_model = CostModel(selectivity) if reorder else None
+        self.simplify = simplify
+        # String comparisons of the compiled formats, like dictquery's case_sensitive option
+        self.case_sensitive = case_sensitive
+        # Aggregations of the conditions of the rule converted last to the aggregation format
+        self.last_aggregations: List[Optional[Aggregation]] = []
+
+    def conversion_key(self) -> Tuple[Any, ...]:
+        """Backend options that change the conversion output, e.g. for cache keys"""
+        selectivity = (
+            None
+            if self.cost_model is None
+            else sorted(self.cost_model.selectivity.items())
+        )
+        return self.simplify, selectivity
+
+    def convert_rule(
+        self, rule: SigmaRule, output_format: Optional[str] = None
+    ) -> List[Any]:
+        """Convert the filter part of conditions with an aggregation for the aggregation format"""
+        if (output_format or self.default_format) != "aggregation":
+            return super().convert_rule(rule, output_format)
+        try:
+            with split_aggregations(rule) as aggregations:
+                self.last_aggregations = aggregations
+                return super().convert_rule(rule, output_format)
+        except SigmaError as e:
+            if self.collect_errors:
+                self.errors.append((rule, e))
+                return []
+            raise
+
+    def optimize_condition(
+        self, cond: ConditionItem, reorder: bool = True
+    ) -> ConditionItem:
+        """Simplify a condition tree and, with reorder, order it by the cost model"""
+        if self.simplify:
+            cond = simplify(cond)
+        if reorder and self.cost_model is not None:
+            self.cost_model.reorder(cond)
+        return cond
+
+    def convert_condition(self, cond: ConditionItem, state: ConversionState) -> Any:
+        """Simplify the condition tree once, at its root, before converting it"""
+        if not cond.parent_chain_condition_classes():  # no enclosing AND/OR/NOT
+            # dictquery raises on LIKE and MATCH of a non-string value instead of returning
+            # False, so the query keeps the rule's order for a test to guard the ones after it
+            cond = self.optimize_condition(cond, reorder=False)
+            # Kept for build_expression, so the formats finalizing an expression tree don't
+            # parse and simplify the condition again. Conditions the conversion builds itself,
+            # e.g. the LIKE patterns of a CIDR network, have no parent either but come later.
+            if getattr(state, "condition", None) is None:
+                state.condition = cond
+        return super().convert_condition(cond, state)
+
     def convert_condition_field_eq_val_str(
         self, cond: ConditionFieldEqualsValueExpression, state: ConversionState
     ) -> Union[str, DeferredQueryExpression]:
@@ -224,3 +324,113 @@ class DictQueryBackend(TextQueryBackend):
             raise NotImplementedError(
                 "Field equals string value expressions with strings are not supported by the backend."
             )
+
+    def build_expression(
+        self, rule: SigmaRule, index: int, state: ConversionState
+    ) -> Expression:
+        """
+        Build the expression tree of the rule condition with the given index, from the condition
+        tree convert_condition simplified for state
+        """
+        cond = getattr(state, "condition", None)
+        if cond is None:  # state of a condition that wasn't converted
+            cond = self.optimize_condition(
+                rule.detection.parsed_condition[index].parsed
+            )
+        elif self.cost_model is not None:
+            self.cost_model.reorder(cond)
+        return ExpressionBuilder(self).build(cond, state)
+
+    def finalize_query_python_callable(
+        self, rule: SigmaRule, query: Any, index: int, state: ConversionState
+    ) -> Callable[[Any], bool]:
+        """Compile the rule condition into a Python function with the semantics of the dictquery query"""
+        return self.compile_expression(self.build_expression(rule, index, state))
+
+    def compile_expression(self, expr: Expression) -> Callable[[Any], bool]:
+        """Compile an expression tree into a Python function, as the python_callable format does"""
+        return PythonCallableCompiler(self.regexes, self.case_sensitive).compile(expr)
+
+    def finalize_output_python_callable(
+        self, queries: List[Callable[[Any], bool]]
+    ) -> List[Callable[[Any], bool]]:
+        """Return the list of compiled predicate functions"""
+        return queries
+
+    def finalize_query_ruleset(
+        self, rule: SigmaRule, query: Any, index: int, state: ConversionState
+    ) -> Tuple[str, Expression]:
+        """Pair the rule id with the expression tree of the rule condition"""
+        return rule_id(rule), self.build_expression(rule, index, state)
+
+    def finalize_output_ruleset(self, queries: List[Tuple[str, Expression]]) -> RuleSet:
+        """Compile all rules into a single rule set"""
+        return RuleSet(queries, case_sensitive=self.case_sensitive)
+
+    def finalize_query_prefilter(
+        self, rule: SigmaRule, query: Any, index: int, state: ConversionState
+    ) -> Tuple[str, str, Expression]:
+        """Keep the rule id and expression tree next to the dictquery query"""
+        return rule_id(rule), query, self.build_expression(rule, index, state)
+
+    def finalize_output_prefilter(
+        self, queries: List[Tuple[str, str, Expression]]
+    ) -> Dict[str, Any]:
+        """Return the queries together with the prefilter index over their rule ids"""
+        return {
+            "queries": [{"id": ident, "query": query} for ident, query, _ in queries],
+            "prefilter": PrefilterIndex.from_rules(
+                [(ident, expr) for ident, _, expr in queries]
+            ).to_dict(),
+        }
+
+    def finalize_query_columnar(
+        self, rule: SigmaRule, query: Any, index: int, state: ConversionState
+    ) -> Tuple[str, Expression]:
+        """Pair the rule id with the expression tree of the rule condition"""
+        return self.finalize_query_ruleset(rule, query, index, state)
+
+    def finalize_output_columnar(self, queries: List[Tuple[str, Expression]]) -> Any:
+        """Return a columnar evaluator over all rules"""
+        from sigma.backends.dictquery.columnar import ColumnarEvaluator
+
+        return ColumnarEvaluator(queries, self.case_sensitive)
+
+    def finalize_query_pack(
+        self, rule: SigmaRule, query: Any, index: int, state: ConversionState
+    ) -> Tuple[str, Expression]:
+        """Pair the rule id with the expression tree of the rule condition"""
+        return self.finalize_query_ruleset(rule, query, index, state)
+
+    def finalize_output_pack(self, queries: List[Tuple[str, Expression]]) -> bytes:
+        """Encode all rules and their prefilter index as a rule pack"""
+        from sigma.backends.dictquery.pack import RulePackWriter
+
+        return RulePackWriter(self.case_sensitive).write(queries)
+
+    def finalize_query_aggregation(
+        self, rule: SigmaRule, query: Any, index: int, state: ConversionState
+    ) -> AggregationRule:
+        """Keep the expression tree and the aggregation of the condition next to the query"""
+        return AggregationRule(
+            rule_id(rule),
+            query,
+            self.build_expression(rule, index, state),
+            self.last_aggregations[index],
+        )
+
+    def finalize_output_aggregation(
+        self, queries: List[AggregationRule]
+    ) -> AggregationEngine:
+        """Return a streaming evaluator of the filters and their aggregations"""
+        return AggregationEngine(queries, case_sensitive=self.case_sensitive)
+
+    def finalize_query_expression(
+        self, rule: SigmaRule, query: Any, index: int, state: ConversionState
+    ) -> Expression:
+        """Return the expression tree of the rule condition"""
+        return self.build_expression(rule, index, state)
+
+    def finalize_output_expression(self, queries: List[Expression]) -> List[Expression]:
+        """Return the list of expression trees"""
+        return queries
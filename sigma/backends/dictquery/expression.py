@@ -0,0 +1,234 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Expressions
+"""
+from dataclasses import dataclass
+from typing import Any
+from typing import Iterable
+from typing import Tuple
+from typing import Union
+
+from sigma.conditions import ConditionAND
+from sigma.conditions import ConditionFieldEqualsValueExpression
+from sigma.conditions import ConditionItem
+from sigma.conditions import ConditionNOT
+from sigma.conditions import ConditionOR
+from sigma.conversion.state import ConversionState
+from sigma.types import SigmaBool
+from sigma.types import SigmaCasedString
+from sigma.types import SigmaCIDRExpression
+from sigma.types import SigmaCompareExpression
+from sigma.types import SigmaExists
+from sigma.types import SigmaExpansion
+from sigma.types import SigmaNull
+from sigma.types import SigmaNumber
+from sigma.types import SigmaRegularExpression
+from sigma.types import SigmaString
+
+# Predicate operators, named after the dictquery operator they mirror.
+EQ = "eq"
+LIKE = "like"
+MATCH = "match"
+IN = "in"
+LT = "lt"
+LTE = "lte"
+GT = "gt"
+GTE = "gte"
+NULL = "null"
+EXISTS = "exists"
+# Plain string operators of LIKE patterns with a single leading and/or trailing wildcard, which
+# dictquery can only express as LIKE.
+STARTSWITH = "startswith"
+ENDSWITH = "endswith"
+CONTAINS = "contains"
+# IP address in any of a tuple of networks, which dictquery can only express as the LIKE patterns
+# of their expansion.
+CIDR = "cidr"
+
+# Characters with a meaning in dictquery's (fnmatch) LIKE patterns
+GLOB_SPECIAL = "*?["
+
+COMPARE_OPS = {
+    SigmaCompareExpression.CompareOperators.LT: LT,
+    SigmaCompareExpression.CompareOperators.LTE: LTE,
+    SigmaCompareExpression.CompareOperators.GT: GT,
+    SigmaCompareExpression.CompareOperators.GTE: GTE,
+}
+
+
+@dataclass(frozen=True)
+class Predicate:
+    """A single field test, e.g. ``field LIKE 'foo*'``."""
+
+    op: str
+    field: str
+    value: Any = None
+
+
+@dataclass(frozen=True)
+class And:
+    """All children must match."""
+
+    args: Tuple["Expression", ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    """At least one child must match."""
+
+    args: Tuple["Expression", ...]
+
+
+@dataclass(frozen=True)
+class Not:
+    """Negation of the child."""
+
+    arg: "Expression"
+
+
+Expression = Union[Predicate, And, Or, Not]
+
+
+def lower_like(pattern: str) -> Tuple[str, str]:
+    """
+    Operator and operand for a LIKE pattern: startswith, endswith or contains with the literal for
+    pure prefix, suffix and substring patterns, else LIKE with the pattern itself.
+    """
+    literal = pattern.strip("*")
+    if any(char in literal for char in GLOB_SPECIAL):
+        return LIKE, pattern
+    prefix, suffix = pattern.startswith("*"), pattern.endswith("*")
+    if prefix and suffix:
+        return CONTAINS, literal
+    elif suffix:
+        return STARTSWITH, literal
+    elif prefix:
+        return ENDSWITH, literal
+    return LIKE, pattern
+
+
+def walk(expr: Expression) -> Iterable[Expression]:
+    """All nodes of an expression tree, parents before children."""
+    yield expr
+    if isinstance(expr, (And, Or)):
+        for arg in expr.args:
+            yield from walk(arg)
+    elif isinstance(expr, Not):
+        yield from walk(expr.arg)
+
+
+class ExpressionBuilder:
+    """
+    ExpressionBuilder - turns a pySigma condition tree into a hashable expression tree
+
+    Literal values are rendered with the backend's own value conversion so each predicate carries
+    exactly the string, number or pattern dictquery would see in the converted query. LIKE patterns
+    that only test for a prefix, suffix or substring become startswith, endswith and contains
+    predicates on the literal, so evaluators can skip glob matching for them. CIDR values (and ORs
+    of them on one field) become a single cidr predicate with the networks, instead of the LIKE
+    patterns of their expansion.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def build(self, cond: ConditionItem, state: ConversionState) -> Expression:
+        """Build the expression tree for a condition tree node."""
+        if isinstance(cond, (ConditionOR, ConditionAND)):
+            if self.backend.decide_convert_condition_as_in_expression(cond, state):
+                return self.build_in(cond, state)
+            elif isinstance(cond, ConditionOR) and self.is_cidr_list(cond):
+                return Predicate(
+                    CIDR,
+                    cond.args[0].field,
+                    tuple(str(arg.value.network) for arg in cond.args),
+                )
+            node = Or if isinstance(cond, ConditionOR) else And
+            return node(tuple(self.build(arg, state) for arg in cond.args))
+        elif isinstance(cond, ConditionNOT):
+            return Not(self.build(cond.args[0], state))
+        elif isinstance(cond, ConditionFieldEqualsValueExpression):
+            return self.build_field_eq_val(cond, state)
+        raise NotImplementedError(
+            "Value-only conditions are not supported by the backend: "
+            + cond.__class__.__name__
+        )
+
+    @staticmethod
+    def is_cidr_list(cond: ConditionOR) -> bool:
+        """OR of CIDR values on a single field, e.g. from a list of networks."""
+        return (
+            all(
+                isinstance(arg, ConditionFieldEqualsValueExpression)
+                and isinstance(arg.value, SigmaCIDRExpression)
+                for arg in cond.args
+            )
+            and len({arg.field for arg in cond.args}) == 1
+        )
+
+    def build_in(
+        self, cond: Union[ConditionOR, ConditionAND], state: ConversionState
+    ) -> Expression:
+        """Build a field in value list predicate."""
+        return Predicate(
+            IN,
+            cond.args[0].field,
+            tuple(self.literal(arg.value, state) for arg in cond.args),
+        )
+
+    def build_field_eq_val(
+        self, cond: ConditionFieldEqualsValueExpression, state: ConversionState
+    ) -> Expression:
+        """Build the predicate for a field = value condition."""
+        value = cond.value
+        if isinstance(value, SigmaCasedString):
+            raise NotImplementedError(
+                "Case-sensitive string matching is not supported by the backend."
+            )
+        elif isinstance(value, SigmaString):
+            if value.contains_special():
+                op, pattern = lower_like(self.literal(value, state))
+                return Predicate(op, cond.field, pattern)
+            return Predicate(EQ, cond.field, self.literal(value, state))
+        elif isinstance(value, (SigmaNumber, SigmaBool)):
+            return Predicate(EQ, cond.field, self.literal(value, state))
+        elif isinstance(value, SigmaRegularExpression):
+            return Predicate(
+                MATCH, cond.field, self.backend.convert_value_re(value, state)
+            )
+        elif isinstance(value, SigmaCIDRExpression):
+            return Predicate(CIDR, cond.field, (str(value.network),))
+        elif isinstance(value, SigmaCompareExpression):
+            return Predicate(
+                COMPARE_OPS[value.op], cond.field, float(value.number.number)
+            )
+        elif isinstance(value, SigmaNull):
+            return Predicate(NULL, cond.field)
+        elif isinstance(value, SigmaExists):
+            if value.exists:
+                return Predicate(EXISTS, cond.field)
+            return Not(Predicate(EXISTS, cond.field))
+        elif isinstance(value, SigmaExpansion):
+            return Or(
+                tuple(
+                    self.build_field_eq_val(
+                        ConditionFieldEqualsValueExpression(cond.field, item), state
+                    )
+                    for item in value.values
+                )
+            )
+        raise NotImplementedError(
+            "Field equals value expressions of this type are not supported by the backend: "
+            + value.__class__.__name__
+        )
+
+    def literal(
+        self, value: Union[SigmaString, SigmaNumber, SigmaBool], state: ConversionState
+    ) -> Union[str, float, bool]:
+        """Render a value the way dictquery reads it back from the converted query."""
+        if isinstance(value, SigmaString):
+            quote = len(self.backend.str_quote)
+            rendered = self.backend.convert_value_str(value, state)
+            return rendered[quote : len(rendered) - quote]
+        elif isinstance(value, SigmaBool):
+            return value.boolean
+        return float(value.number)
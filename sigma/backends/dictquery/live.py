@@ -0,0 +1,195 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Live Rule Set
+"""
+import threading
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from sigma.collection import SigmaCollection
+from sigma.rule import SigmaRule
+
+from sigma.backends.dictquery.expression import Expression
+from sigma.backends.dictquery.ruleset import RuleSet
+from sigma.backends.dictquery.ruleset import rule_id
+
+Queries = List[Tuple[str, Expression]]
+
+
+class LiveRuleSet:
+    """
+    LiveRuleSet - rule set whose rules can be added, replaced and removed while it is in use
+
+    Rules are kept in collection order, in shards of at most shard_size rules that are compiled into
+    a RuleSet each, prefilter indexes included. Changing a rule converts only that rule and rebuilds
+    only the shard holding it; the other shards, their indexes and compiled matchers are reused.
+    Every change swaps in a new tuple of shards with a single assignment, and match() reads that
+    tuple once, so an evaluation in flight sees the rule set either entirely before or entirely
+    after a change. Changes are serialized by a lock, matching never waits for it. options are
+    passed on to every RuleSet.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[Any] = None,
+        shard_size: int = 128,
+        **options: bool,
+    ):
+        if shard_size < 1:
+            raise ValueError("shard_size must be at least 1")
+        if backend is None:
+            from sigma.backends.dictquery.dictquery import DictQueryBackend
+
+            backend = DictQueryBackend()
+        self.backend = backend
+        self.shard_size = shard_size
+        self.options = {"case_sensitive": backend.case_sensitive, **options}
+        self._lock = threading.Lock()
+        self._queries: Dict[str, Queries] = {}
+        self._shards: Tuple[RuleSet, ...] = ()
+
+    @classmethod
+    def from_collection(
+        cls,
+        rule_collection: SigmaCollection,
+        backend: Optional[Any] = None,
+        shard_size: int = 128,
+        **options: bool,
+    ) -> "LiveRuleSet":
+        """Convert a collection with the given (or a default) backend into a live rule set."""
+        live = cls(backend, shard_size, **options)
+        live.update(rule_collection.rules)
+        return live
+
+    @property
+    def rule_ids(self) -> List[str]:
+        """Ids of all rules, in collection order."""
+        return [ident for shard in self._shards for ident in shard.rule_ids]
+
+    def __len__(self) -> int:
+        return sum(len(shard.rule_ids) for shard in self._shards)
+
+    def __contains__(self, ident: str) -> bool:
+        return ident in self._queries
+
+    def match(self, event: Any) -> List[str]:
+        """Ids of all rules matching event, in collection order."""
+        shards = self._shards
+        fields: Dict[Tuple[str, ...], List[Any]] = {}
+        hits: List[str] = []
+        for shard in shards:
+            hits.extend(shard.match(event, fields))
+        return hits
+
+    def snapshot(self) -> RuleSet:
+        """All current rules as a single RuleSet, e.g. for a ParallelMatcher."""
+        shards = self._shards
+        return RuleSet(
+            [query for shard in shards for query in shard.rules], **self.options
+        )
+
+    def add(self, rule: Union[SigmaRule, str]) -> None:
+        """Add a rule (a SigmaRule or its YAML), after all present rules."""
+        self._change([self.parse(rule)], (), present=False)
+
+    def replace(self, rule: Union[SigmaRule, str]) -> None:
+        """Replace the rule with the same id, keeping its position."""
+        self._change([self.parse(rule)], (), present=True)
+
+    def remove(self, ident: str) -> None:
+        """Remove the rule with the given id."""
+        self._change((), [ident], present=True)
+
+    def update(
+        self,
+        rules: Iterable[Union[SigmaRule, str]] = (),
+        remove: Iterable[str] = (),
+    ) -> None:
+        """
+        Add or replace rules and remove rule ids in one change. Rules are replaced in place and added
+        at the end, unknown ids in remove are ignored. If a rule fails to convert, nothing changes.
+        """
+        self._change(map(self.parse, rules), remove)
+
+    def _change(
+        self,
+        rules: Iterable[SigmaRule],
+        remove: Iterable[str],
+        present: Optional[bool] = None,
+    ) -> None:
+        """
+        Convert rules and apply a change under the lock. present requires every rule id to be
+        present already (True) or not yet (False), so the check and the change happen atomically.
+        """
+        with self._lock:
+            converted: Dict[str, Queries] = {}
+            for rule in rules:
+                ident = rule_id(rule)
+                if present is False and ident in self._queries:
+                    raise ValueError(
+                        f"Rule '{ident}' is already present, use replace()"
+                    )
+                if present and ident not in self._queries:
+                    raise KeyError(ident)
+                queries = self.backend.convert_rule(rule, "ruleset")
+                if not queries:
+                    # A backend collecting errors returns no queries for a rule that failed
+                    raise ValueError(f"Rule '{ident}' did not convert to any query")
+                converted[ident] = queries
+            removed = set(remove) - set(converted)
+            if present:
+                for ident in removed:
+                    if ident not in self._queries:
+                        raise KeyError(ident)
+            self._swap(converted, removed)
+
+    def _swap(self, converted: Dict[str, Queries], removed: Set[str]) -> None:
+        """Rebuild the shards affected by a change and swap them in."""
+        layout = [shard.rule_ids for shard in self._shards]
+        position = {ident: index for index, ids in enumerate(layout) for ident in ids}
+        dirty: Set[int] = set()
+        for ident in removed:
+            index = position.get(ident)
+            if index is not None:
+                layout[index].remove(ident)
+                dirty.add(index)
+        for ident in converted:
+            index = position.get(ident)
+            if index is None:
+                if not layout or len(layout[-1]) >= self.shard_size:
+                    layout.append([])
+                index = len(layout) - 1
+                layout[index].append(ident)
+            dirty.add(index)
+
+        queries = {
+            ident: query
+            for ident, query in self._queries.items()
+            if ident not in removed
+        }
+        queries.update(converted)
+        shards = list(self._shards) + [None] * (len(layout) - len(self._shards))
+        for index in sorted(dirty):
+            ids = layout[index]
+            shards[index] = (
+                RuleSet(
+                    [query for ident in ids for query in queries[ident]],
+                    **self.options,
+                )
+                if ids
+                else None
+            )
+        self._queries = queries
+        self._shards = tuple(shard for shard in shards if shard is not None)
+
+    @staticmethod
+    def parse(rule: Union[SigmaRule, str]) -> SigmaRule:
+        """Rule objects as they are, YAML text parsed into a rule."""
+        if isinstance(rule, SigmaRule):
+            return rule
+        return SigmaRule.from_yaml(rule)
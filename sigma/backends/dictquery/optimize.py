@@ -0,0 +1,330 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Condition Optimizer
+"""
+from typing import Any
+from typing import ClassVar
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from sigma.conditions import ConditionAND
+from sigma.conditions import ConditionFieldEqualsValueExpression
+from sigma.conditions import ConditionItem
+from sigma.conditions import ConditionNOT
+from sigma.conditions import ConditionOR
+from sigma.conditions import ConditionValueExpression
+from sigma.types import SigmaBool
+from sigma.types import SigmaCasedString
+from sigma.types import SigmaCIDRExpression
+from sigma.types import SigmaCompareExpression
+from sigma.types import SigmaExists
+from sigma.types import SigmaExpansion
+from sigma.types import SigmaNull
+from sigma.types import SigmaNumber
+from sigma.types import SigmaRegularExpression
+from sigma.types import SigmaString
+from sigma.types import SpecialChars
+
+# (estimated cost, probability of being true)
+Estimate = Tuple[float, float]
+Junction = Union[ConditionAND, ConditionOR]
+
+
+def value_key(value: Any) -> Hashable:
+    """Hashable identity of a Sigma value, values of unknown types are only equal to themselves."""
+    if isinstance(value, SigmaString):
+        return (
+            value.__class__.__name__,
+            tuple(
+                part if isinstance(part, (str, SpecialChars)) else repr(part)
+                for part in value.s
+            ),
+        )
+    elif isinstance(value, SigmaNumber):
+        return "number", value.number
+    elif isinstance(value, SigmaBool):
+        return "bool", value.boolean
+    elif isinstance(value, SigmaRegularExpression):
+        return "re", value.regexp, frozenset(value.flags)
+    elif isinstance(value, SigmaCompareExpression):
+        return "compare", value.number.number, value.op
+    elif isinstance(value, SigmaNull):
+        return ("null",)
+    elif isinstance(value, SigmaExists):
+        return "exists", value.exists
+    elif isinstance(value, SigmaExpansion):
+        return "expansion", tuple(value_key(item) for item in value.values)
+    return "opaque", id(value)
+
+
+def condition_key(cond: Any) -> Hashable:
+    """Hashable structural identity of a condition tree node."""
+    if isinstance(cond, (ConditionAND, ConditionOR, ConditionNOT)):
+        return cond.__class__.__name__, tuple(condition_key(arg) for arg in cond.args)
+    elif isinstance(cond, ConditionFieldEqualsValueExpression):
+        return "field", cond.field, value_key(cond.value)
+    elif isinstance(cond, ConditionValueExpression):
+        return "value", value_key(cond.value)
+    return "opaque", id(cond)
+
+
+def _is_in_value(cond: Any) -> bool:
+    """Plain string or number equality, as the backend puts into IN lists."""
+    if not isinstance(cond, ConditionFieldEqualsValueExpression):
+        return False
+    if isinstance(cond.value, SigmaCasedString):
+        return False
+    elif isinstance(cond.value, SigmaString):
+        return not cond.value.contains_special()
+    return isinstance(cond.value, SigmaNumber)
+
+
+def _link(cond: Any, parent: Optional[ConditionItem]) -> Any:
+    """Set the parent references of a rebuilt tree."""
+    cond.parent = parent
+    for arg in getattr(cond, "args", ()):
+        _link(arg, cond)
+    return cond
+
+
+def _junction(kind: type, args: List[Any], source: Any) -> Any:
+    """AND/OR node of args, or the only arg itself."""
+    if len(args) == 1:
+        return args[0]
+    return kind(args, source)
+
+
+def _terms(cond: Any, kind: type) -> List[Any]:
+    """Children of an AND/OR of the given kind, any other node as the only term."""
+    return list(cond.args) if isinstance(cond, kind) else [cond]
+
+
+def _dual(kind: type) -> type:
+    return ConditionOR if kind is ConditionAND else ConditionAND
+
+
+def _simplify_junction(cond: Junction) -> Any:
+    """Flatten, deduplicate, absorb, factor and group the children of an AND/OR node."""
+    kind, dual = type(cond), _dual(type(cond))
+    args: List[Any] = []
+    keys = set()
+    for arg in (_simplify(arg) for arg in cond.args):
+        for term in _terms(arg, kind):
+            key = condition_key(term)
+            if key not in keys:  # a AND a = a, a OR a = a
+                keys.add(key)
+                args.append(term)
+
+    # Absorption: a AND (a OR b) = a, a OR (a AND b) = a
+    args = [
+        arg
+        for arg in args
+        if not (
+            isinstance(arg, dual)
+            and any(condition_key(term) in keys for term in arg.args)
+        )
+    ]
+
+    # Factoring: (a AND b) OR (a AND c) = a AND (b OR c), evaluating a once
+    if len(args) > 1:
+        groups = [_terms(arg, dual) for arg in args]
+        common = set.intersection(
+            *({condition_key(term) for term in group} for group in groups)
+        )
+        if common:
+            factors = [term for term in groups[0] if condition_key(term) in common]
+            rests = [
+                [term for term in group if condition_key(term) not in common]
+                for group in groups
+            ]
+            if not all(rests):  # a OR (a AND b) = a
+                return _simplify(_junction(dual, factors, cond.source))
+            remainder = kind(
+                [_junction(dual, rest, cond.source) for rest in rests], cond.source
+            )
+            return _simplify(dual(factors + [remainder], cond.source))
+
+    # Same-field equalities of an OR become one IN list
+    if kind is ConditionOR:
+        by_field: Dict[str, List[Any]] = {}
+        for arg in args:
+            if _is_in_value(arg):
+                by_field.setdefault(arg.field, []).append(arg)
+        if any(1 < len(group) < len(args) for group in by_field.values()):
+            grouped: List[Any] = []
+            for arg in args:
+                group = by_field.get(getattr(arg, "field", None))
+                if group is None or len(group) < 2 or not _is_in_value(arg):
+                    grouped.append(arg)
+                elif arg is group[0]:
+                    grouped.append(ConditionOR(group, cond.source))
+            args = grouped
+    return _junction(kind, args, cond.source)
+
+
+def _simplify(cond: Any) -> Any:
+    if isinstance(cond, (ConditionAND, ConditionOR)):
+        return _simplify_junction(cond)
+    elif isinstance(cond, ConditionNOT):
+        arg = _simplify(cond.args[0])
+        if isinstance(arg, ConditionNOT):  # NOT NOT a = a
+            return arg.args[0]
+        return ConditionNOT([arg], cond.source)
+    return cond
+
+
+def simplify(cond: Any) -> Any:
+    """
+    Boolean simplification of a condition tree: flattens nested AND/OR, removes duplicate terms,
+    double negations and absorbed terms, factors terms shared by all children out of an AND/OR so
+    they are evaluated once, and groups plain equalities on the same field inside an OR into a
+    sub-OR that the backend emits as a single IN list. Returns the new root, which may reuse nodes
+    of the input tree.
+    """
+    return _link(_simplify(cond), cond.parent)
+
+
+def _is_substring_pattern(value: SigmaString) -> bool:
+    """Pure prefix, suffix or substring pattern, evaluated without a glob match."""
+    start = 1 if value.startswith(SpecialChars.WILDCARD_MULTI) else 0
+    end = len(value) - (1 if value.endswith(SpecialChars.WILDCARD_MULTI) else 0)
+    return not value[start:end].contains_special()
+
+
+def _is_in_candidate(cond: ConditionOR) -> bool:
+    """OR of plain values on a single field, which the backend emits as one IN list."""
+    return (
+        all(map(_is_in_value, cond.args)) and len({arg.field for arg in cond.args}) == 1
+    )
+
+
+class CostModel:
+    """
+    CostModel - reorders the children of AND and OR nodes by estimated cost and selectivity
+
+    Every predicate is assigned an evaluation cost and a probability of being true. Children of an
+    AND are ordered so the ones most likely to short-circuit the rest per unit of cost come first
+    (ascending ``cost / (1 - probability)``), children of an OR by ascending ``cost / probability``.
+    With the default estimates equality, IN and exists checks run first, prefix, suffix and
+    substring tests and other globs after them and regular expressions last. Children with equal
+    rank keep their order.
+
+    The compiled predicates are false for values of the wrong type, so the order doesn't change
+    whether an event matches them. dictquery instead raises on LIKE and MATCH of a non-string
+    value, which an earlier test of the rule may have kept it from reaching, so the backend only
+    reorders the trees of its compiled formats. Field statistics can be passed as selectivity, the
+    probability that a predicate on the field is true, e.g. ``{"eventname": 0.01}`` for a field
+    with ~100 evenly distributed values; it replaces the default probability for all predicates on
+    that field.
+    """
+
+    costs: ClassVar[Dict[str, float]] = {
+        "eq": 1.0,
+        "in": 1.5,
+        "exists": 1.0,
+        "null": 1.0,
+        "compare": 2.0,
+        "substring": 2.5,
+        "glob": 4.0,
+        "regex": 8.0,
+        "unbound": 16.0,
+    }
+    probabilities: ClassVar[Dict[str, float]] = {
+        "eq": 0.05,
+        "exists": 0.7,
+        "null": 0.5,
+        "compare": 0.3,
+        "substring": 0.1,
+        "glob": 0.1,
+        "regex": 0.1,
+        "unbound": 0.1,
+    }
+
+    def __init__(self, selectivity: Optional[Mapping[str, float]] = None):
+        self.selectivity: Dict[str, float] = dict(selectivity or {})
+
+    def kind(self, cond: ConditionFieldEqualsValueExpression) -> str:
+        """Cost class of a field = value condition."""
+        value = cond.value
+        if isinstance(value, SigmaString):
+            if not value.contains_special():
+                return "eq"
+            return "substring" if _is_substring_pattern(value) else "glob"
+        elif isinstance(value, (SigmaNumber, SigmaBool)):
+            return "eq"
+        elif isinstance(value, SigmaRegularExpression):
+            return "regex"
+        elif isinstance(value, SigmaCompareExpression):
+            return "compare"
+        elif isinstance(value, SigmaNull):
+            return "null"
+        elif isinstance(value, SigmaExists):
+            return "exists" if value.exists else "null"
+        elif isinstance(value, (SigmaCIDRExpression, SigmaExpansion)):
+            return "glob"
+        return "unbound"
+
+    def probability(self, field: Optional[str], kind: str, count: int = 1) -> float:
+        """Probability that a predicate (or an IN list of count values) on field is true."""
+        probability = self.selectivity.get(field, self.probabilities[kind])
+        return min(1.0, probability * count)
+
+    def estimate(self, cond: ConditionItem) -> Estimate:
+        """Expected cost and match probability of a condition, with its children in best order."""
+        if isinstance(cond, ConditionAND):
+            cost, probability = 0.0, 1.0
+            for child_cost, child_probability in sorted(
+                map(self.estimate, cond.args), key=self.and_rank
+            ):
+                cost += probability * child_cost
+                probability *= child_probability
+            return cost, probability
+        elif isinstance(cond, ConditionOR):
+            if _is_in_candidate(cond):
+                field = cond.args[0].field
+                return self.costs["in"], self.probability(field, "eq", len(cond.args))
+            cost, missed = 0.0, 1.0
+            for child_cost, child_probability in sorted(
+                map(self.estimate, cond.args), key=self.or_rank
+            ):
+                cost += missed * child_cost
+                missed *= 1.0 - child_probability
+            return cost, 1.0 - missed
+        elif isinstance(cond, ConditionNOT):
+            cost, probability = self.estimate(cond.args[0])
+            return cost, 1.0 - probability
+        elif isinstance(cond, ConditionFieldEqualsValueExpression):
+            kind = self.kind(cond)
+            count = (
+                len(cond.value.values) if isinstance(cond.value, SigmaExpansion) else 1
+            )
+            return self.costs[kind] * count, self.probability(cond.field, kind, count)
+        return self.costs["unbound"], self.probabilities["unbound"]
+
+    @staticmethod
+    def and_rank(estimate: Estimate) -> float:
+        cost, probability = estimate
+        return cost / (1.0 - probability) if probability < 1.0 else float("inf")
+
+    @staticmethod
+    def or_rank(estimate: Estimate) -> float:
+        cost, probability = estimate
+        return cost / probability if probability > 0.0 else float("inf")
+
+    def order(self, cond: Union[ConditionAND, ConditionOR]) -> None:
+        """Sort the children of a single AND or OR node in place."""
+        rank = self.and_rank if isinstance(cond, ConditionAND) else self.or_rank
+        cond.args = sorted(cond.args, key=lambda arg: rank(self.estimate(arg)))
+
+    def reorder(self, cond: ConditionItem) -> ConditionItem:
+        """Sort the children of all AND and OR nodes of a condition tree in place."""
+        if isinstance(cond, (ConditionAND, ConditionOR)):
+            self.order(cond)
+        for arg in getattr(cond, "args", ()):
+            if isinstance(arg, ConditionItem):
+                self.reorder(arg)
+        return cond
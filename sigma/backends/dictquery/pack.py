@@ -0,0 +1,361 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Rule Pack
+
+A rule pack is a versioned binary file holding converted rules, so processes can load a rule set
+without parsing YAML or running pySigma. All integers are little-endian. The file starts with a
+header and a section table, followed by the sections:
+
+    header   magic "DQRPACK\\0", u16 version, u16 flags (1: case-insensitive), u32 section count
+    table    per section: 4 byte tag, u64 offset, u64 length
+    STRS     u32 count, u32 offsets[count + 1] into the UTF-8 data that follows; every field name,
+             operator, rule id and string literal is stored once and referenced by its index
+    CODE     expression trees in prefix order: AND/OR u8 opcode + u32 child count, NOT u8 opcode,
+             predicates u8 opcode + u32 operator + u32 field string + value
+    RULE     u32 count, per rule: u32 id string, u32 offset of its tree in CODE
+    PREF     prefilter index: u32 field count, per field u32 field string + u32 value count, per
+             value the value + u32 rule count + u32 rule positions; then u32 unindexed count and
+             u32 rule positions
+
+Values are a u8 tag followed by nothing (None, True, False), a u32 string index, an f64, an i64 or,
+for tuples, a u32 item count and the items.
+"""
+import mmap
+import struct
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from sigma.backends.dictquery.expression import And
+from sigma.backends.dictquery.expression import Expression
+from sigma.backends.dictquery.expression import Not
+from sigma.backends.dictquery.expression import Or
+from sigma.backends.dictquery.expression import Predicate
+from sigma.backends.dictquery.prefilter import PrefilterIndex
+from sigma.backends.dictquery.ruleset import RuleSet
+
+PACK_MAGIC = b"DQRPACK\0"
+# Bump when the layout changes; readers reject versions they don't know.
+PACK_VERSION = 1
+FLAG_CASE_INSENSITIVE = 1
+
+HEADER = struct.Struct("<8sHHI")
+SECTION = struct.Struct("<4sQQ")
+U8 = struct.Struct("<B")
+U32 = struct.Struct("<I")
+F64 = struct.Struct("<d")
+I64 = struct.Struct("<q")
+
+# Expression opcodes
+OP_AND, OP_OR, OP_NOT, OP_PREDICATE = range(1, 5)
+# Value tags
+TAG_NONE, TAG_TRUE, TAG_FALSE, TAG_STR, TAG_FLOAT, TAG_INT, TAG_TUPLE = range(7)
+
+
+class RulePackWriter:
+    """
+    RulePackWriter - encodes ``(rule id, expression)`` pairs and their prefilter index into a pack
+    """
+
+    def __init__(self, case_sensitive: bool = True):
+        self.case_sensitive = case_sensitive
+        self.strings: Dict[str, int] = {}
+        self.code = bytearray()
+
+    def string(self, value: str) -> int:
+        """Index of value in the string table, interned on first use."""
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def value(self, value: Any) -> bytes:
+        """Encoded predicate operand."""
+        if value is None:
+            return U8.pack(TAG_NONE)
+        elif value is True:
+            return U8.pack(TAG_TRUE)
+        elif value is False:
+            return U8.pack(TAG_FALSE)
+        elif isinstance(value, str):
+            return U8.pack(TAG_STR) + U32.pack(self.string(value))
+        elif isinstance(value, float):
+            return U8.pack(TAG_FLOAT) + F64.pack(value)
+        elif isinstance(value, int):
+            return U8.pack(TAG_INT) + I64.pack(value)
+        elif isinstance(value, tuple):
+            return (
+                U8.pack(TAG_TUPLE)
+                + U32.pack(len(value))
+                + b"".join(map(self.value, value))
+            )
+        raise TypeError(f"Values of type {value.__class__.__name__} can't be packed")
+
+    def expression(self, expr: Expression) -> None:
+        """Append the encoded expression tree to the code section."""
+        if isinstance(expr, (And, Or)):
+            self.code += U8.pack(OP_AND if isinstance(expr, And) else OP_OR)
+            self.code += U32.pack(len(expr.args))
+            for arg in expr.args:
+                self.expression(arg)
+        elif isinstance(expr, Not):
+            self.code += U8.pack(OP_NOT)
+            self.expression(expr.arg)
+        else:
+            self.code += U8.pack(OP_PREDICATE)
+            self.code += U32.pack(self.string(expr.op)) + U32.pack(
+                self.string(expr.field)
+            )
+            self.code += self.value(expr.value)
+
+    def prefilter(self, index: PrefilterIndex) -> bytes:
+        """Encoded prefilter index over rule positions."""
+        data = bytearray(U32.pack(len(index.index)))
+        for field, values in index.index.items():
+            data += U32.pack(self.string(field)) + U32.pack(len(values))
+            for value, positions in values.items():
+                data += self.value(value) + U32.pack(len(positions))
+                data += b"".join(U32.pack(position) for position in sorted(positions))
+        data += U32.pack(len(index.unindexed))
+        data += b"".join(U32.pack(position) for position in index.unindexed)
+        return bytes(data)
+
+    def write(self, rules: Sequence[Tuple[str, Expression]]) -> bytes:
+        """The complete pack of rules."""
+        entries = bytearray(U32.pack(len(rules)))
+        for ident, expr in rules:
+            entries += U32.pack(self.string(ident)) + U32.pack(len(self.code))
+            self.expression(expr)
+        prefilter = self.prefilter(
+            PrefilterIndex.from_rules(
+                [(position, expr) for position, (_, expr) in enumerate(rules)],
+                casefold=not self.case_sensitive,
+            )
+        )
+        encoded = [value.encode("utf-8") for value in self.strings]
+        offsets = [0]
+        for value in encoded:
+            offsets.append(offsets[-1] + len(value))
+        strings = (
+            U32.pack(len(encoded))
+            + struct.pack(f"<{len(offsets)}I", *offsets)
+            + b"".join(encoded)
+        )
+        sections = [
+            (b"STRS", strings),
+            (b"CODE", bytes(self.code)),
+            (b"RULE", bytes(entries)),
+            (b"PREF", prefilter),
+        ]
+        flags = 0 if self.case_sensitive else FLAG_CASE_INSENSITIVE
+        header = HEADER.pack(PACK_MAGIC, PACK_VERSION, flags, len(sections))
+        offset = len(header) + SECTION.size * len(sections)
+        table = bytearray()
+        for tag, data in sections:
+            table += SECTION.pack(tag, offset, len(data))
+            offset += len(data)
+        return header + bytes(table) + b"".join(data for _, data in sections)
+
+
+def write_pack(
+    path: Union[str, Path],
+    rules: Sequence[Tuple[str, Expression]],
+    case_sensitive: bool = True,
+) -> None:
+    """Write rules, e.g. a RuleSet's ``rules``, as a rule pack file."""
+    Path(path).write_bytes(RulePackWriter(case_sensitive).write(rules))
+
+
+def is_pack(path: Union[str, Path]) -> bool:
+    """Check whether path is a rule pack file by its magic number."""
+    path = Path(path)
+    if not path.is_file():
+        return False
+    with open(path, "rb") as f:
+        return f.read(len(PACK_MAGIC)) == PACK_MAGIC
+
+
+class RulePack:
+    """
+    RulePack - read-only view of a rule pack in a buffer or a memory-mapped file
+
+    Opening a pack only checks its header; strings are decoded when a rule referencing them is
+    read. Processes opening the same file share its pages through the page cache. A pack opened
+    from a file keeps it mapped until close() is called, or the with block using it ends.
+    """
+
+    def __init__(self, buffer: Any):
+        self.mapping: Optional[mmap.mmap] = None
+        self.buffer = memoryview(buffer)
+        self.sections: Dict[bytes, memoryview] = {}
+        self.offsets = self.string_data = self.buffer[:0]
+        try:
+            if len(self.buffer) < HEADER.size:
+                raise ValueError("Not a dictquery rule pack: file too short")
+            magic, version, flags, count = HEADER.unpack_from(self.buffer)
+            if magic != PACK_MAGIC:
+                raise ValueError("Not a dictquery rule pack")
+            if version != PACK_VERSION:
+                raise ValueError(
+                    f"Unsupported rule pack version {version}, expected {PACK_VERSION}"
+                )
+            self.version = version
+            self.case_sensitive = not flags & FLAG_CASE_INSENSITIVE
+            for index in range(count):
+                tag, offset, length = SECTION.unpack_from(
+                    self.buffer, HEADER.size + index * SECTION.size
+                )
+                self.sections[tag] = self.buffer[offset : offset + length]
+            strings = self.sections[b"STRS"]
+            (self.string_count,) = U32.unpack_from(strings)
+            self.offsets = strings[U32.size : U32.size * (self.string_count + 2)]
+            self.string_data = strings[U32.size * (self.string_count + 2) :]
+        except (KeyError, struct.error) as e:
+            self.close()
+            raise ValueError("Truncated or corrupt dictquery rule pack") from e
+        except BaseException:
+            # Views left on a memory-mapped file would keep it from being closed
+            self.close()
+            raise
+        self.decoded: Dict[int, str] = {}
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "RulePack":
+        """Memory-map a pack file read-only."""
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            pack = cls(mapping)
+        except BaseException:
+            mapping.close()
+            raise
+        pack.mapping = mapping
+        return pack
+
+    def __enter__(self) -> "RulePack":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the views of the buffer and unmap the file the pack was opened from."""
+        for view in self.sections.values():
+            view.release()
+        self.offsets.release()
+        self.string_data.release()
+        self.buffer.release()
+        if self.mapping is not None:
+            self.mapping.close()
+
+    def __len__(self) -> int:
+        return U32.unpack_from(self.sections[b"RULE"])[0]
+
+    def string(self, index: int) -> str:
+        """String number index of the string table."""
+        value = self.decoded.get(index)
+        if value is None:
+            start, end = struct.unpack_from("<II", self.offsets, U32.size * index)
+            value = self.decoded[index] = str(self.string_data[start:end], "utf-8")
+        return value
+
+    def value(self, data: memoryview, position: int) -> Tuple[Any, int]:
+        """Decode the value at position, returning it with the position after it."""
+        (tag,) = U8.unpack_from(data, position)
+        position += U8.size
+        if tag == TAG_NONE:
+            return None, position
+        elif tag == TAG_TRUE:
+            return True, position
+        elif tag == TAG_FALSE:
+            return False, position
+        elif tag == TAG_STR:
+            return self.string(U32.unpack_from(data, position)[0]), position + U32.size
+        elif tag == TAG_FLOAT:
+            return F64.unpack_from(data, position)[0], position + F64.size
+        elif tag == TAG_INT:
+            return I64.unpack_from(data, position)[0], position + I64.size
+        elif tag == TAG_TUPLE:
+            (count,) = U32.unpack_from(data, position)
+            position += U32.size
+            items = []
+            for _ in range(count):
+                item, position = self.value(data, position)
+                items.append(item)
+            return tuple(items), position
+        raise ValueError(f"Invalid value tag {tag} in rule pack")
+
+    def expression(self, position: int) -> Tuple[Expression, int]:
+        """Decode the expression tree at position of the code section."""
+        code = self.sections[b"CODE"]
+        (opcode,) = U8.unpack_from(code, position)
+        position += U8.size
+        if opcode in (OP_AND, OP_OR):
+            (count,) = U32.unpack_from(code, position)
+            position += U32.size
+            args = []
+            for _ in range(count):
+                arg, position = self.expression(position)
+                args.append(arg)
+            node = And if opcode == OP_AND else Or
+            return node(tuple(args)), position
+        elif opcode == OP_NOT:
+            arg, position = self.expression(position)
+            return Not(arg), position
+        elif opcode == OP_PREDICATE:
+            op, field = struct.unpack_from("<II", code, position)
+            value, position = self.value(code, position + 8)
+            return Predicate(self.string(op), self.string(field), value), position
+        raise ValueError(f"Invalid opcode {opcode} in rule pack")
+
+    def rules(self) -> List[Tuple[str, Expression]]:
+        """All ``(rule id, expression)`` pairs, in collection order."""
+        entries = self.sections[b"RULE"]
+        rules = []
+        for index in range(len(self)):
+            ident, position = struct.unpack_from("<II", entries, U32.size + 8 * index)
+            rules.append((self.string(ident), self.expression(position)[0]))
+        return rules
+
+    def prefilter(self) -> PrefilterIndex:
+        """The prefilter index over rule positions stored in the pack."""
+        data = self.sections[b"PREF"]
+        (fields,) = U32.unpack_from(data)
+        position = U32.size
+        index: Dict[str, Dict[Any, set]] = {}
+        for _ in range(fields):
+            field, count = struct.unpack_from("<II", data, position)
+            position += 8
+            values = index[self.string(field)] = {}
+            for _ in range(count):
+                value, position = self.value(data, position)
+                (length,) = U32.unpack_from(data, position)
+                position += U32.size
+                values[value] = set(struct.unpack_from(f"<{length}I", data, position))
+                position += U32.size * length
+        (length,) = U32.unpack_from(data, position)
+        unindexed = struct.unpack_from(f"<{length}I", data, position + U32.size)
+        return PrefilterIndex(index, unindexed, casefold=not self.case_sensitive)
+
+    def ruleset(
+        self,
+        prefilter: bool = True,
+        case_sensitive: Optional[bool] = None,
+        **options: bool,
+    ) -> RuleSet:
+        """
+        Rule set of the packed rules, see RuleSet for the options. The packed prefilter index is
+        used unless the rules are compared with another case sensitivity than the pack was written
+        for, which builds it again.
+        """
+        if case_sensitive is None:
+            case_sensitive = self.case_sensitive
+        if prefilter and case_sensitive == self.case_sensitive:
+            prefilter = self.prefilter()
+        return RuleSet(
+            self.rules(), prefilter=prefilter, case_sensitive=case_sensitive, **options
+        )
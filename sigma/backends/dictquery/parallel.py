@@ -0,0 +1,118 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Parallel Matcher
+"""
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from concurrent.futures import wait
+from itertools import islice
+from typing import Any
+from typing import Deque
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from sigma.backends.dictquery.ruleset import RuleSet
+
+Chunk = List[Tuple[Any, Any]]
+
+_worker_ruleset: Optional[RuleSet] = None
+
+
+def _init_worker(ruleset: RuleSet) -> None:
+    """Pool initializer, keeps the rule set sent once per worker process."""
+    global _worker_ruleset
+    _worker_ruleset = ruleset
+
+
+def _match_chunk(chunk: Chunk) -> List[Tuple[Any, str]]:
+    """Match a chunk of ``(key, event)`` pairs in a worker process."""
+    match = _worker_ruleset.match
+    return [(key, rule_id) for key, event in chunk for rule_id in match(event)]
+
+
+def chunked(events: Iterable[Tuple[Any, Any]], size: int) -> Iterator[Chunk]:
+    """Split events into lists of at most size items."""
+    events = iter(events)
+    while True:
+        chunk = list(islice(events, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ParallelMatcher:
+    """
+    ParallelMatcher - evaluates a rule set on chunks of events across a pool of worker processes
+
+    Rules are converted once in the parent process. The rule set is sent to every worker once, when
+    the pool starts, and recompiled there. Events are then read lazily and sent in chunks, and at
+    most ``2 * workers`` chunks are in flight at any time, so memory stays bounded for unbounded
+    input. Use it as a context manager or call close() to shut the pool down.
+    """
+
+    def __init__(
+        self,
+        ruleset: RuleSet,
+        workers: Optional[int] = None,
+        chunk_size: int = 1000,
+    ):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.ruleset = ruleset
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.pool = ProcessPoolExecutor(
+            self.workers, initializer=_init_worker, initargs=(ruleset,)
+        )
+
+    def __enter__(self) -> "ParallelMatcher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self.pool.shutdown()
+
+    def match_events(
+        self, events: Iterable[Tuple[Any, Any]], ordered: bool = True
+    ) -> Iterator[Tuple[Any, str]]:
+        """
+        Yield ``(key, rule id)`` for every rule matching each of the ``(key, event)`` pairs. Keys
+        are passed through untouched, e.g. the offsets of stream.read_events. With ordered, matches
+        are reported in input order, otherwise as soon as their chunk is done.
+        """
+        limit = 2 * self.workers
+        chunks = chunked(events, self.chunk_size)
+        if ordered:
+            queue: Deque[Future] = deque()
+            for chunk in chunks:
+                queue.append(self.pool.submit(_match_chunk, chunk))
+                if len(queue) >= limit:
+                    yield from queue.popleft().result()
+            while queue:
+                yield from queue.popleft().result()
+        else:
+            pending: Set[Future] = set()
+            for chunk in chunks:
+                pending.add(self.pool.submit(_match_chunk, chunk))
+                if len(pending) >= limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+            for future in as_completed(pending):
+                yield from future.result()
+
+    def match(
+        self, events: Iterable[Any], ordered: bool = True
+    ) -> Iterator[Tuple[int, str]]:
+        """Yield ``(event position, rule id)`` for every rule matching each event."""
+        return self.match_events(enumerate(events), ordered)
@@ -0,0 +1,132 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Prefilter Index
+"""
+from typing import Any
+from typing import Dict
+from typing import FrozenSet
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+
+from sigma.backends.dictquery import runtime
+from sigma.backends.dictquery.expression import EQ
+from sigma.backends.dictquery.expression import IN
+from sigma.backends.dictquery.expression import And
+from sigma.backends.dictquery.expression import Expression
+from sigma.backends.dictquery.expression import Or
+from sigma.backends.dictquery.expression import Predicate
+
+Requirement = FrozenSet[Tuple[str, Any]]
+
+
+def required_values(expr: Expression) -> Optional[Requirement]:
+    """
+    Field/value pairs of which at least one must be present in an event for expr to match, or None
+    if expr has no such equality requirement.
+    """
+    if isinstance(expr, Predicate):
+        if expr.op == EQ:
+            return frozenset(((expr.field, expr.value),))
+        elif expr.op == IN:
+            return frozenset((expr.field, value) for value in expr.value)
+    elif isinstance(expr, And):
+        candidates = [
+            requirement
+            for requirement in (required_values(arg) for arg in expr.args)
+            if requirement is not None
+        ]
+        if candidates:
+            return min(candidates, key=len)
+    elif isinstance(expr, Or) and expr.args:
+        requirements = [required_values(arg) for arg in expr.args]
+        if all(requirement is not None for requirement in requirements):
+            return frozenset().union(*requirements)
+    return None
+
+
+class PrefilterIndex:
+    """
+    PrefilterIndex - inverted index from field values to the rules requiring them
+
+    Every rule with an equality or IN requirement is filed under each of its required field/value
+    pairs. An event can only match those rules whose pair it contains, plus the unindexed rules,
+    so all other rules can be skipped without being evaluated. With casefold, string values are
+    indexed and looked up case folded, for rules matched case-insensitively.
+    """
+
+    def __init__(
+        self,
+        index: Dict[str, Dict[Any, Set[Hashable]]],
+        unindexed: Sequence[Hashable],
+        casefold: bool = False,
+    ):
+        self.index = index
+        self.unindexed: List[Hashable] = list(unindexed)
+        self.casefold = casefold
+        self.keys = {field: runtime.field_keys(field) for field in index}
+
+    @classmethod
+    def from_rules(
+        cls, rules: Sequence[Tuple[Hashable, Expression]], casefold: bool = False
+    ) -> "PrefilterIndex":
+        """Index ``(rule key, expression)`` pairs."""
+        index: Dict[str, Dict[Any, Set[Hashable]]] = {}
+        unindexed = []
+        for key, expr in rules:
+            requirement = required_values(expr)
+            if requirement is None:
+                unindexed.append(key)
+                continue
+            for field, value in sorted(requirement, key=repr):
+                if casefold and isinstance(value, str):
+                    value = value.casefold()
+                index.setdefault(field, {}).setdefault(value, set()).add(key)
+        return cls(index, unindexed, casefold)
+
+    def candidates(
+        self, event: Any, fields: Optional[Dict[Tuple[str, ...], List[Any]]] = None
+    ) -> Set[Hashable]:
+        """Keys of the indexed rules that may match event, fields is an optional lookup memo."""
+        if fields is None:
+            fields = {}
+        found: Set[Hashable] = set()
+        for field, values in self.index.items():
+            found_values = runtime.lookup(fields, event, self.keys[field])
+            if self.casefold:
+                found_values = runtime.fold(found_values)
+            for value in found_values:
+                try:
+                    keys = values.get(value)
+                except TypeError:
+                    continue
+                if keys is not None:
+                    found.update(keys)
+        return found
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable form, values are kept as ``[value, [rule keys]]`` pairs."""
+        data: Dict[str, Any] = {
+            "index": {
+                field: [[value, sorted(keys)] for value, keys in values.items()]
+                for field, values in self.index.items()
+            },
+            "unindexed": list(self.unindexed),
+        }
+        if self.casefold:
+            data["casefold"] = True
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PrefilterIndex":
+        """Load an index written by to_dict."""
+        return cls(
+            {
+                field: {value: set(keys) for value, keys in values}
+                for field, values in data["index"].items()
+            },
+            data["unindexed"],
+            data.get("casefold", False),
+        )
@@ -0,0 +1,304 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Profiling
+"""
+import time
+from collections import Counter
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+
+from sigma.backends.dictquery.compiler import PythonCallableCompiler
+from sigma.backends.dictquery.expression import CIDR
+from sigma.backends.dictquery.expression import CONTAINS
+from sigma.backends.dictquery.expression import ENDSWITH
+from sigma.backends.dictquery.expression import EQ
+from sigma.backends.dictquery.expression import EXISTS
+from sigma.backends.dictquery.expression import GT
+from sigma.backends.dictquery.expression import GTE
+from sigma.backends.dictquery.expression import IN
+from sigma.backends.dictquery.expression import LIKE
+from sigma.backends.dictquery.expression import LT
+from sigma.backends.dictquery.expression import LTE
+from sigma.backends.dictquery.expression import MATCH
+from sigma.backends.dictquery.expression import NULL
+from sigma.backends.dictquery.expression import STARTSWITH
+from sigma.backends.dictquery.expression import Expression
+
+# Compiler helper evaluating each predicate operator
+HELPER_OPS = {
+    "_eq": EQ,
+    "_like": LIKE,
+    "_startswith": STARTSWITH,
+    "_endswith": ENDSWITH,
+    "_contains": CONTAINS,
+    "_match": MATCH,
+    "_in": IN,
+    "_cidr": CIDR,
+    "_lt": LT,
+    "_lte": LTE,
+    "_gt": GT,
+    "_gte": GTE,
+    "_exists": EXISTS,
+    "_null": NULL,
+}
+
+PROMETHEUS_PREFIX = "dictquery"
+# Exported counters and their descriptions
+RULE_METRICS = {
+    "evaluations": "Evaluations of the rule condition.",
+    "hits": "Evaluations of the rule condition that matched.",
+    "short_circuits": "Evaluations of the rule condition decided before all of its predicates ran,"
+    " in sampled events.",
+    "skipped": "Events the prefilters excluded the rule for.",
+    "seconds": "Time spent evaluating the rule condition, in sampled events.",
+}
+PREDICATE_METRICS = {
+    "evaluations": "Evaluations of predicates with the operator, in sampled events.",
+    "hits": "Evaluations of predicates with the operator that were true, in sampled events.",
+    "short_circuits": "Predicates with the operator skipped by short-circuiting an AND or OR,"
+    " in sampled events.",
+    "seconds": "Time spent evaluating predicates with the operator, without field lookups,"
+    " in sampled events.",
+}
+
+
+@dataclass
+class Stats:
+    """Counters of a rule or predicate operator."""
+
+    evaluations: int = 0
+    hits: int = 0
+    short_circuits: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+    def add(self, other: "Stats") -> None:
+        """Add the counters of other."""
+        self.evaluations += other.evaluations
+        self.hits += other.hits
+        self.short_circuits += other.short_circuits
+        self.skipped += other.skipped
+        self.seconds += other.seconds
+
+
+def escape_label(value: str) -> str:
+    """Prometheus label value escaping."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Profile:
+    """
+    Profile - evaluation counters of every rule and predicate operator of a profiled RuleSet
+
+    ``RuleSet(..., profile=True)`` compiles the rule set as usual, lookups and sub-expressions still
+    shared between rules, with the hits of each rule, and the evaluations of those the prefilters
+    may exclude, counted by list increments inlined into the compiled function. That is all a
+    profiled rule set does unless sample is set: then every sample-th event is matched by a second
+    compilation that also times each rule, wraps the helper evaluating each predicate operator
+    (``like``, ``match``, ``in``, ``lt``, ...) to count and time its calls, and counts the
+    predicates each AND or OR skips when it short-circuits, while the other events only pay for
+    the counters.
+
+    Rule evaluations, hits and skipped (the events the prefilters excluded the rule for) cover
+    every event. Rule seconds and short_circuits (the evaluations decided before all predicates of
+    the rule ran) and all predicate counters cover the sampled events only, of which there are
+    ``sampled``; scale them by ``events / sampled`` to estimate totals. A predicate shared by
+    several rules is evaluated once per event and counted once, and a sub-expression shared by
+    several rules counts its short-circuits for the first rule evaluating it. Seconds exclude field
+    lookups.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[Tuple[str, Expression]],
+        guarded: Iterable[int] = (),
+        sample: int = 0,
+    ):
+        if sample < 0:
+            raise ValueError("sample must not be negative")
+        self.rule_ids: List[str] = [ident for ident, _ in rules]
+        self.guarded = set(guarded)
+        self.sample = sample
+        # Lists referenced by the compiled rule set, which increments them in place
+        self.counters: Dict[str, List[Any]] = {
+            "_events": [0],
+            "_sampled": [0],
+            "_evaluations": [0] * len(rules),
+            "_hits": [0] * len(rules),
+            "_short_circuits": [0] * len(rules),
+            "_seconds": [0.0] * len(rules),
+            # Short-circuits of each site of the timed compilation, see sites
+            "_sites": [],
+        }
+        self.predicates: Dict[str, Stats] = {}
+        # Predicates per operator skipped when each AND/OR child of the timed compilation decides
+        # its parent, i.e. the following siblings
+        self.sites: List[Tuple[Tuple[str, int], ...]] = []
+
+    @property
+    def events(self) -> int:
+        """Events matched against the rule set."""
+        return self.counters["_events"][0]
+
+    @property
+    def sampled(self) -> int:
+        """Events matched with timing enabled."""
+        return self.counters["_sampled"][0]
+
+    def namespace(self, timed: bool = False) -> Dict[str, Any]:
+        """
+        Globals of a rule set compiled with this profile: its counters, and with timed the clock
+        and predicate helpers that count and time their calls.
+        """
+        namespace: Dict[str, Any] = dict(self.counters)
+        if timed:
+            namespace["_clock"] = time.perf_counter
+            for name, op in HELPER_OPS.items():
+                namespace[name] = self.timed(op, PythonCallableCompiler.helpers[name])
+        return namespace
+
+    def timed(self, op: str, function: Callable[..., bool]) -> Callable[..., bool]:
+        """Wrap the helper of a predicate operator to count and time its calls."""
+        stats = self.predicates.setdefault(op, Stats())
+        clock = time.perf_counter
+
+        def call(*args: Any) -> bool:
+            start = clock()
+            result = function(*args)
+            stats.seconds += clock() - start
+            stats.evaluations += 1
+            if result:
+                stats.hits += 1
+            return result
+
+        return call
+
+    def site(self, skipped: Tuple[Tuple[str, int], ...]) -> int:
+        """Add a short-circuit site skipping the given number of predicates per operator."""
+        self.sites.append(skipped)
+        self.counters["_sites"].append(0)
+        return len(self.sites) - 1
+
+    def sampling(
+        self,
+        counted: Callable[[Any, Set[int], Any], List[str]],
+        timed: Callable[[Any, Set[int], Any], List[str]],
+    ) -> Callable[[Any, Set[int], Any], List[str]]:
+        """Rule set function matching every sample-th event with timed and the others with counted."""
+        events, sample = self.counters["_events"], self.sample
+
+        def match(event: Any, candidates: Set[int], fields: Any) -> List[str]:
+            if events[0] % sample:
+                return counted(event, candidates, fields)
+            return timed(event, candidates, fields)
+
+        return match
+
+    def reset(self) -> None:
+        """Zero all counters."""
+        for counter in self.counters.values():
+            counter[:] = [0 * value for value in counter]
+        for stats in self.predicates.values():
+            stats.__init__()
+
+    def rule_stats(self) -> Dict[str, Stats]:
+        """Counters per rule id, summed over the conditions of rules with several."""
+        events = self.events
+        counters = zip(
+            self.rule_ids,
+            self.counters["_evaluations"],
+            self.counters["_hits"],
+            self.counters["_short_circuits"],
+            self.counters["_seconds"],
+        )
+        totals: Dict[str, Stats] = {}
+        for index, (ident, evaluations, hits, shorts, seconds) in enumerate(counters):
+            # Only rules the prefilters may exclude count their evaluations
+            if index not in self.guarded:
+                evaluations = events
+            skipped = events - evaluations
+            totals.setdefault(ident, Stats()).add(
+                Stats(evaluations, hits, shorts, skipped, seconds)
+            )
+        return totals
+
+    def predicate_stats(self) -> Dict[str, Stats]:
+        """Counters per predicate operator evaluated or skipped in sampled events."""
+        shorts: Counter = Counter()
+        for skipped, times in zip(self.sites, self.counters["_sites"]):
+            for op, count in skipped:
+                shorts[op] += count * times
+        return {
+            op: Stats(stats.evaluations, stats.hits, shorts[op], 0, stats.seconds)
+            for op, stats in sorted(self.predicates.items())
+            if stats.evaluations or shorts[op]
+        }
+
+    def top(self, count: int = 10, key: str = "seconds") -> List[Tuple[str, Stats]]:
+        """The count rules with the highest value of a counter, by default the most expensive."""
+        return sorted(
+            self.rule_stats().items(),
+            key=lambda item: getattr(item[1], key),
+            reverse=True,
+        )[:count]
+
+    def report(self, count: int = 10) -> str:
+        """Text table of the top count rules, by time if events were sampled, else by hits."""
+        key = "seconds" if self.sampled else "hits"
+        lines = [
+            f"{self.events} events, {self.sampled} sampled",
+            f"{'seconds':>10} {'evaluations':>12} {'hits':>8} {'skipped':>8}  rule",
+        ]
+        for ident, stats in self.top(count, key):
+            lines.append(
+                f"{stats.seconds:10.6f} {stats.evaluations:12d} {stats.hits:8d}"
+                f" {stats.skipped:8d}  {ident}"
+            )
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable counters of all rules and predicate operators."""
+        return {
+            "events": self.events,
+            "sampled": self.sampled,
+            "rules": {
+                ident: asdict(stats) for ident, stats in self.rule_stats().items()
+            },
+            "predicates": {
+                op: {name: getattr(stats, name) for name in PREDICATE_METRICS}
+                for op, stats in self.predicate_stats().items()
+            },
+        }
+
+    def prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        """Counters in the Prometheus text exposition format."""
+        lines: List[str] = []
+        totals = [
+            ("events", "Events matched against the rule set.", self.events),
+            ("sampled_events", "Events matched with timing enabled.", self.sampled),
+        ]
+        for counter, description, value in totals:
+            name = f"{prefix}_{counter}_total"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+        groups = [
+            ("rule", "rule", self.rule_stats(), RULE_METRICS),
+            ("predicate", "op", self.predicate_stats(), PREDICATE_METRICS),
+        ]
+        for kind, label, stats, metrics in groups:
+            for counter, description in metrics.items():
+                name = f"{prefix}_{kind}_{counter}_total"
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} counter")
+                for key, values in stats.items():
+                    value = getattr(values, counter)
+                    lines.append(f'{name}{{{label}="{escape_label(key)}"}} {value}')
+        return "\n".join(lines) + "\n"
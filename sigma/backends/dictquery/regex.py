@@ -0,0 +1,133 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Regex Table
+"""
+import re
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Pattern
+from typing import Sequence
+from typing import Tuple
+
+from sigma.backends.dictquery.expression import MATCH
+from sigma.backends.dictquery.expression import Expression
+from sigma.backends.dictquery.expression import Predicate
+from sigma.backends.dictquery.expression import walk
+
+# Leading flag group as emitted by the backend with re_flag_prefix, e.g. (?i)
+flag_prefix_pattern = re.compile(r"^\(\?([aiLmsux]+)\)")
+# Constructs that break when a pattern is embedded into a larger alternation
+unmergeable_pattern = re.compile(
+    r"\\[1-9]|\\g<|\(\?P[<=]|\(\?<|\(\?\(|\(\?[aiLmsux]+\)"
+)
+
+
+def scoped(pattern: str) -> str:
+    """Turn a leading global flag group into a scoped one, e.g. (?i)abc into (?i:abc)."""
+    prefix = flag_prefix_pattern.match(pattern)
+    if prefix is None:
+        return f"(?:{pattern})"
+    return f"(?{prefix.group(1)}:{pattern[prefix.end():]})"
+
+
+class RegexTable:
+    """
+    RegexTable - deduplicated, precompiled regular expressions of MATCH predicates
+
+    Every distinct pattern is compiled exactly once, with its flags taken from the leading flag
+    group. Optionally the patterns of each field are merged into one alternation with a named group
+    per pattern, so a single match call rejects a value for all of them and reports which pattern
+    matched.
+    """
+
+    def __init__(self):
+        self.patterns: Dict[str, Pattern] = {}
+        self.fields: Dict[str, List[str]] = {}
+        self.merged: Dict[str, Tuple[Pattern, List[str], List[str]]] = {}
+
+    @classmethod
+    def from_rules(
+        cls, rules: Sequence[Tuple[Any, Expression]], merge: bool = False
+    ) -> "RegexTable":
+        """Collect the MATCH patterns of ``(rule key, expression)`` pairs."""
+        table = cls()
+        for _, expr in rules:
+            for node in walk(expr):
+                if isinstance(node, Predicate) and node.op == MATCH:
+                    table.add(node.field, node.value)
+        if merge:
+            table.merge()
+        return table
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def compile(self, pattern: str) -> Pattern:
+        """Compiled form of pattern, compiled on first use only."""
+        compiled = self.patterns.get(pattern)
+        if compiled is None:
+            compiled = self.patterns[pattern] = re.compile(pattern)
+        return compiled
+
+    def add(self, field: str, pattern: str) -> Pattern:
+        """Register pattern as used on field and return its compiled form."""
+        patterns = self.fields.setdefault(field, [])
+        if pattern not in patterns:
+            patterns.append(pattern)
+            self.merged.pop(field, None)
+        return self.compile(pattern)
+
+    def merge(self) -> None:
+        """Merge the patterns of every field into a single alternation where possible."""
+        for field, patterns in self.fields.items():
+            mergeable = [
+                pattern
+                for pattern in patterns
+                if not unmergeable_pattern.search(
+                    flag_prefix_pattern.sub("", pattern, count=1)
+                )
+            ]
+            if len(mergeable) < 2:
+                continue
+            try:
+                merged = re.compile(
+                    "|".join(
+                        f"(?P<r{index}>{scoped(pattern)})"
+                        for index, pattern in enumerate(mergeable)
+                    )
+                )
+            except re.error:
+                continue
+            separate = [pattern for pattern in patterns if pattern not in mergeable]
+            self.merged[field] = (merged, mergeable, separate)
+
+    def matching(self, field: str, value: Any) -> List[str]:
+        """All patterns registered for field that match value."""
+        if not isinstance(value, str):
+            return []
+        merged: Optional[Tuple[Pattern, List[str], List[str]]] = self.merged.get(field)
+        if merged is None:
+            return [
+                pattern
+                for pattern in self.fields.get(field, ())
+                if self.patterns[pattern].match(value) is not None
+            ]
+        alternation, mergeable, separate = merged
+        found = []
+        hit = alternation.match(value)
+        if hit is not None:
+            # Alternatives before the reported one failed, later ones still need checking.
+            first = int(hit.lastgroup[1:])
+            found.append(mergeable[first])
+            found.extend(
+                pattern
+                for pattern in mergeable[first + 1 :]
+                if self.patterns[pattern].match(value) is not None
+            )
+        found.extend(
+            pattern
+            for pattern in separate
+            if self.patterns[pattern].match(value) is not None
+        )
+        return [pattern for pattern in self.fields[field] if pattern in found]
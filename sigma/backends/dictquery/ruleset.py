@@ -0,0 +1,281 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Rule Set
+"""
+from collections import Counter
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from sigma.collection import SigmaCollection
+from sigma.rule import SigmaRule
+
+from sigma.backends.dictquery.compiler import PythonCallableCompiler
+from sigma.backends.dictquery.expression import And
+from sigma.backends.dictquery.expression import Expression
+from sigma.backends.dictquery.expression import Or
+from sigma.backends.dictquery.expression import Predicate
+from sigma.backends.dictquery.expression import walk
+from sigma.backends.dictquery.prefilter import PrefilterIndex
+from sigma.backends.dictquery.profiling import Profile
+from sigma.backends.dictquery.regex import RegexTable
+from sigma.backends.dictquery.substring import SubstringPrefilter
+
+
+def rule_id(rule: SigmaRule) -> str:
+    """Identifier reported for matches of a rule: its id, or its title if it has none."""
+    return str(rule.id) if rule.id is not None else rule.title
+
+
+class RuleSetCompiler(PythonCallableCompiler):
+    """
+    RuleSetCompiler - compiles all rules of a rule set into one function
+
+    Field lookups and sub-expressions are shared across the whole rule set, so they are evaluated
+    at most once per event even if several rules use them, and fields the prefilters already looked
+    up for the event aren't walked again. With a profile, the events, the hits of each rule and
+    the evaluations of guarded ones are counted in its lists, and with timed each rule and
+    predicate is timed and the short-circuits of each AND and OR are counted as well (see Profile).
+    """
+
+    def __init__(
+        self,
+        regexes: Optional[RegexTable] = None,
+        case_sensitive: bool = True,
+        profile: Optional[Profile] = None,
+        timed: bool = False,
+    ):
+        super().__init__(regexes, case_sensitive)
+        self.profile = profile
+        self.timed = timed
+        # Short-circuit sites of the rule being generated, each flagged in the local _s<position>
+        self.rule_sites: List[int] = []
+        if profile is not None:
+            self.namespace.update(profile.namespace(timed))
+
+    def generate_node(self, expr: Expression) -> str:
+        """Python expression source, with timed counting the predicates AND and OR skip."""
+        if not self.timed or not isinstance(expr, (And, Or)) or len(expr.args) < 2:
+            return super().generate_node(expr)
+        # Each child but the last flags its site if it decides the AND or OR, evaluating to the
+        # deciding value, and the rule counts its flagged sites once evaluated
+        decided = isinstance(expr, Or)
+        terms = []
+        for position, arg in enumerate(expr.args[:-1]):
+            skipped = tuple(
+                sorted(
+                    Counter(
+                        node.op
+                        for rest in expr.args[position + 1 :]
+                        for node in walk(rest)
+                        if isinstance(node, Predicate)
+                    ).items()
+                )
+            )
+            flag = f"_s{len(self.rule_sites)}"
+            self.rule_sites.append(self.profile.site(skipped))
+            if decided:
+                terms.append(f"({self.generate(arg)} and ({flag} := True))")
+            else:
+                terms.append(f"({self.generate(arg)} or not ({flag} := True))")
+        terms.append(self.generate(expr.args[-1]))
+        return "(" + (" or " if decided else " and ").join(terms) + ")"
+
+    def compile_rules(
+        self,
+        rule_ids: Sequence[str],
+        exprs: Sequence[Expression],
+        guarded: Optional[Set[int]] = None,
+        seeded: Iterable[str] = (),
+    ) -> Callable[[Any, Set[int], Dict[Tuple[str, ...], List[Any]]], List[str]]:
+        """
+        Compile ``def match(event, candidates, fields) -> List[str]`` returning the ids of all
+        matching rules. fields maps the nested keys of paths the caller already resolved to their
+        values (see ``runtime.lookup``), which the fields in seeded start from. Rules whose position
+        is in guarded are only evaluated if it is also in candidates.
+        """
+        self.share(exprs, seeded)
+        ids = self.constant(("ids", tuple(rule_ids)), lambda: tuple(rule_ids))
+        lines = ["def match(event, candidates, fields):"]
+        lines.extend(self.slots())
+        lines.append("    hits = []")
+        if self.profile is not None:
+            lines.append("    _events[0] += 1")
+            if self.timed:
+                lines.append("    _sampled[0] += 1")
+        for index, expr in enumerate(exprs):
+            guard = guarded is not None and index in guarded
+            if self.profile is None:
+                condition = self.generate(expr)
+                if guard:
+                    condition = f"{index} in candidates and {condition}"
+                lines.append(f"    if {condition}:")
+                lines.append(f"        hits.append({ids}[{index}])")
+                continue
+            # Rules outside guarded are evaluated for every event, so only guarded ones count
+            # their evaluations
+            indent = "    "
+            if guard:
+                lines.append(f"    if {index} in candidates:")
+                lines.append(f"        _evaluations[{index}] += 1")
+                indent += "    "
+            self.rule_sites = []
+            condition = self.generate(expr)
+            if self.timed:
+                flags = [f"_s{position}" for position in range(len(self.rule_sites))]
+                if flags:
+                    lines.append(f"{indent}{' = '.join(flags)} = False")
+                lines.append(f"{indent}_start = _clock()")
+                lines.append(f"{indent}_result = {condition}")
+                lines.append(f"{indent}_seconds[{index}] += _clock() - _start")
+                if flags:
+                    lines.append(f"{indent}if {' or '.join(flags)}:")
+                    lines.append(f"{indent}    _short_circuits[{index}] += 1")
+                    for flag, site in zip(flags, self.rule_sites):
+                        if len(flags) == 1:  # the only flag, tested above
+                            lines.append(f"{indent}    _sites[{site}] += 1")
+                            continue
+                        lines.append(f"{indent}    if {flag}:")
+                        lines.append(f"{indent}        _sites[{site}] += 1")
+                condition = "_result"
+            lines.append(f"{indent}if {condition}:")
+            lines.append(f"{indent}    _hits[{index}] += 1")
+            lines.append(f"{indent}    hits.append({ids}[{index}])")
+        lines.append("    return hits")
+        code = compile("\n".join(lines) + "\n", "<dictquery ruleset>", "exec")
+        scope: Dict[str, Any] = {}
+        exec(code, self.namespace, scope)
+        return scope["match"]
+
+
+class RuleSet:
+    """
+    RuleSet - evaluates a whole converted collection against an event in one pass
+
+    Built from ``(rule id, expression)`` pairs, usually with ``DictQueryBackend().convert(collection,
+    "ruleset")``. A rule with several conditions is reported once if any of them matches. With
+    prefilter enabled, rules requiring a field value the event doesn't contain are skipped without
+    being evaluated; a PrefilterIndex over the rule positions, e.g. one read from a rule pack, is
+    used instead of building one. With substring_prefilter enabled, the remaining rules requiring a
+    literal in a LIKE pattern are skipped as well unless that literal occurs in the event. With
+    case_sensitive disabled, strings are compared case-insensitively (see PythonCallableCompiler).
+    With profile enabled, evaluations and hits are counted per rule in ``profile``; with
+    profile_sample set as well, every profile_sample-th event is timed per rule and predicate
+    operator (see Profile).
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[Tuple[str, Expression]],
+        prefilter: Union[bool, PrefilterIndex] = True,
+        substring_prefilter: bool = False,
+        case_sensitive: bool = True,
+        profile: bool = False,
+        profile_sample: int = 0,
+    ):
+        self.rules: List[Tuple[str, Expression]] = list(rules)
+        ids = [ident for ident, _ in self.rules]
+        exprs = [expr for _, expr in self.rules]
+        self.prefilter: Optional[PrefilterIndex] = None
+        self.substring_prefilter: Optional[SubstringPrefilter] = None
+        unindexed = list(enumerate(exprs))
+        if isinstance(prefilter, PrefilterIndex):
+            self.prefilter = prefilter
+        elif prefilter:
+            self.prefilter = PrefilterIndex.from_rules(
+                unindexed, casefold=not case_sensitive
+            )
+        if self.prefilter is not None:
+            unindexed = [(index, exprs[index]) for index in self.prefilter.unindexed]
+        if substring_prefilter:
+            self.substring_prefilter = SubstringPrefilter.from_rules(
+                unindexed, casefold=not case_sensitive
+            )
+            unindexed = [
+                (index, exprs[index]) for index in self.substring_prefilter.unindexed
+            ]
+        guarded = set(range(len(exprs))) - {index for index, _ in unindexed}
+        prefiltered = set()
+        if self.prefilter is not None:
+            prefiltered.update(self.prefilter.index)
+        if self.substring_prefilter is not None:
+            prefiltered.update(self.substring_prefilter.literals)
+        self.case_sensitive = case_sensitive
+        self.profile: Optional[Profile] = None
+        if profile:
+            self.profile = Profile(self.rules, guarded, profile_sample)
+        compiler = RuleSetCompiler(case_sensitive=case_sensitive, profile=self.profile)
+        self._match = compiler.compile_rules(ids, exprs, guarded, prefiltered)
+        if self.profile is not None and profile_sample:
+            timed = RuleSetCompiler(
+                compiler.regexes, case_sensitive, self.profile, timed=True
+            ).compile_rules(ids, exprs, guarded, prefiltered)
+            self._match = self.profile.sampling(self._match, timed)
+        self.regexes: RegexTable = compiler.regexes
+        self._unique = len(set(ids)) == len(ids)
+
+    @classmethod
+    def from_collection(
+        cls,
+        rule_collection: SigmaCollection,
+        backend: Optional[Any] = None,
+        **options: bool,
+    ) -> "RuleSet":
+        """Convert a collection with the given (or a default) backend into a rule set."""
+        if backend is None:
+            from sigma.backends.dictquery.dictquery import DictQueryBackend
+
+            backend = DictQueryBackend()
+        return cls(
+            [
+                query
+                for rule in rule_collection.rules
+                for query in backend.convert_rule(rule, "ruleset")
+            ],
+            **options,
+        )
+
+    @property
+    def rule_ids(self) -> List[str]:
+        """Ids of all rules, in collection order."""
+        return list(dict.fromkeys(ident for ident, _ in self.rules))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def __reduce__(self):
+        # Compiled functions can't be pickled, so rule sets are rebuilt from their rules instead,
+        # e.g. when sent to worker processes.
+        options = (
+            self.prefilter is not None,
+            self.substring_prefilter is not None,
+            self.case_sensitive,
+            self.profile is not None,
+            self.profile.sample if self.profile is not None else 0,
+        )
+        return self.__class__, (self.rules, *options)
+
+    def match(
+        self, event: Any, fields: Optional[Dict[Tuple[str, ...], List[Any]]] = None
+    ) -> List[str]:
+        """
+        Ids of all rules matching event, in collection order. fields is the memo of field paths
+        resolved for event (see ``runtime.lookup``), to share it between rule sets.
+        """
+        if fields is None:
+            fields = {}
+        candidates = (
+            self.prefilter.candidates(event, fields) if self.prefilter else set()
+        )
+        if self.substring_prefilter is not None:
+            candidates |= self.substring_prefilter.candidates(event, fields)
+        hits = self._match(event, candidates, fields)
+        if self._unique:
+            return hits
+        return list(dict.fromkeys(hits))
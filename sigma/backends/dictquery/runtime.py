@@ -0,0 +1,231 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Runtime
+
+Helpers called by compiled predicates. They mirror dictquery's default evaluation (nested keys
+split on ``.``, case-sensitive, any-of semantics over the values a key resolves to) so a compiled
+rule agrees with running the converted query through dictquery. Where dictquery would raise a
+TypeError (a glob, regex or comparison against a value of the wrong type) the value simply doesn't
+match. For case-insensitive matching the values of a field are case folded once with fold, instead
+of once per comparison.
+"""
+from collections.abc import Iterable
+from collections.abc import Mapping
+from collections.abc import Sequence
+from typing import Any
+from typing import Collection
+from typing import Dict
+from typing import List
+from typing import Pattern
+from typing import Tuple
+
+KEY_SEPARATOR = "."
+
+
+def field_keys(field: str) -> Tuple[str, ...]:
+    """Split a field name into the nested keys dictquery walks."""
+    return tuple(field.split(KEY_SEPARATOR))
+
+
+def _is_instance(obj: Any) -> bool:
+    """is custom class instance"""
+    return hasattr(obj, "__dict__") or hasattr(obj, "__slots__")
+
+
+def _children(value: Any, key: str) -> List[Any]:
+    """Values found under key in a mapping, an object or a list of those."""
+    if type(value) is dict or isinstance(value, Mapping):
+        try:
+            return [value[key]]
+        except KeyError:
+            return []
+    elif _is_instance(value):
+        try:
+            return [getattr(value, key)]
+        except AttributeError:
+            return []
+    elif isinstance(value, (Iterable, Sequence)):
+        found = []
+        for item in value:
+            if type(item) is dict or isinstance(item, Mapping):
+                try:
+                    found.append(item[key])
+                except KeyError:
+                    continue
+            elif _is_instance(item):
+                try:
+                    found.append(getattr(item, key))
+                except AttributeError:
+                    continue
+        return found
+    return []
+
+
+def query_values(values: List[Any], keys: Tuple[str, ...]) -> List[Any]:
+    """
+    All values reachable from any of values through the nested keys. A missing key contributes no
+    values, a list on the path is walked into its mappings and objects (lists nested directly in a
+    list are not), and a list at the end of the path is a single value.
+    """
+    for key in keys:
+        if not values:
+            break
+        found = []
+        for value in values:
+            found.extend(_children(value, key))
+        values = found
+    return values
+
+
+def query_value(data: Any, keys: Tuple[str, ...]) -> List[Any]:
+    """All values reachable from data through the nested keys."""
+    return query_values([data], keys)
+
+
+def lookup(
+    memo: Dict[Tuple[str, ...], List[Any]], event: Any, keys: Tuple[str, ...]
+) -> List[Any]:
+    """
+    Same as ``query_value(event, keys)``, memoized per event: memo holds the values of every path
+    and path prefix already resolved, so fields sharing a prefix such as ``process.name`` and
+    ``process.pid`` walk it only once. The returned list must not be modified.
+    """
+    values = memo.get(keys)
+    if values is None:
+        if len(keys) == 1:
+            values = memo[keys] = _children(event, keys[0])
+        else:
+            parent = lookup(memo, event, keys[:-1])
+            values = memo[keys] = query_values(parent, keys[-1:])
+    return values
+
+
+def fold(values: List[Any]) -> List[Any]:
+    """Values with all strings case folded, compared against operands folded at compile time."""
+    return [value.casefold() if isinstance(value, str) else value for value in values]
+
+
+def eq(values: List[Any], other: Any) -> bool:
+    """field == value"""
+    for value in values:
+        if value == other:
+            return True
+    return False
+
+
+def like(values: List[Any], pattern: Pattern) -> bool:
+    """field LIKE 'glob', pattern is the fnmatch translation of the glob."""
+    for value in values:
+        if isinstance(value, str) and pattern.match(value) is not None:
+            return True
+    return False
+
+
+def startswith(values: List[Any], prefix: str) -> bool:
+    """field LIKE 'prefix*'"""
+    for value in values:
+        if isinstance(value, str) and value.startswith(prefix):
+            return True
+    return False
+
+
+def endswith(values: List[Any], suffix: str) -> bool:
+    """field LIKE '*suffix'"""
+    for value in values:
+        if isinstance(value, str) and value.endswith(suffix):
+            return True
+    return False
+
+
+def contains(values: List[Any], literal: str) -> bool:
+    """field LIKE '*literal*'"""
+    for value in values:
+        if isinstance(value, str) and literal in value:
+            return True
+    return False
+
+
+def match(values: List[Any], pattern: Pattern) -> bool:
+    """field MATCH /regex/"""
+    for value in values:
+        if isinstance(value, str) and pattern.match(value) is not None:
+            return True
+    return False
+
+
+def cidr(values: List[Any], table: Any, key: int) -> bool:
+    """field|cidr, key is the predicate's key in the field's CidrTable."""
+    return key in table.matching(values)
+
+
+def is_in(values: List[Any], choices: Tuple[Any, ...], lookup: Collection) -> bool:
+    """field IN [list], using the hashed lookup where the value allows it."""
+    for value in values:
+        try:
+            if value in lookup:
+                return True
+        except TypeError:
+            if value in choices:
+                return True
+    return False
+
+
+def lt(values: List[Any], other: Any) -> bool:
+    """field < value"""
+    for value in values:
+        try:
+            if value < other:
+                return True
+        except TypeError:
+            continue
+    return False
+
+
+def lte(values: List[Any], other: Any) -> bool:
+    """field <= value"""
+    for value in values:
+        try:
+            if value <= other:
+                return True
+        except TypeError:
+            continue
+    return False
+
+
+def gt(values: List[Any], other: Any) -> bool:
+    """field > value"""
+    for value in values:
+        try:
+            if value > other:
+                return True
+        except TypeError:
+            continue
+    return False
+
+
+def gte(values: List[Any], other: Any) -> bool:
+    """field >= value"""
+    for value in values:
+        try:
+            if value >= other:
+                return True
+        except TypeError:
+            continue
+    return False
+
+
+def exists(values: List[Any]) -> bool:
+    """Bare field reference, true if any value is truthy."""
+    for value in values:
+        if value:
+            return True
+    return False
+
+
+def null(values: List[Any]) -> bool:
+    """field is null, true if the field is missing or holds None."""
+    if not values:
+        return True
+    for value in values:
+        if value is None:
+            return True
+    return False
@@ -0,0 +1,244 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Streaming Matcher
+"""
+import argparse
+import gzip
+import json
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+from typing import BinaryIO
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery.cache import ConversionCache
+from sigma.backends.dictquery.cache import read_documents
+from sigma.backends.dictquery.cache import rule_files
+from sigma.backends.dictquery.pack import RulePack
+from sigma.backends.dictquery.pack import is_pack
+from sigma.backends.dictquery.parallel import ParallelMatcher
+from sigma.backends.dictquery.profiling import Profile
+from sigma.backends.dictquery.ruleset import RuleSet
+
+GZIP_MAGIC = b"\x1f\x8b"
+STDIN = "-"
+
+Source = Union[str, Path, BinaryIO]
+
+
+def is_gzip(stream: BinaryIO) -> bool:
+    """Check for the gzip magic number without consuming input."""
+    if hasattr(stream, "peek"):
+        return stream.peek(2)[:2] == GZIP_MAGIC
+    elif stream.seekable():
+        position = stream.tell()
+        magic = stream.read(2)
+        stream.seek(position)
+        return magic == GZIP_MAGIC
+    return False
+
+
+@contextmanager
+def open_events(source: Source) -> Iterator[BinaryIO]:
+    """
+    Open an event source for binary reading: a path, ``-`` for stdin or a binary file object. Gzip
+    compressed input is detected by its magic number and decompressed on the fly.
+    """
+    if source == STDIN:
+        stream, close = sys.stdin.buffer, False
+    elif isinstance(source, (str, Path)):
+        stream, close = open(source, "rb"), True
+    else:
+        stream, close = source, False
+    try:
+        if is_gzip(stream):
+            with gzip.GzipFile(fileobj=stream) as decompressed:
+                yield decompressed
+        else:
+            yield stream
+    finally:
+        if close:
+            stream.close()
+
+
+def read_events(
+    stream: BinaryIO, skip_invalid: bool = False
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Lazily parse JSON lines, yielding ``(byte offset of the line, event)``. Blank lines are skipped,
+    invalid lines raise a ValueError naming their offset unless skip_invalid is set.
+    """
+    offset = 0
+    for line in stream:
+        start, offset = offset, offset + len(line)
+        if not line.strip():
+            continue
+        try:
+            yield start, json.loads(line)
+        except ValueError as e:
+            if skip_invalid:
+                continue
+            raise ValueError(f"Invalid JSON event at offset {start}: {e}") from e
+
+
+def match_events(
+    ruleset: RuleSet, events: Iterable[Tuple[int, Any]]
+) -> Iterator[Tuple[int, str]]:
+    """Yield ``(event offset, rule id)`` for every rule matching each event."""
+    for offset, event in events:
+        for rule_id in ruleset.match(event):
+            yield offset, rule_id
+
+
+def match_source(
+    ruleset: RuleSet, source: Source, skip_invalid: bool = False
+) -> Iterator[Tuple[int, str]]:
+    """Yield ``(event offset, rule id)`` matches for a JSONL/NDJSON file, gzip file or stdin."""
+    with open_events(source) as stream:
+        yield from match_events(ruleset, read_events(stream, skip_invalid))
+
+
+def load_ruleset(
+    paths: Sequence[Union[str, Path]],
+    cache: Optional[Union[str, Path]] = None,
+    **options: bool,
+) -> RuleSet:
+    """
+    Load Sigma rule files and directories (recursing into ``*.yml`` files) into a rule set. Rule
+    files are loaded in sorted order so matches are reported in the same order on every system.
+    With cache, converted rules are kept in that directory and only changed files are converted.
+    A single rule pack file (see write_pack) is memory-mapped and loaded without any conversion.
+    """
+    if len(paths) == 1 and is_pack(paths[0]):
+        with RulePack.open(paths[0]) as pack:
+            return pack.ruleset(**options)
+    if cache is not None:
+        return RuleSet(
+            ConversionCache(cache).queries(read_documents(paths), "ruleset"), **options
+        )
+    return RuleSet.from_collection(
+        SigmaCollection.load_ruleset(rule_files(paths)), **options
+    )
+
+
+def write_profile(profile: Profile, path: Union[str, Path]) -> None:
+    """Write profile counters as Prometheus text for ``*.prom`` files, as JSON otherwise."""
+    if str(path).endswith(".prom"):
+        text = profile.prometheus()
+    else:
+        text = json.dumps(profile.to_dict(), indent=2) + "\n"
+    Path(path).write_text(text, encoding="utf-8")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """sigma-dictquery-match command line entry point"""
+    parser = argparse.ArgumentParser(
+        prog="sigma-dictquery-match",
+        description="Match Sigma rules against JSON lines events, printing one JSON object per match.",
+    )
+    parser.add_argument(
+        "rules", help="Sigma rule file or directory, or a rule pack file"
+    )
+    parser.add_argument(
+        "events",
+        nargs="*",
+        default=[STDIN],
+        help="JSONL/NDJSON event files, optionally gzip compressed (default: stdin)",
+    )
+    parser.add_argument(
+        "--skip-invalid", action="store_true", help="skip lines that aren't valid JSON"
+    )
+    parser.add_argument(
+        "--substring-prefilter",
+        action="store_true",
+        help="prefilter contains/startswith/endswith rules with Aho-Corasick automata",
+    )
+    parser.add_argument(
+        "--ignore-case",
+        action="store_true",
+        help="compare strings case-insensitively (rule packs otherwise keep the case sensitivity"
+        " they were written with)",
+    )
+    parser.add_argument(
+        "--cache", metavar="DIR", help="directory caching converted rules between runs"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes matching events in parallel (default: 1, no pool)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1000,
+        help="events sent to a worker process at a time (default: 1000)",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="write evaluation counters per rule and predicate operator to FILE, as Prometheus text"
+        " if it ends in .prom and JSON otherwise, and print the most expensive rules to stderr",
+    )
+    parser.add_argument(
+        "--profile-sample",
+        type=int,
+        default=100,
+        metavar="N",
+        help="with --profile, time rules and predicates for every Nth event, 0 to only count"
+        " evaluations (default: 100)",
+    )
+    args = parser.parse_args(argv)
+    if args.profile and args.workers > 1:
+        parser.error("--profile can't be combined with --workers")
+    if args.profile_sample < 0:
+        parser.error("--profile-sample must not be negative")
+
+    options = {
+        "substring_prefilter": args.substring_prefilter,
+        "profile": bool(args.profile),
+        "profile_sample": args.profile_sample,
+    }
+    # Only passed when given, so a rule pack applies the case sensitivity it was written with
+    if args.ignore_case:
+        options["case_sensitive"] = False
+    ruleset = load_ruleset([args.rules], args.cache, **options)
+    matcher = None
+    if args.workers > 1:
+        matcher = ParallelMatcher(ruleset, args.workers, args.chunk_size)
+    out = sys.stdout
+    try:
+        for source in args.events:
+            with open_events(source) as stream:
+                events = read_events(stream, args.skip_invalid)
+                if matcher is None:
+                    matches = match_events(ruleset, events)
+                else:
+                    matches = matcher.match_events(events)
+                for offset, rule_id in matches:
+                    out.write(
+                        json.dumps(
+                            {"source": source, "offset": offset, "rule": rule_id}
+                        )
+                        + "\n"
+                    )
+    finally:
+        if matcher is not None:
+            matcher.close()
+    out.flush()
+    if ruleset.profile is not None:
+        write_profile(ruleset.profile, args.profile)
+        print(ruleset.profile.report(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Substring Prefilter
+"""
+from collections import deque
+from typing import Any
+from typing import Dict
+from typing import FrozenSet
+from typing import Hashable
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+
+from sigma.backends.dictquery import runtime
+from sigma.backends.dictquery.expression import CONTAINS
+from sigma.backends.dictquery.expression import ENDSWITH
+from sigma.backends.dictquery.expression import LIKE
+from sigma.backends.dictquery.expression import STARTSWITH
+from sigma.backends.dictquery.expression import And
+from sigma.backends.dictquery.expression import Expression
+from sigma.backends.dictquery.expression import Or
+from sigma.backends.dictquery.expression import Predicate
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover
+    ahocorasick = None
+
+Requirement = FrozenSet[Tuple[str, str]]
+
+
+def glob_literal(pattern: str) -> Optional[str]:
+    """Longest wildcard-free part of a LIKE pattern, which every matching value contains."""
+    if "[" in pattern:  # character classes, leave those to the full glob match
+        return None
+    literal = max(pattern.replace("?", "*").split("*"), key=len)
+    return literal or None
+
+
+def required_substrings(expr: Expression) -> Optional[Requirement]:
+    """
+    Field/literal pairs of which at least one must occur in an event for expr to match, or None if
+    expr has no such substring requirement.
+    """
+    if isinstance(expr, Predicate):
+        if expr.op == LIKE:
+            literal = glob_literal(expr.value)
+            if literal is not None:
+                return frozenset(((expr.field, literal),))
+        elif expr.op in (STARTSWITH, ENDSWITH, CONTAINS) and expr.value:
+            return frozenset(((expr.field, expr.value),))
+    elif isinstance(expr, And):
+        candidates = [
+            requirement
+            for requirement in (required_substrings(arg) for arg in expr.args)
+            if requirement is not None
+        ]
+        if candidates:
+            return min(candidates, key=len)
+    elif isinstance(expr, Or) and expr.args:
+        requirements = [required_substrings(arg) for arg in expr.args]
+        if all(requirement is not None for requirement in requirements):
+            return frozenset().union(*requirements)
+    return None
+
+
+class AhoCorasick:
+    """
+    AhoCorasick - automaton finding all of a set of words in one scan of a text
+
+    Uses pyahocorasick if it is installed (unless native is False), else a pure Python automaton.
+    """
+
+    def __init__(self, words: Iterable[str], native: bool = True):
+        self.words = sorted(set(words))
+        if native and ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for word in self.words:
+                self.automaton.add_word(word, word)
+            if self.words:
+                self.automaton.make_automaton()
+            self.search = self._search_native
+        else:
+            self._build()
+            self.search = self._search_python
+
+    def _build(self) -> None:
+        """Build the goto, fail and output tables."""
+        self.goto: List[Dict[str, int]] = [{}]
+        self.output: List[Tuple[str, ...]] = [()]
+        for word in self.words:
+            state = 0
+            for char in word:
+                following = self.goto[state].get(char)
+                if following is None:
+                    following = len(self.goto)
+                    self.goto[state][char] = following
+                    self.goto.append({})
+                    self.output.append(())
+                state = following
+            self.output[state] = (word,)
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[following] = target if target != following else 0
+                self.output[following] += self.output[self.fail[following]]
+
+    def _search_native(self, text: str) -> Set[str]:
+        """All words occurring in text, using pyahocorasick."""
+        if not self.words:
+            return set()
+        return {word for _, word in self.automaton.iter(text)}
+
+    def _search_python(self, text: str) -> Set[str]:
+        """All words occurring in text, using the pure Python automaton."""
+        goto, fail, output = self.goto, self.fail, self.output
+        found: Set[str] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class SubstringPrefilter:
+    """
+    SubstringPrefilter - one Aho-Corasick automaton per field over all rule LIKE literals
+
+    Every rule whose contains, startswith, endswith or wildcard match requires a literal substring
+    is filed under that literal. A single scan of each field value then yields all rules that may
+    match, instead of running every glob separately. With casefold, literals and scanned values
+    are case folded, for rules matched case-insensitively.
+    """
+
+    def __init__(
+        self,
+        literals: Dict[str, Dict[str, Set[Hashable]]],
+        unindexed: Sequence[Hashable],
+        casefold: bool = False,
+    ):
+        self.literals = literals
+        self.unindexed: List[Hashable] = list(unindexed)
+        self.casefold = casefold
+        self.keys = {field: runtime.field_keys(field) for field in literals}
+        self.automata = {field: AhoCorasick(words) for field, words in literals.items()}
+
+    @classmethod
+    def from_rules(
+        cls, rules: Sequence[Tuple[Hashable, Expression]], casefold: bool = False
+    ) -> "SubstringPrefilter":
+        """Index ``(rule key, expression)`` pairs."""
+        literals: Dict[str, Dict[str, Set[Hashable]]] = {}
+        unindexed = []
+        for key, expr in rules:
+            requirement = required_substrings(expr)
+            if requirement is None:
+                unindexed.append(key)
+                continue
+            for field, literal in sorted(requirement):
+                if casefold:
+                    literal = literal.casefold()
+                literals.setdefault(field, {}).setdefault(literal, set()).add(key)
+        return cls(literals, unindexed, casefold)
+
+    def candidates(
+        self, event: Any, fields: Optional[Dict[Tuple[str, ...], List[Any]]] = None
+    ) -> Set[Hashable]:
+        """Keys of the indexed rules that may match event, fields is an optional lookup memo."""
+        if fields is None:
+            fields = {}
+        found: Set[Hashable] = set()
+        for field, automaton in self.automata.items():
+            literals = self.literals[field]
+            for value in runtime.lookup(fields, event, self.keys[field]):
+                if isinstance(value, str):
+                    if self.casefold:
+                        value = value.casefold()
+                    for word in automaton.search(value):
+                        found.update(literals[word])
+        return found
@@ -0,0 +1,390 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Aggregation Tests
+"""
+import unittest
+
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaConditionError
+
+from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery.aggregation import Aggregation
+from sigma.backends.dictquery.aggregation import AggregationEngine
+from sigma.backends.dictquery.aggregation import DistinctCounter
+from sigma.backends.dictquery.aggregation import event_time
+from sigma.backends.dictquery.aggregation import parse_aggregation
+from sigma.backends.dictquery.aggregation import parse_timeframe
+
+
+class AggregationParserTest(unittest.TestCase):
+    """
+    AggregationParserTest - Tests for parsing aggregation expressions and timeframes
+    """
+
+    def test_parse_aggregation(self):
+        """test for parsing aggregation expressions and rejecting unsupported ones"""
+        cases = {
+            "count() > 10": Aggregation("count", None, (), ">", 10.0),
+            " count(dst) by src, user >= 3 ": Aggregation(
+                "count", "dst", ("src", "user"), ">=", 3.0
+            ),
+            "sum(bytes) by host.name = 1.5": Aggregation(
+                "sum", "bytes", ("host.name",), "==", 1.5
+            ),
+            "max(port) < 1024": Aggregation("max", "port", (), "<", 1024.0),
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_aggregation(text), expected)
+        for text in ("count() by user", "sum() > 1", "near sel2", "median(x) > 1"):
+            with self.subTest(text=text):
+                with self.assertRaises(SigmaConditionError):
+                    parse_aggregation(text)
+
+    def test_parse_timeframe(self):
+        """test for parsing timeframes into seconds and rejecting empty or invalid ones"""
+        self.assertEqual(parse_timeframe("30s"), 30)
+        self.assertEqual(parse_timeframe("5m"), 300)
+        self.assertEqual(parse_timeframe("2d"), 172800)
+        for text in ("5 minutes", "0s", "00m", "-1h"):
+            with self.subTest(text=text):
+                with self.assertRaises(SigmaConditionError):
+                    parse_timeframe(text)
+
+    def test_event_time(self):
+        """test for reading event times from numbers and ISO 8601 strings"""
+        self.assertEqual(event_time(10), 10.0)
+        self.assertEqual(event_time("1970-01-01T00:01:00Z"), 60.0)
+        self.assertEqual(event_time("1970-01-01T01:00:00+01:00"), 0.0)
+        self.assertIsNone(event_time("yesterday"))
+        self.assertIsNone(event_time(True))
+
+
+class AggregationEngineTest(unittest.TestCase):
+    """
+    AggregationEngineTest - Tests for the aggregation output format and its windowed evaluation
+    """
+
+    def test_conversion(self):
+        """test that the aggregation output format keeps the aggregation of each rule"""
+        yaml = """
+title: Aggregated
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: login
+    timeframe: 1m
+    condition: sel | count() by user > 2
+---
+title: Plain
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: login
+    condition: sel
+"""
+        collection = SigmaCollection.from_yaml(yaml)
+        backend = DictQueryBackend()
+        specs = backend.convert(collection, "aggregation").specs()
+        self.assertListEqual(
+            specs,
+            [
+                {
+                    "id": "Aggregated",
+                    "query": "eventname=='login'",
+                    "aggregation": {
+                        "function": "count",
+                        "field": None,
+                        "group_by": ["user"],
+                        "op": ">",
+                        "threshold": 2.0,
+                        "timeframe": 60,
+                    },
+                },
+                {"id": "Plain", "query": "eventname=='login'", "aggregation": None},
+            ],
+        )
+        # The rule is left as it was, so it converts the same way again
+        self.assertListEqual(backend.convert(collection, "aggregation").specs(), specs)
+        with self.assertRaises(SigmaConditionError):
+            backend.convert(collection)
+
+    def test_collect_errors(self):
+        """test that rules with unsupported aggregations are left out when collecting errors"""
+        yaml = """
+title: Aggregated
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: login
+    timeframe: 1m
+    condition: sel | near other
+---
+title: Plain
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: login
+    condition: sel
+"""
+        backend = DictQueryBackend(collect_errors=True)
+        collection = SigmaCollection.from_yaml(yaml)
+        engine = backend.convert(collection, "aggregation")
+        self.assertListEqual([spec["id"] for spec in engine.specs()], ["Plain"])
+        self.assertEqual(len(backend.errors), 1)
+
+    def test_count(self):
+        """test that count() fires when the count of a group crosses the threshold"""
+        yaml = """
+title: Aggregated
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: login
+    timeframe: 1m
+    condition: sel | count() by user > 2
+---
+title: Plain
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: login
+    condition: sel
+"""
+        aggregation = AggregationEngine.from_collection(SigmaCollection.from_yaml(yaml))
+        alerts = [
+            aggregation.process({"eventname": "login", "user": user}, timestamp)
+            for timestamp, user in enumerate("aabaaab")
+        ]
+        fired = [
+            (alert.timestamp, alert.group, alert.value)
+            for alerts in alerts
+            for alert in alerts
+            if alert.rule == "Aggregated"
+        ]
+        # Fires when the count of a user crosses the threshold, not again while it stays above
+        self.assertListEqual(fired, [(3, {"user": "a"}, 3)])
+        self.assertTrue(all(alerts[-1].rule == "Plain" for alerts in alerts))
+        self.assertListEqual(aggregation.process({"eventname": "logout"}, 7), [])
+
+        # Once the window has passed the count starts over and the rule fires again
+        for timestamp in (100, 101, 102):
+            alerts = aggregation.process({"eventname": "login", "user": "a"}, timestamp)
+        self.assertEqual(alerts[0].value, 3)
+        self.assertEqual(aggregation.stats()["expired"], 2)
+
+    def test_window(self):
+        """test that values leave the window bucket by bucket"""
+        yaml = """
+        title: Aggregated
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                eventname: login
+            timeframe: 10s
+            condition: sel | count() > 2
+        """
+        aggregation = AggregationEngine.from_collection(
+            SigmaCollection.from_yaml(yaml), buckets=10
+        )
+        self.assertListEqual(
+            [
+                len(aggregation.process({"eventname": "login"}, timestamp))
+                for timestamp in (0, 5, 11, 12, 30, 31, 32)
+            ],
+            [0, 0, 0, 1, 0, 0, 1],
+        )
+
+    def test_distinct_count(self):
+        """test that count(field) counts the distinct values of the field"""
+        yaml = """
+        title: Aggregated
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                eventname: login
+            timeframe: 1m
+            condition: sel | count(dst) by src >= 3
+        """
+        aggregation = AggregationEngine.from_collection(SigmaCollection.from_yaml(yaml))
+        events = [
+            {"src": "a", "dst": "x"},
+            {"src": "a", "dst": "x"},
+            {"src": "b", "dst": "y"},
+            {"src": "a", "dst": "y"},
+            {"src": "a"},
+            {"src": "a", "dst": "z"},
+        ]
+        alerts = [
+            alert
+            for timestamp, event in enumerate(events)
+            for alert in aggregation.process(dict(event, eventname="login"), timestamp)
+        ]
+        self.assertListEqual(
+            [(alert.group, alert.value) for alert in alerts], [({"src": "a"}, 3)]
+        )
+
+    def test_functions(self):
+        """test for the sum, avg, min and max functions"""
+        values = [5, 1, 9, "x", 3]
+        cases = {
+            "sum(bytes) > 14": [(2, 15.0)],
+            "avg(bytes) >= 4.5": [(0, 5.0), (2, 5.0)],
+            "min(bytes) < 2": [(1, 1)],
+            "max(bytes) = 9": [(2, 9)],
+        }
+        for text, expected in cases.items():
+            with self.subTest(aggregation=text):
+                yaml = f"""
+                title: Aggregated
+                status: test
+                logsource:
+                    category: test_category
+                    product: test_product
+                detection:
+                    sel:
+                        eventname: login
+                    timeframe: 1m
+                    condition: sel | {text}
+                """
+                aggregation = AggregationEngine.from_collection(
+                    SigmaCollection.from_yaml(yaml)
+                )
+                fired = [
+                    (timestamp, alert.value)
+                    for timestamp, value in enumerate(values)
+                    for alert in aggregation.process(
+                        {"eventname": "login", "bytes": value}, timestamp
+                    )
+                ]
+                self.assertListEqual(fired, expected)
+
+    def test_bounded_memory(self):
+        """test that expired groups are dropped and at most max_keys groups are held"""
+        yaml = """
+        title: Aggregated
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                eventname: login
+            timeframe: 10s
+            condition: sel | count() by user > 1
+        """
+        aggregation = AggregationEngine.from_collection(
+            SigmaCollection.from_yaml(yaml), max_keys=100
+        )
+        for timestamp in range(1000):
+            aggregation.process(
+                {"eventname": "login", "user": timestamp % 500}, timestamp
+            )
+            self.assertLessEqual(len(aggregation), 100)
+        stats = aggregation.stats()
+        self.assertEqual(stats["groups"], 10)
+        self.assertGreater(stats["expired"], 0)
+
+        aggregation = AggregationEngine.from_collection(
+            SigmaCollection.from_yaml(yaml.replace("timeframe: 10s", "timeframe: 1h")),
+            max_keys=100,
+        )
+        for timestamp in range(1000):
+            aggregation.process({"eventname": "login", "user": timestamp}, timestamp)
+        self.assertDictEqual(
+            aggregation.stats(), {"groups": 100, "expired": 0, "evicted": 900}
+        )
+
+    def test_time_field(self):
+        """test for reading event times from a field"""
+        yaml = """
+        title: Aggregated
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                eventname: login
+            timeframe: 1m
+            condition: sel | count() > 1
+        """
+        aggregation = AggregationEngine.from_collection(
+            SigmaCollection.from_yaml(yaml), time_field="event.time"
+        )
+        first = aggregation.process(
+            {"eventname": "login", "event": {"time": "2024-01-01T00:00:00Z"}}
+        )
+        self.assertListEqual(first, [])
+        # Events without a valid time count at the latest time seen
+        alerts = aggregation.process({"eventname": "login", "event": {"time": "?"}})
+        self.assertEqual(alerts[0].timestamp, event_time("2024-01-01T00:00:00Z"))
+
+    def test_top_level_timeframe(self):
+        """test for timeframes given outside the detection"""
+        yaml = """
+        title: Aggregated
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                eventname: login
+            condition: sel | count() > 1
+        timeframe: 2h
+        """
+        aggregation = AggregationEngine.from_collection(SigmaCollection.from_yaml(yaml))
+        self.assertEqual(aggregation.rules[0].aggregation.timeframe, 7200)
+
+    def test_zero_timeframe(self):
+        """test that rules with an empty timeframe are rejected"""
+        yaml = """
+        title: Aggregated
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                eventname: login
+            timeframe: 0s
+            condition: sel | count(dst) > 1
+        """
+        with self.assertRaises(SigmaConditionError):
+            AggregationEngine.from_collection(SigmaCollection.from_yaml(yaml))
+
+    def test_distinct_counter_empty_window(self):
+        """test that a distinct counter whose window drops every value is left empty"""
+        counter = DistinctCounter()
+        counter.add(["a", "b"], 10, 0, 100)
+        self.assertEqual(counter.value("count"), 0)
+        counter.add(["c"], 20, 5, 100)
+        self.assertEqual(counter.value("count"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
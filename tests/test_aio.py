@@ -0,0 +1,122 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Asyncio Matcher Tests
+"""
+import asyncio
+import unittest
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import RuleSet
+from sigma.backends.dictquery.aio import AsyncMatcher
+
+RULES = """
+title: Login
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: login
+    condition: sel
+---
+title: Admin
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        username|contains: admin
+    condition: sel
+"""
+
+
+async def produce(events, fail=False):
+    """yield the events asynchronously, then fail if asked to"""
+    for event in events:
+        await asyncio.sleep(0)
+        yield event
+    if fail:
+        raise ConnectionError("socket closed")
+
+
+async def collect(matcher, events, fail=False):
+    """collect the matches streamed for the events"""
+    return [match async for match in matcher.stream(produce(events, fail))]
+
+
+class AsyncMatcherTest(unittest.TestCase):
+    """
+    AsyncMatcherTest - Tests for the asyncio matcher
+    """
+
+    def setUp(self):
+        """
+        setUp - build a rule set and the events and matches expected from it
+        """
+        self.ruleset = RuleSet.from_collection(SigmaCollection.from_yaml(RULES))
+        self.events = [
+            {
+                "eventname": ["login", "logout"][i % 2],
+                "username": ["admin", "bob"][i % 3 > 0],
+            }
+            for i in range(100)
+        ]
+        self.expected = [
+            (event, self.ruleset.match(event))
+            for event in self.events
+            if self.ruleset.match(event)
+        ]
+
+    def test_stream(self):
+        """test that streamed events are matched in order with bounded batching"""
+
+        async def run():
+            """run the matcher within its context"""
+            async with AsyncMatcher(
+                self.ruleset, batch_size=8, queue_size=4, max_batches=2
+            ) as matcher:
+                return await collect(matcher, self.events)
+
+        self.assertListEqual(asyncio.run(run()), self.expected)
+
+    def test_stream_processes(self):
+        """test that streamed events can be matched in a process pool"""
+
+        async def run():
+            """run the matcher within its context"""
+            async with AsyncMatcher(self.ruleset, processes=1) as matcher:
+                return await collect(matcher, self.events)
+
+        self.assertListEqual(asyncio.run(run()), self.expected)
+
+    def test_stream_error(self):
+        """test that an error in the event source is raised from the stream"""
+
+        async def run():
+            """run the matcher within its context"""
+            async with AsyncMatcher(self.ruleset) as matcher:
+                return await collect(matcher, self.events, fail=True)
+
+        with self.assertRaisesRegex(ConnectionError, "socket closed"):
+            asyncio.run(run())
+
+    def test_match(self):
+        """test for matching a single event"""
+
+        async def run():
+            """run the matcher within its context"""
+            async with AsyncMatcher(self.ruleset) as matcher:
+                return await matcher.match({"eventname": "login", "username": "admin"})
+
+        self.assertListEqual(asyncio.run(run()), ["Login", "Admin"])
+
+    def test_invalid_options(self):
+        """test that a non-positive batch size is rejected"""
+        with self.assertRaises(ValueError):
+            AsyncMatcher(self.ruleset, batch_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
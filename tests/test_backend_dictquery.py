@@ -4,10 +4,23 @@ Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Test
 # import glob
 # import os.path
 import unittest
+from unittest import mock
 
+import dictquery
 from sigma.collection import SigmaCollection
+from sigma.conditions import SigmaCondition
+from sigma.conversion.state import ConversionState
 
 from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery.expression import CONTAINS
+from sigma.backends.dictquery.expression import EQ
+from sigma.backends.dictquery.expression import EXISTS
+from sigma.backends.dictquery.expression import IN
+from sigma.backends.dictquery.expression import MATCH
+from sigma.backends.dictquery.expression import And
+from sigma.backends.dictquery.expression import Not
+from sigma.backends.dictquery.expression import Or
+from sigma.backends.dictquery.expression import Predicate
 
 
 class DictQueryBackendTest(unittest.TestCase):
@@ -15,18 +28,18 @@ class DictQueryBackendTest(unittest.TestCase):
     DictQueryBackendTest - Tests for the DictQueryBackend class
     """
 
-    def setup_backend():
+    def setup_backend(**options):
         """
         setup_backend - generic setup of test backend
         """
-        return DictQueryBackend()
+        return DictQueryBackend(**options)
 
-    def simple_test(self, yaml, expected):
+    def simple_test(self, yaml, expected, **options):
         """
         simple_test - common simple test of running a YAML blob through the backend and comparing against expect value
         """
         sigma_rule = SigmaCollection.from_yaml(yaml)
-        backend = DictQueryBackendTest.setup_backend()
+        backend = DictQueryBackendTest.setup_backend(**options)
         actual = backend.convert(sigma_rule)
         self.assertListEqual(actual, expected)
 
@@ -126,8 +139,10 @@ class DictQueryBackendTest(unittest.TestCase):
                     - valueC*
             condition: sel
         """
-        expected = ["fieldA=='valueA' OR fieldA=='valueB' OR fieldA LIKE 'valueC*'"]
+        expected = ["(fieldA IN ['valueA', 'valueB']) OR fieldA LIKE 'valueC*'"]
         self.simple_test(yaml, expected)
+        expected = ["fieldA=='valueA' OR fieldA=='valueB' OR fieldA LIKE 'valueC*'"]
+        self.simple_test(yaml, expected, simplify=False)
 
     def test_dictquery_contains(self):
         """test for |contains expression"""
@@ -194,6 +209,175 @@ class DictQueryBackendTest(unittest.TestCase):
         expected = ["fieldA MATCH /foo.*bar/ AND fieldB=='foo'"]
         self.simple_test(yaml, expected)
 
+    def test_dictquery_cost_order(self):
+        """test that the compiled formats order AND/OR children by cost and the query doesn't"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA|re: foo.*bar
+                fieldB|contains: foo
+                fieldC|exists: true
+                fieldD:
+                    - foo
+                    - bar
+            filter1:
+                fieldE|contains: foo
+            filter2:
+                fieldF: foo
+            condition: sel and not 1 of filter*
+        """
+        expected = [
+            "(fieldA MATCH /foo.*bar/ AND fieldB LIKE '*foo*' AND fieldC AND (fieldD IN ['foo', 'bar'])) "
+            + "AND (NOT (fieldE LIKE '*foo*' OR fieldF=='foo'))"
+        ]
+        self.simple_test(yaml, expected, simplify=False)
+        in_d = Predicate(IN, "fieldD", ("foo", "bar"))
+        contains_b = Predicate(CONTAINS, "fieldB", "foo")
+        exists_c = Predicate(EXISTS, "fieldC")
+        match_a = Predicate(MATCH, "fieldA", "foo.*bar")
+        filters = Not(
+            Or((Predicate(EQ, "fieldF", "foo"), Predicate(CONTAINS, "fieldE", "foo")))
+        )
+        cases = [
+            ({}, (in_d, contains_b, exists_c, match_a)),
+            ({"selectivity": {"fieldC": 0.01}}, (exists_c, in_d, contains_b, match_a)),
+        ]
+        for options, terms in cases:
+            with self.subTest(options=options):
+                backend = DictQueryBackend(simplify=False, **options)
+                self.assertListEqual(
+                    backend.convert(SigmaCollection.from_yaml(yaml), "expression"),
+                    [And((And(terms), filters))],
+                )
+
+    def test_dictquery_parse_once(self):
+        """test that the formats building an expression tree parse and simplify it only once"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel1:
+                fieldA|re: foo.*bar
+                fieldB: foo
+            sel2:
+                fieldA|re: foo.*bar
+                fieldC: bar
+            condition: 1 of sel*
+        """
+        parsed = SigmaCondition.parsed
+        calls = []
+
+        def count(condition):
+            """parse the condition, recording the call"""
+            calls.append(condition)
+            return parsed.fget(condition)
+
+        backend = DictQueryBackend()
+        rule = SigmaCollection.from_yaml(yaml).rules[0]
+        for output_format in ("default", "ruleset", "prefilter", "expression"):
+            with self.subTest(output_format=output_format):
+                calls.clear()
+                with mock.patch.object(SigmaCondition, "parsed", property(count)):
+                    backend.convert_rule(rule, output_format)
+                self.assertEqual(len(calls), 1)
+        self.assertEqual(
+            backend.convert_rule(rule, "expression")[0],
+            backend.build_expression(rule, 0, ConversionState()),
+        )
+
+    def test_dictquery_order_non_string(self):
+        """test that the query keeps the rule's order for dictquery to test a field's type first"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                c: '*o*b*'
+                proc.name|startswith: ab
+            condition: sel
+        """
+        query = DictQueryBackend().convert(SigmaCollection.from_yaml(yaml))[0]
+        self.assertEqual(query, "c LIKE '*o*b*' AND `proc.name` LIKE 'ab*'")
+        self.assertFalse(dictquery.match({"c": "xyz", "proc": {"name": 5}}, query))
+
+    def test_dictquery_simplify(self):
+        """test for boolean simplification of the condition tree"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel1:
+                fieldA: a
+            sel2:
+                fieldB: b
+            sel3:
+                fieldC: c
+            condition: {condition}
+        """
+        cases = {
+            "(sel1 and sel2) or (sel1 and sel3)": "fieldA=='a' AND (fieldB=='b' OR fieldC=='c')",
+            "sel1 or (sel1 and sel2)": "fieldA=='a'",
+            "sel1 and (sel1 or sel2)": "fieldA=='a'",
+            "(sel1 and sel2) and (sel2 and sel3)": "fieldA=='a' AND fieldB=='b' AND fieldC=='c'",
+            "not not sel1": "fieldA=='a'",
+        }
+        for condition, expected in cases.items():
+            with self.subTest(condition=condition):
+                self.simple_test(yaml.format(condition=condition), [expected])
+
+    def test_dictquery_simplify_in(self):
+        """test for grouping same-field equalities of an OR into an IN list"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel1:
+                fieldA: a
+            sel2:
+                fieldB: b
+            sel3:
+                fieldA: c
+            condition: 1 of sel*
+        """
+        self.simple_test(yaml, ["(fieldA IN ['a', 'c']) OR fieldB=='b'"])
+        self.simple_test(
+            yaml, ["fieldA=='a' OR fieldB=='b' OR fieldA=='c'"], simplify=False
+        )
+
+    def test_dictquery_regex_flags(self):
+        """test for regular expression flags"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA|re|i: foo.*bar
+                fieldB|re|i|m: ^baz
+            condition: sel
+        """
+        expected = ["fieldA MATCH /(?i)foo.*bar/ AND fieldB MATCH /(?im)^baz/"]
+        self.simple_test(yaml, expected)
+
     def test_dictquery_cidr_query(self):
         """test for |cidr expression"""
         yaml = """
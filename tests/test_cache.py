@@ -0,0 +1,249 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Conversion Cache Tests
+"""
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from sigma.processing.pipeline import ProcessingPipeline
+
+from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery import RuleSet
+from sigma.backends.dictquery.cache import ConversionCache
+from sigma.backends.dictquery.stream import load_ruleset
+
+
+def convert_paths(directory, rules):
+    """convert the rules through a cache, in a worker process"""
+    return ConversionCache(directory).convert_paths([rules])
+
+
+class ConversionCacheTest(unittest.TestCase):
+    """
+    ConversionCacheTest - Tests for the on-disk conversion cache
+    """
+
+    def setUp(self):
+        """
+        setUp - create a cache directory and a directory of rules
+        """
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = Path(temporary.name) / "cache"
+        self.rules = Path(temporary.name) / "rules"
+        self.rules.mkdir()
+        (self.rules / "a.yml").write_text(
+            """
+            title: Rule a
+            status: test
+            logsource:
+                category: test_category
+                product: test_product
+            detection:
+                sel:
+                    fieldA: a
+                condition: sel
+            """
+        )
+        (self.rules / "b.yml").write_text(
+            """
+            title: Rule b
+            status: test
+            logsource:
+                category: test_category
+                product: test_product
+            detection:
+                sel:
+                    fieldA: b
+                condition: sel
+            """
+        )
+
+    def test_convert(self):
+        """test that unchanged documents are converted once and changed ones again"""
+        first = """
+        title: Rule a
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA: x
+            condition: sel
+        """
+        second = """
+        title: Rule b
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA: y
+            condition: sel
+        """
+        changed = """
+        title: Rule b
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA: z
+            condition: sel
+        """
+        cache = ConversionCache(self.directory)
+        self.assertListEqual(
+            cache.convert([first, second]), ["fieldA=='x'", "fieldA=='y'"]
+        )
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        self.assertListEqual(
+            cache.convert([first, second]), ["fieldA=='x'", "fieldA=='y'"]
+        )
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+        cache = ConversionCache(self.directory)
+        self.assertListEqual(
+            cache.convert([first, changed]), ["fieldA=='x'", "fieldA=='z'"]
+        )
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_pipeline_key(self):
+        """test that the processing pipeline is part of the cache key"""
+        document = """
+        title: Rule a
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA: x
+            condition: sel
+        """
+        pipeline = ProcessingPipeline.from_yaml(
+            """
+            name: mapping
+            priority: 10
+            transformations:
+              - id: mapping
+                type: field_name_mapping
+                mapping:
+                  fieldA: mapped
+            """
+        )
+        ConversionCache(self.directory).convert([document])
+        cache = ConversionCache(self.directory, DictQueryBackend(pipeline))
+        self.assertListEqual(cache.convert([document]), ["mapped=='x'"])
+        self.assertEqual(cache.misses, 1)
+        cache = ConversionCache(self.directory, pipeline_key="fixed")
+        cache.convert([document])
+        self.assertEqual(cache.misses, 1)
+
+    def test_backend_options(self):
+        """test that the backend reorder and simplify options are part of the cache key"""
+        document = """
+        title: Rule a
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA: x
+            condition: sel
+        """
+        ConversionCache(self.directory).convert([document], "ruleset")
+        cache = ConversionCache(self.directory, DictQueryBackend(reorder=False))
+        cache.convert([document], "ruleset")
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        cache = ConversionCache(self.directory, DictQueryBackend(simplify=False))
+        cache.convert([document], "ruleset")
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        cache = ConversionCache(self.directory, DictQueryBackend())
+        cache.convert([document], "ruleset")
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_formats(self):
+        """test for caching the ruleset and python_callable output formats"""
+        document = """
+        title: Rule a
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA: x
+            condition: sel
+        """
+        cache = ConversionCache(self.directory)
+        cache.convert([document], "ruleset")
+        ruleset = cache.convert([document], "ruleset")
+        self.assertIsInstance(ruleset, RuleSet)
+        self.assertListEqual(ruleset.match({"fieldA": "x"}), ["Rule a"])
+        self.assertEqual(cache.hits, 1)
+
+        match = cache.convert([document], "python_callable")[0]
+        self.assertTrue(match({"fieldA": "x"}))
+        cache.convert([document], "python_callable")
+        self.assertEqual(cache.hits, 1)
+
+    def test_load_ruleset(self):
+        """test that loading a rule set from paths goes through the cache"""
+        for _ in range(2):
+            ruleset = load_ruleset([self.rules], self.directory, prefilter=False)
+            self.assertIsNone(ruleset.prefilter)
+            self.assertListEqual(ruleset.match({"fieldA": "b"}), ["Rule b"])
+        self.assertEqual(len(list(self.directory.glob("*/*.pickle"))), 2)
+
+    def test_corrupt_entry(self):
+        """test that unreadable cache entries are converted again"""
+        cache = ConversionCache(self.directory)
+        cache.convert_paths([self.rules])
+        for entry in self.directory.glob("*/*.pickle"):
+            entry.write_bytes(b"truncated")
+        self.assertListEqual(
+            cache.convert_paths([self.rules]), ["fieldA=='a'", "fieldA=='b'"]
+        )
+        self.assertEqual(cache.misses, 4)
+
+    def test_collected_errors(self):
+        """test that rules whose conversion errors the backend collects are not cached"""
+        document = """
+            title: Broken
+            status: test
+            logsource:
+                category: test_category
+                product: test_product
+            detection:
+                sel:
+                    fieldA: a
+                condition: sel and missing
+        """
+        for run in range(2):
+            backend = DictQueryBackend(collect_errors=True)
+            cache = ConversionCache(self.directory, backend)
+            self.assertListEqual(cache.convert([document]), [])
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+            self.assertEqual(len(backend.errors), 1)
+        self.assertListEqual(list(self.directory.glob("*/*.pickle")), [])
+
+    def test_concurrent_processes(self):
+        """test that processes sharing a cache directory leave only complete entries"""
+        with ProcessPoolExecutor(4) as pool:
+            results = list(
+                pool.map(convert_paths, [self.directory] * 4, [self.rules] * 4)
+            )
+        self.assertListEqual(results, [["fieldA=='a'", "fieldA=='b'"]] * 4)
+        entries = [name for _, _, files in os.walk(self.directory) for name in files]
+        self.assertEqual(len(entries), 2)
+        self.assertTrue(all(name.endswith(".pickle") for name in entries))
+
+
+if __name__ == "__main__":
+    unittest.main()
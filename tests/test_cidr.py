@@ -0,0 +1,129 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend CIDR Table Tests
+"""
+import unittest
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery.cidr import CidrTable
+from sigma.backends.dictquery.cidr import parse_address
+from sigma.backends.dictquery.expression import CIDR
+from sigma.backends.dictquery.expression import Predicate
+
+RULES = """
+title: Private
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        src|cidr:
+            - 10.0.0.0/8
+            - 192.168.0.0/20
+            - fd00::/8
+    condition: sel
+---
+title: Subnet
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        src|cidr: 10.1.2.0/23
+    dst:
+        dst|cidr: 2001:db8::/32
+    condition: sel or dst
+"""
+
+
+class CidrTableTest(unittest.TestCase):
+    """
+    CidrTableTest - Tests for the merged CIDR interval table
+    """
+
+    def test_parse_address(self):
+        """test for parsing IPv4 and IPv6 addresses into integers"""
+        self.assertEqual(parse_address("10.0.0.1"), (4, 0x0A000001))
+        self.assertEqual(parse_address("::1"), (6, 1))
+        for value in ("10.0.0", "10.0.0.1:80", "::1%eth0", "", 167772161, None):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_address(value))
+
+    def test_lookup(self):
+        """test that lookups return every network containing the address"""
+        table = CidrTable()
+        wide = table.add(("10.0.0.0/8", "2001:db8::/32"))
+        narrow = table.add(("10.1.0.0/16",))
+        host = table.add(("10.1.2.3/32",))
+        self.assertEqual(table.add(("10.1.0.0/16",)), narrow)
+        cases = {
+            "9.255.255.255": set(),
+            "10.0.0.0": {wide},
+            "10.1.0.0": {wide, narrow},
+            "10.1.2.3": {wide, narrow, host},
+            "10.1.2.4": {wide, narrow},
+            "10.2.0.0": {wide},
+            "10.255.255.255": {wide},
+            "11.0.0.0": set(),
+            "2001:db8:ffff::1": {wide},
+            "2001:db9::": set(),
+            "::ffff:10.0.0.1": set(),
+            "not an address": set(),
+        }
+        for value, keys in cases.items():
+            with self.subTest(value=value):
+                self.assertSetEqual(set(table.lookup(value)), keys)
+        # Adjacent intervals with the same predicates are merged
+        starts, _ = table.intervals[4]
+        self.assertEqual(len(starts), 6)
+
+    def test_matching(self):
+        """test that matching networks are cached until networks are added"""
+        table = CidrTable()
+        key = table.add(("192.168.0.0/16",))
+        values = ["10.0.0.1", "192.168.1.1"]
+        self.assertIn(key, table.matching(values))
+        self.assertIs(table.matching(values), table.matching(values))
+        self.assertNotIn(key, table.matching(["10.0.0.1"]))
+        # Adding networks rebuilds the table instead of reusing the cached result
+        other = table.add(("10.0.0.0/8",))
+        self.assertIn(other, table.matching(values))
+
+    def test_expression(self):
+        """test for converting the cidr modifier into a single predicate"""
+        exprs = DictQueryBackend().convert(
+            SigmaCollection.from_yaml(RULES), "expression"
+        )
+        self.assertEqual(
+            exprs[0],
+            Predicate(CIDR, "src", ("10.0.0.0/8", "192.168.0.0/20", "fd00::/8")),
+        )
+
+    def test_ruleset(self):
+        """test for matching cidr rules in a rule set"""
+        ruleset = DictQueryBackend().convert(
+            SigmaCollection.from_yaml(RULES), "ruleset"
+        )
+        self.assertEqual(len(ruleset.rules), 2)
+        cases = [
+            ({"src": "10.1.3.255"}, ["Private", "Subnet"]),
+            ({"src": "10.1.4.0"}, ["Private"]),
+            ({"src": "192.168.15.1"}, ["Private"]),
+            ({"src": "192.168.16.1"}, []),
+            ({"src": "FD12::1"}, ["Private"]),
+            ({"src": [{"x": 1}], "dst": ["2001:db8::1"]}, []),
+            ({"src": "10.1.2.1", "dst": "2001:db9::"}, ["Private", "Subnet"]),
+            ({"src": "10.1.2.1:443"}, []),
+            ({"src": 167838209}, []),
+            ({"dst": "2001:db8::1"}, ["Subnet"]),
+        ]
+        for event, expected in cases:
+            with self.subTest(event=event):
+                self.assertListEqual(ruleset.match(event), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,267 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Columnar Tests
+"""
+import unittest
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import DictQueryBackend
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+RULES = """
+title: Login
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname:
+            - login
+            - logout
+        username|contains: admin
+    condition: sel
+---
+title: Pid
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        process.pid|lt: 10
+    exclude:
+        process.pid: 4
+    condition: sel and not exclude
+---
+title: Regex
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        username|re|i: ^adm
+    condition: sel
+---
+title: Exists
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        username|exists: true
+    nulls:
+        eventname: null
+    condition: sel and nulls
+"""
+
+EVENTS = [
+    {"eventname": "login", "username": "admin", "process.pid": 3},
+    {"eventname": "logout", "username": "root", "process.pid": 4},
+    {"eventname": "exec", "username": "Administrator", "process.pid": 12},
+    {"eventname": None, "username": "", "process.pid": None},
+    {"eventname": None, "username": "bob", "process.pid": 9.5},
+]
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class ColumnarTest(unittest.TestCase):
+    """
+    ColumnarTest - Tests for the columnar output format
+    """
+
+    def setUp(self):
+        """
+        setUp - convert the test collection into a columnar evaluator and a rule set
+        """
+        collection = SigmaCollection.from_yaml(RULES)
+        self.evaluator = DictQueryBackend().convert(collection, "columnar")
+        self.ruleset = DictQueryBackend().convert(collection, "ruleset")
+
+    def expected(self):
+        """
+        expected - per rule masks of the row-by-row rule set, using nested events
+        """
+        hits = [
+            self.ruleset.match(
+                {
+                    "eventname": event["eventname"],
+                    "username": event["username"],
+                    "process": {"pid": event["process.pid"]},
+                }
+            )
+            for event in EVENTS
+        ]
+        return {
+            rule_id: [rule_id in hit for hit in hits]
+            for rule_id in self.ruleset.rule_ids
+        }
+
+    def test_columnar_mapping(self):
+        """test masks over a mapping of columns"""
+        batch = {field: [event[field] for event in EVENTS] for field in EVENTS[0]}
+        masks = self.evaluator.evaluate(batch)
+        self.assertDictEqual(
+            {rule_id: mask.tolist() for rule_id, mask in masks.items()}, self.expected()
+        )
+
+    def test_columnar_typed_columns(self):
+        """test masks over natively typed NumPy columns"""
+        batch = {
+            "eventname": np.array(["login", "logout", "exec"]),
+            "username": np.array(["admin1", "xadmin", ""]),
+            "process.pid": np.array([3.0, 4.0, np.nan]),
+        }
+        masks = self.evaluator.evaluate(batch)
+        self.assertListEqual(masks["Login"].tolist(), [True, True, False])
+        self.assertListEqual(masks["Pid"].tolist(), [True, False, False])
+        self.assertListEqual(masks["Regex"].tolist(), [True, False, False])
+        self.assertListEqual(masks["Exists"].tolist(), [False, False, False])
+
+    def test_columnar_string_operators(self):
+        """test prefix, suffix and substring tests over string and object columns"""
+        collection = SigmaCollection.from_yaml(
+            """
+            title: Strings
+            status: test
+            logsource:
+                category: test_category
+                product: test_product
+            detection:
+                sel:
+                    fieldA|startswith: ab
+                    fieldB|endswith: yz
+                    fieldC|contains: mn
+                condition: sel
+            """
+        )
+        evaluator = DictQueryBackend().convert(collection, "columnar")
+        batch = {
+            "fieldA": np.array(["abc", "abd", "xab"]),
+            "fieldB": np.array(["xyz", "yzx", "yz"], dtype=object),
+            "fieldC": np.array(["lmno", "mn", 5], dtype=object),
+        }
+        masks = evaluator.evaluate(batch)
+        self.assertListEqual(masks["Strings"].tolist(), [True, False, False])
+        batch["fieldB"] = np.array(["xyz", "yz", "yz"], dtype=object)
+        masks = evaluator.evaluate(batch)
+        self.assertListEqual(masks["Strings"].tolist(), [True, True, False])
+
+    def test_columnar_cidr(self):
+        """test CIDR predicates over string, object and numeric columns"""
+        collection = SigmaCollection.from_yaml(
+            """
+            title: Cidr
+            status: test
+            logsource:
+                category: test_category
+                product: test_product
+            detection:
+                sel:
+                    src|cidr:
+                        - 10.0.0.0/8
+                        - 2001:db8::/32
+                condition: sel
+            """
+        )
+        evaluator = DictQueryBackend().convert(collection, "columnar")
+        batch = {"src": np.array(["10.2.3.4", "11.0.0.1", "2001:db8::5", "x"])}
+        masks = evaluator.evaluate(batch)
+        self.assertListEqual(masks["Cidr"].tolist(), [True, False, True, False])
+        batch = {"src": np.array(["10.0.0.1", None, 5], dtype=object)}
+        masks = evaluator.evaluate(batch)
+        self.assertListEqual(masks["Cidr"].tolist(), [True, False, False])
+        masks = evaluator.evaluate({"src": np.array([10, 11])})
+        self.assertListEqual(masks["Cidr"].tolist(), [False, False])
+
+    def test_columnar_case_insensitive(self):
+        """test that case insensitive backends fold operands and string columns"""
+        collection = SigmaCollection.from_yaml(
+            """
+            title: Case
+            status: test
+            logsource:
+                category: test_category
+                product: test_product
+            detection:
+                sel:
+                    user: admin
+                    host|startswith: WEB
+                    cmd|contains: PowerShell
+                    path: '*\\Temp\\*.EXE'
+                    proc: [CMD.exe, pwsh.exe]
+                    name|re: ^adm
+                condition: sel
+            """
+        )
+        backend = DictQueryBackend(case_sensitive=False)
+        evaluator = backend.convert(collection, "columnar")
+        ruleset = backend.convert(collection, "ruleset")
+        events = [
+            {
+                "user": "ADMIN",
+                "host": "web01",
+                "cmd": "x POWERSHELL -enc",
+                "path": "C:\\temp\\a.exe",
+                "proc": "cmd.EXE",
+                "name": "Admin",
+            },
+            {
+                "user": "admin",
+                "host": "Web02",
+                "cmd": "powershell",
+                "path": "C:\\TEMP\\B.Exe",
+                "proc": "PWSH.EXE",
+                "name": "ADM",
+            },
+            {
+                "user": "root",
+                "host": "web01",
+                "cmd": "powershell",
+                "path": "C:\\temp\\a.exe",
+                "proc": "cmd.exe",
+                "name": "adm",
+            },
+        ]
+        expected = [bool(ruleset.match(event)) for event in events]
+        self.assertListEqual(expected, [True, True, False])
+        batch = {field: [event[field] for event in events] for field in events[0]}
+        self.assertListEqual(evaluator.evaluate(batch)["Case"].tolist(), expected)
+        batch = {
+            field: np.array(column, dtype=object) for field, column in batch.items()
+        }
+        self.assertListEqual(evaluator.evaluate(batch)["Case"].tolist(), expected)
+        masks = DictQueryBackend().convert(collection, "columnar").evaluate(batch)
+        self.assertListEqual(masks["Case"].tolist(), [False, False, False])
+
+    def test_columnar_missing_column(self):
+        """test that missing columns hold no values"""
+        masks = self.evaluator.evaluate({"username": np.array(["admin"])})
+        self.assertListEqual(masks["Exists"].tolist(), [True])
+        self.assertListEqual(masks["Login"].tolist(), [False])
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_columnar_pyarrow(self):
+        """test masks over a pyarrow Table"""
+        table = pyarrow.table(
+            {field: [event[field] for event in EVENTS] for field in EVENTS[0]}
+        )
+        masks = self.evaluator.evaluate(table)
+        self.assertDictEqual(
+            {rule_id: mask.tolist() for rule_id, mask in masks.items()}, self.expected()
+        )
+
+    def test_columnar_invalid_batch(self):
+        """test that unsupported batch types are rejected"""
+        with self.assertRaises(TypeError):
+            self.evaluator.evaluate([{"username": "admin"}])
@@ -0,0 +1,197 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Parallel Conversion Tests
+"""
+import io
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery.cache import rule_files
+from sigma.backends.dictquery.conversion import ParallelConverter
+from sigma.backends.dictquery.conversion import convert_document
+from sigma.backends.dictquery.conversion import main
+
+
+class ParallelConverterTest(unittest.TestCase):
+    """
+    ParallelConverterTest - Tests for converting rule collections across worker processes
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        setUpClass - start a converter pool shared by the tests
+        """
+        cls.converter = ParallelConverter(workers=2, chunk_size=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        tearDownClass - shut the converter pool down
+        """
+        cls.converter.close()
+
+    def setUp(self):
+        """
+        setUp - write ten rule files to a temporary directory
+        """
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.rules = Path(temporary.name)
+        for index in range(10):
+            (self.rules / f"{index}.yml").write_text(
+                f"""
+                title: Rule {index}
+                status: test
+                logsource:
+                    category: test_category
+                    product: test_product
+                detection:
+                    sel:
+                        fieldA: value{index}
+                        fieldB|contains: part{index}
+                    condition: sel
+                """
+            )
+
+    def serial(self, output_format="default"):
+        """
+        serial - convert the rule files in this process, for comparison
+        """
+        collection = SigmaCollection.load_ruleset(rule_files([self.rules]))
+        return DictQueryBackend().convert(collection, output_format)
+
+    def test_order(self):
+        """test that the output and the reported rules are in input order"""
+        report = self.converter.convert_paths([self.rules])
+        self.assertListEqual(report.output, self.serial())
+        self.assertListEqual(
+            [rule.rule for rule in report.rules],
+            [f"Rule {index}" for index in range(10)],
+        )
+        self.assertListEqual(report.errors, [])
+        self.assertTrue(all(rule.seconds > 0 for rule in report.rules))
+        self.assertEqual(len(report.slowest(3)), 3)
+
+    def test_formats(self):
+        """test for the ruleset and python_callable output formats"""
+        ruleset = self.converter.convert_paths([self.rules], "ruleset").output
+        self.assertListEqual(ruleset.rules, self.serial("ruleset").rules)
+        functions = self.converter.convert_paths([self.rules], "python_callable").output
+        self.assertEqual(len(functions), 10)
+        self.assertTrue(functions[3]({"fieldA": "value3", "fieldB": "xpart3"}))
+        self.assertFalse(functions[3]({"fieldA": "value4", "fieldB": "xpart3"}))
+
+    def test_errors(self):
+        """test that rules failing to parse or convert are reported and left out"""
+        (self.rules / "3.yml").write_text(
+            """
+            title: Rule 3
+            status: test
+            logsource:
+                category: test_category
+                product: test_product
+            detection:
+                sel:
+                    fieldA: value3
+                condition: missing
+            """
+        )
+        (self.rules / "4.yml").write_text("title: [")
+        report = self.converter.convert_paths([self.rules])
+        self.assertEqual(len(report.output), 8)
+        self.assertListEqual(
+            [(Path(rule.source).name, rule.rule) for rule in report.errors],
+            [("3.yml", "Rule 3"), ("4.yml", None)],
+        )
+        self.assertIn("SigmaConditionError", report.errors[0].errors[0])
+        self.assertListEqual(report.errors[0].queries, [])
+
+    def test_convert_document(self):
+        """test for converting every rule of a multi-document file"""
+        document = """
+title: Rule 1
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        fieldA: value1
+        fieldB|contains: part1
+    condition: sel
+---
+title: Rule 2
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        fieldA: value2
+        fieldB|contains: part2
+    condition: sel
+"""
+        results = convert_document(DictQueryBackend(), "a.yml", document, "default")
+        self.assertListEqual(
+            [(result.rule, result.queries) for result in results],
+            [
+                ("Rule 1", ["fieldA=='value1' AND fieldB LIKE '*part1*'"]),
+                ("Rule 2", ["fieldA=='value2' AND fieldB LIKE '*part2*'"]),
+            ],
+        )
+
+    def test_main(self):
+        """test for the command line converter"""
+        (self.rules / "4.yml").write_text("title: [")
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            status = main([str(self.rules), "--workers", "2", "--slowest", "2"])
+        self.assertEqual(status, 1)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(records), 10)
+        self.assertListEqual(
+            records[0]["queries"], ["fieldA=='value0' AND fieldB LIKE '*part0*'"]
+        )
+        self.assertIsNone(records[4]["rule"])
+        self.assertIn("ParserError", records[4]["errors"][0])
+        self.assertIn("invalid document", err.getvalue())
+
+    def test_collected_errors(self):
+        """test that errors collected by the backend are reported with their rule"""
+        (self.rules / "3.yml").write_text(
+            """
+            title: Rule 3
+            status: test
+            logsource:
+                category: test_category
+                product: test_product
+            detection:
+                sel:
+                    fieldA: value3
+                condition: sel and missing
+            """
+        )
+        backend = DictQueryBackend(collect_errors=True)
+        with ParallelConverter(backend, workers=1) as converter:
+            report = converter.convert_paths([self.rules])
+        self.assertEqual(len(report.output), 9)
+        self.assertListEqual([rule.rule for rule in report.errors], ["Rule 3"])
+        self.assertIn("SigmaConditionError", report.errors[0].errors[0])
+
+        results = convert_document(
+            backend, "3.yml", (self.rules / "3.yml").read_text(), "default"
+        )
+        self.assertListEqual(results[0].queries, [])
+        self.assertEqual(len(results[0].errors), 1)
+        self.assertListEqual(backend.errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
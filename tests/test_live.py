@@ -0,0 +1,332 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Live Rule Set Tests
+"""
+import threading
+import unittest
+
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaError
+
+from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery.live import LiveRuleSet
+
+RULES = """
+title: Rule 0
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: event
+    condition: sel
+---
+title: Rule 1
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: event
+    condition: sel
+---
+title: Rule 2
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: event
+    condition: sel
+---
+title: Rule 3
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: event
+    condition: sel
+---
+title: Rule 4
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: event
+    condition: sel
+"""
+
+
+class LiveRuleSetTest(unittest.TestCase):
+    """
+    LiveRuleSetTest - Tests for incremental changes to a live rule set
+    """
+
+    def setUp(self):
+        """
+        setUp - build a live rule set of five rules in shards of two
+        """
+        self.live = LiveRuleSet.from_collection(
+            SigmaCollection.from_yaml(RULES), shard_size=2
+        )
+        self.event = {"eventname": "event"}
+
+    def test_from_collection(self):
+        """test that a collection is converted into a live rule set in collection order"""
+        self.assertEqual(len(self.live), 5)
+        self.assertListEqual(
+            self.live.rule_ids, ["Rule 0", "Rule 1", "Rule 2", "Rule 3", "Rule 4"]
+        )
+        self.assertListEqual(self.live.match(self.event), self.live.rule_ids)
+        self.assertListEqual(self.live.match({"eventname": "other"}), [])
+        self.assertListEqual(
+            self.live.snapshot().match(self.event), self.live.match(self.event)
+        )
+
+    def test_add(self):
+        """test that added rules go after the present ones and duplicates are rejected"""
+        yaml = """
+        title: Rule 5
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                eventname: event
+            condition: sel
+        """
+        self.live.add(yaml)
+        self.assertIn("Rule 5", self.live)
+        self.assertEqual(len(self.live), 6)
+        self.assertListEqual(
+            self.live.match(self.event),
+            ["Rule 0", "Rule 1", "Rule 2", "Rule 3", "Rule 4", "Rule 5"],
+        )
+        with self.assertRaises(ValueError):
+            self.live.add(yaml)
+        self.assertEqual(len(self.live), 6)
+
+    def test_add_collected_error(self):
+        """test that a rule converting to no queries is rejected"""
+        yaml = """
+        title: Rule 5
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                eventname: event
+            condition: sel and missing
+        """
+        backend = DictQueryBackend(collect_errors=True)
+        live = LiveRuleSet.from_collection(
+            SigmaCollection.from_yaml(RULES), backend, shard_size=2
+        )
+        with self.assertRaisesRegex(ValueError, "Rule 5"):
+            live.add(yaml)
+        self.assertNotIn("Rule 5", live)
+        self.assertEqual(len(backend.errors), 1)
+
+    def test_concurrent_add(self):
+        """test that concurrent adds of the same rule let exactly one of them through"""
+        yaml = """
+        title: Rule 5
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                eventname: event
+            condition: sel
+        """
+        errors = []
+
+        def add():
+            """add the rule, recording a rejection"""
+            try:
+                self.live.add(yaml)
+            except ValueError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=add) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(self.live.rule_ids.count("Rule 5"), 1)
+
+    def test_replace(self):
+        """test that a replaced rule keeps its position and unknown rules are rejected"""
+        self.live.replace(
+            """
+            title: Rule 2
+            status: test
+            logsource:
+                category: test_category
+                product: test_product
+            detection:
+                sel:
+                    eventname: other
+                condition: sel
+            """
+        )
+        self.assertListEqual(self.live.match({"eventname": "other"}), ["Rule 2"])
+        self.assertListEqual(
+            self.live.match(self.event), ["Rule 0", "Rule 1", "Rule 3", "Rule 4"]
+        )
+        with self.assertRaises(KeyError):
+            self.live.replace(
+                """
+                title: Rule 9
+                status: test
+                logsource:
+                    category: test_category
+                    product: test_product
+                detection:
+                    sel:
+                        eventname: other
+                    condition: sel
+                """
+            )
+
+    def test_remove(self):
+        """test that removed rules no longer match and unknown ids are rejected"""
+        self.live.remove("Rule 4")
+        self.live.remove("Rule 0")
+        self.assertEqual(len(self.live), 3)
+        self.assertListEqual(self.live.rule_ids, ["Rule 1", "Rule 2", "Rule 3"])
+        self.assertListEqual(self.live.match(self.event), self.live.rule_ids)
+        self.assertNotIn("Rule 0", self.live)
+        with self.assertRaises(KeyError):
+            self.live.remove("Rule 0")
+
+    def test_update(self):
+        """test for replacing, adding and removing rules in one change"""
+        self.live.update(
+            [
+                """
+                title: Rule 1
+                status: test
+                logsource:
+                    category: test_category
+                    product: test_product
+                detection:
+                    sel:
+                        eventname: other
+                    condition: sel
+                """,
+                """
+                title: Rule 5
+                status: test
+                logsource:
+                    category: test_category
+                    product: test_product
+                detection:
+                    sel:
+                        eventname: event
+                    condition: sel
+                """,
+            ],
+            remove=["Rule 0", "Rule 7"],
+        )
+        self.assertListEqual(
+            self.live.rule_ids, ["Rule 1", "Rule 2", "Rule 3", "Rule 4", "Rule 5"]
+        )
+        self.assertListEqual(self.live.match({"eventname": "other"}), ["Rule 1"])
+
+    def test_failed_conversion(self):
+        """test that nothing changes when one of the rules fails to convert"""
+        with self.assertRaises(SigmaError):
+            self.live.update(
+                [
+                    """
+                    title: Rule 1
+                    status: test
+                    logsource:
+                        category: test_category
+                        product: test_product
+                    detection:
+                        sel:
+                            eventname: other
+                        condition: sel
+                    """,
+                    """
+                    title: Rule 2
+                    status: test
+                    logsource:
+                        category: test_category
+                        product: test_product
+                    detection:
+                        sel:
+                            eventname: event
+                        condition: nope
+                    """,
+                ]
+            )
+        self.assertEqual(len(self.live), 5)
+        self.assertListEqual(self.live.match({"eventname": "other"}), [])
+        self.assertListEqual(self.live.match(self.event), self.live.rule_ids)
+
+    def test_concurrent_match(self):
+        """test that a match sees a change to rules in different shards entirely or not at all"""
+        events = [{"eventname": "a"}, {"eventname": "b"}]
+        stop = threading.Event()
+        errors = []
+
+        def match():
+            """match the events until stopped, recording matches of only one rule"""
+            while not stop.is_set():
+                for event in events:
+                    hits = self.live.match(event)
+                    if ("Rule 1" in hits) != ("Rule 2" in hits):
+                        errors.append(hits)
+
+        thread = threading.Thread(target=match)
+        thread.start()
+        try:
+            for iteration in range(50):
+                value = "ab"[iteration % 2]
+                self.live.update(
+                    [
+                        f"""
+                        title: Rule 1
+                        status: test
+                        logsource:
+                            category: test_category
+                            product: test_product
+                        detection:
+                            sel:
+                                eventname: {value}
+                            condition: sel
+                        """,
+                        f"""
+                        title: Rule 2
+                        status: test
+                        logsource:
+                            category: test_category
+                            product: test_product
+                        detection:
+                            sel:
+                                eventname: {value}
+                            condition: sel
+                        """,
+                    ]
+                )
+        finally:
+            stop.set()
+            thread.join()
+        self.assertListEqual(errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
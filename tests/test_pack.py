@@ -0,0 +1,200 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Rule Pack Tests
+"""
+import io
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery.conversion import main
+from sigma.backends.dictquery.pack import PACK_MAGIC
+from sigma.backends.dictquery.pack import RulePack
+from sigma.backends.dictquery.pack import is_pack
+from sigma.backends.dictquery.pack import write_pack
+from sigma.backends.dictquery.stream import load_ruleset
+from sigma.backends.dictquery.stream import main as match_main
+
+RULES = """
+title: Process
+id: 00000000-0000-4000-8000-000000000001
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname:
+            - CreateProcess
+            - StartProcess
+        commandline|contains: powershell
+    filter:
+        user: null
+    condition: sel and not filter
+---
+title: Network
+id: 00000000-0000-4000-8000-000000000002
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        src|cidr: 10.0.0.0/8
+        port|gt: 1024
+        bytes|lte: 1.5
+    condition: sel
+---
+title: Regex
+id: 00000000-0000-4000-8000-000000000003
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        path|re: '^/usr/s?bin/'
+        path|endswith: /curl
+    other:
+        name: 'Ünïcödé'
+    condition: 1 of them
+"""
+
+EVENTS = [
+    {"eventname": "CreateProcess", "commandline": "x powershell -enc", "user": "a"},
+    {"eventname": "StartProcess", "commandline": "POWERSHELL", "user": None},
+    {"eventname": "createprocess", "commandline": "PowerShell", "user": "a"},
+    {"src": "10.1.2.3", "port": 8080, "bytes": 1},
+    {"src": "11.1.2.3", "port": 8080, "bytes": 1},
+    {"path": "/usr/bin/curl"},
+    {"path": "/opt/bin/curl"},
+    {"name": "ünïcödé"},
+    {"name": "Ünïcödé"},
+]
+
+
+class RulePackTest(unittest.TestCase):
+    """
+    RulePackTest - Tests for writing and loading binary rule packs
+    """
+
+    def setUp(self):
+        """
+        setUp - convert the rules to a rule set and a rule pack
+        """
+        self.collection = SigmaCollection.from_yaml(RULES)
+        self.backend = DictQueryBackend()
+        self.ruleset = self.backend.convert(self.collection, "ruleset")
+        self.pack = RulePack(self.backend.convert(self.collection, "pack"))
+
+    def test_rules(self):
+        """test that a pack decodes to the rules it was written from"""
+        self.assertEqual(len(self.pack), 3)
+        self.assertTrue(self.pack.case_sensitive)
+        self.assertListEqual(self.pack.rules(), self.ruleset.rules)
+
+    def test_prefilter(self):
+        """test that a pack decodes to the prefilter index of its rule set"""
+        prefilter = self.pack.prefilter()
+        self.assertDictEqual(prefilter.index, self.ruleset.prefilter.index)
+        self.assertListEqual(
+            list(prefilter.unindexed), list(self.ruleset.prefilter.unindexed)
+        )
+
+    def test_match(self):
+        """test that a rule set loaded from a pack matches like the converted one"""
+        for options in ({}, {"prefilter": False}, {"substring_prefilter": True}):
+            ruleset = self.pack.ruleset(**options)
+            for event in EVENTS:
+                with self.subTest(options=options, event=event):
+                    self.assertListEqual(
+                        ruleset.match(event), self.ruleset.match(event)
+                    )
+
+    def test_case_insensitive(self):
+        """test for packs of case insensitive rule sets"""
+        backend = DictQueryBackend(case_sensitive=False)
+        expected = backend.convert(self.collection, "ruleset")
+        pack = RulePack(backend.convert(self.collection, "pack"))
+        self.assertFalse(pack.case_sensitive)
+        self.assertDictEqual(pack.prefilter().index, expected.prefilter.index)
+        for ruleset in (pack.ruleset(), self.pack.ruleset(case_sensitive=False)):
+            for event in EVENTS:
+                with self.subTest(event=event):
+                    self.assertListEqual(ruleset.match(event), expected.match(event))
+
+    def test_invalid(self):
+        """test that buffers without a pack or with another version are rejected"""
+        data = bytearray(self.backend.convert(self.collection, "pack"))
+        with self.assertRaises(ValueError):
+            RulePack(b"DQR")
+        with self.assertRaises(ValueError):
+            RulePack(b"NOTAPACK" + bytes(data[len(PACK_MAGIC) :]))
+        data[len(PACK_MAGIC)] = 99
+        with self.assertRaisesRegex(ValueError, "version 99"):
+            RulePack(data)
+
+    def test_files(self):
+        """test for writing, opening and loading pack files"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "rules.pack"
+            write_pack(path, self.ruleset.rules)
+            self.assertTrue(is_pack(path))
+            self.assertFalse(is_pack(directory))
+            with RulePack.open(path) as pack:
+                self.assertListEqual(pack.rules(), self.ruleset.rules)
+            self.assertTrue(pack.mapping.closed)
+            with self.assertRaises(ValueError):
+                pack.rules()
+            ruleset = load_ruleset([path])
+            self.assertListEqual(
+                ruleset.match(EVENTS[0]), self.ruleset.match(EVENTS[0])
+            )
+
+            rules = Path(directory) / "rules.yml"
+            rules.write_text(RULES, encoding="utf-8")
+            self.assertFalse(is_pack(rules))
+            out = io.StringIO()
+            with redirect_stdout(out):
+                status = main([str(rules), "--workers", "1", "--pack", str(path)])
+            self.assertEqual(status, 0)
+            self.assertNotIn("queries", out.getvalue())
+            with RulePack.open(path) as pack:
+                self.assertListEqual(pack.rules(), self.ruleset.rules)
+
+    def test_files_ignore_case(self):
+        """test that matching a pack converted with --ignore-case keeps ignoring case"""
+        with tempfile.TemporaryDirectory() as directory:
+            rules = Path(directory) / "rules.yml"
+            rules.write_text(RULES, encoding="utf-8")
+            path = Path(directory) / "rules.pack"
+            events = Path(directory) / "events.jsonl"
+            events.write_text(json.dumps(EVENTS[2]) + "\n", encoding="utf-8")
+            with redirect_stdout(io.StringIO()):
+                argv = [str(rules), "--workers", "1", "--pack", str(path)]
+                self.assertEqual(main(argv + ["--ignore-case"]), 0)
+            out = io.StringIO()
+            with redirect_stdout(out):
+                self.assertEqual(match_main([str(path), str(events)]), 0)
+            self.assertListEqual(
+                [json.loads(line)["rule"] for line in out.getvalue().splitlines()],
+                ["00000000-0000-4000-8000-000000000001"],
+            )
+
+    def test_open_invalid(self):
+        """test that a file that isn't a valid pack is unmapped when it is rejected"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "rules.pack"
+            data = self.backend.convert(self.collection, "pack")
+            for content in (b"NOTAPACK" + data[len(PACK_MAGIC) :], data[:40]):
+                path.write_bytes(content)
+                with self.assertRaises(ValueError):
+                    RulePack.open(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
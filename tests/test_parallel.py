@@ -0,0 +1,95 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Parallel Matcher Tests
+"""
+import pickle
+import unittest
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import RuleSet
+from sigma.backends.dictquery.parallel import ParallelMatcher
+from sigma.backends.dictquery.parallel import chunked
+
+RULES = """
+title: Login
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: login
+    condition: sel
+---
+title: Admin
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        username|contains: admin
+    condition: sel
+"""
+
+
+class ParallelMatcherTest(unittest.TestCase):
+    """
+    ParallelMatcherTest - Tests for the multiprocess rule set matcher
+    """
+
+    def setUp(self):
+        """
+        setUp - build a rule set and a batch of events to match
+        """
+        self.ruleset = RuleSet.from_collection(
+            SigmaCollection.from_yaml(RULES), substring_prefilter=True
+        )
+        self.events = [
+            {
+                "eventname": ["login", "logout"][i % 2],
+                "username": f"user{i % 7}admin"[i % 3 :],
+            }
+            for i in range(200)
+        ]
+        self.expected = [
+            (position, rule_id)
+            for position, event in enumerate(self.events)
+            for rule_id in self.ruleset.match(event)
+        ]
+
+    def test_ruleset_pickle(self):
+        """test that a rule set and its prefilters survive pickling"""
+        ruleset = pickle.loads(pickle.dumps(self.ruleset))
+        self.assertIsNotNone(ruleset.prefilter)
+        self.assertIsNotNone(ruleset.substring_prefilter)
+        self.assertListEqual(
+            [ruleset.match(event) for event in self.events],
+            [self.ruleset.match(event) for event in self.events],
+        )
+
+    def test_chunked(self):
+        """test for splitting an iterable into fixed size chunks"""
+        self.assertListEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_match_ordered(self):
+        """test that ordered matching yields matches in event order"""
+        with ParallelMatcher(self.ruleset, workers=2, chunk_size=7) as matcher:
+            self.assertListEqual(list(matcher.match(self.events)), self.expected)
+
+    def test_match_unordered(self):
+        """test that unordered matching yields every match"""
+        with ParallelMatcher(self.ruleset, workers=2, chunk_size=7) as matcher:
+            self.assertListEqual(
+                sorted(matcher.match(iter(self.events), ordered=False)),
+                sorted(self.expected),
+            )
+
+    def test_chunk_size(self):
+        """test that a non-positive chunk size is rejected"""
+        with self.assertRaises(ValueError):
+            ParallelMatcher(self.ruleset, chunk_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Prefilter Tests
+"""
+import json
+import unittest
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery import RuleSet
+from sigma.backends.dictquery.expression import EQ
+from sigma.backends.dictquery.expression import IN
+from sigma.backends.dictquery.expression import LIKE
+from sigma.backends.dictquery.expression import And
+from sigma.backends.dictquery.expression import Not
+from sigma.backends.dictquery.expression import Or
+from sigma.backends.dictquery.expression import Predicate
+from sigma.backends.dictquery.prefilter import PrefilterIndex
+from sigma.backends.dictquery.prefilter import required_values
+
+RULES = """
+title: Login
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname:
+            - login
+            - logout
+        username|contains: admin
+    condition: sel
+---
+title: Process
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel1:
+        eventname: exec
+    sel2:
+        process.pid: 4
+    condition: 1 of sel*
+---
+title: Anything
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        username|startswith: adm
+    condition: sel
+"""
+
+
+class PrefilterTest(unittest.TestCase):
+    """
+    PrefilterTest - Tests for the field value prefilter index
+    """
+
+    def test_required_values(self):
+        """test which expressions carry an equality requirement"""
+        eq = Predicate(EQ, "a", "x")
+        in_list = Predicate(IN, "b", ("y", "z"))
+        like = Predicate(LIKE, "c", "*w*")
+        self.assertEqual(required_values(eq), {("a", "x")})
+        self.assertEqual(required_values(And((like, in_list, eq))), {("a", "x")})
+        self.assertEqual(
+            required_values(Or((eq, in_list))), {("a", "x"), ("b", "y"), ("b", "z")}
+        )
+        self.assertIsNone(required_values(Or((eq, like))))
+        self.assertIsNone(required_values(Not(eq)))
+        self.assertIsNone(required_values(And((like, Not(eq)))))
+
+    def test_prefilter_output(self):
+        """test the prefilter output format and its JSON round trip"""
+        collection = SigmaCollection.from_yaml(RULES)
+        output = DictQueryBackend().convert(collection, "prefilter")
+        self.assertListEqual(
+            [query["id"] for query in output["queries"]],
+            ["Login", "Process", "Anything"],
+        )
+        self.assertEqual(
+            output["queries"][1]["query"], "eventname=='exec' OR `process.pid`==4"
+        )
+        index = PrefilterIndex.from_dict(json.loads(json.dumps(output["prefilter"])))
+        self.assertListEqual(index.unindexed, ["Anything"])
+        self.assertEqual(
+            index.candidates({"eventname": "logout", "process": {"pid": 4}}),
+            {"Login", "Process"},
+        )
+        self.assertEqual(index.candidates({"eventname": ["exec"]}), set())
+        self.assertEqual(index.candidates({"eventname": "other"}), set())
+        fields = {}
+        index.candidates({"eventname": "exec", "process": {"pid": 4}}, fields)
+        self.assertDictEqual(
+            fields,
+            {
+                ("eventname",): ["exec"],
+                ("process",): [{"pid": 4}],
+                ("process", "pid"): [4],
+            },
+        )
+
+    def test_prefilter_ruleset(self):
+        """test that a prefiltered rule set matches the same rules as an unfiltered one"""
+        rules = DictQueryBackend().convert(SigmaCollection.from_yaml(RULES), "ruleset")
+        unfiltered = RuleSet(rules.rules, prefilter=False)
+        self.assertIsNone(unfiltered.prefilter)
+        events = [
+            {"eventname": "login", "username": "admin"},
+            {"eventname": "exec", "username": "administrator"},
+            {"eventname": "other", "process": {"pid": 4.0}, "username": "root"},
+            {"eventname": "logout", "username": ["bob", "admin2"]},
+            {},
+        ]
+        for event in events:
+            with self.subTest(event=event):
+                self.assertListEqual(rules.match(event), unfiltered.match(event))
@@ -0,0 +1,204 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Profiling Tests
+"""
+import json
+import pickle
+import unittest
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import RuleSet
+
+RULES = """
+title: Login
+id: 9f3e2b5c-1d4a-4c1e-9a57-000000000001
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname: login
+        username|re: '^adm.*'
+    condition: sel
+---
+title: Process
+id: 9f3e2b5c-1d4a-4c1e-9a57-000000000002
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        process.name|endswith: .exe
+        process.pid|lt: 10
+    condition: sel
+"""
+
+EVENTS = [
+    {"eventname": "login", "username": "admin"},
+    {"eventname": "login", "username": "user"},
+    {"eventname": "logout", "process": {"name": "a.exe", "pid": 5}},
+    {"process": {"name": "a.sh", "pid": 5}},
+]
+
+LOGIN = "9f3e2b5c-1d4a-4c1e-9a57-000000000001"
+PROCESS = "9f3e2b5c-1d4a-4c1e-9a57-000000000002"
+
+
+class ProfileTest(unittest.TestCase):
+    """
+    ProfileTest - Tests for rule set profiling
+    """
+
+    def setUp(self):
+        """
+        setUp - match the events against a plain, a counting and a fully timed rule set
+        """
+        rules = SigmaCollection.from_yaml(RULES)
+        self.plain = RuleSet.from_collection(rules)
+        self.counted = RuleSet.from_collection(rules, profile=True)
+        self.ruleset = RuleSet.from_collection(rules, profile=True, profile_sample=1)
+        for event in EVENTS:
+            self.assertListEqual(self.counted.match(event), self.plain.match(event))
+            self.assertListEqual(self.ruleset.match(event), self.plain.match(event))
+        self.profile = self.ruleset.profile
+
+    def test_rules(self):
+        """test for the evaluation, hit and skip counters of each rule"""
+        self.assertIsNone(self.plain.profile)
+        for profile in (self.counted.profile, self.profile):
+            stats = profile.rule_stats()
+            # Login is only evaluated for the events containing eventname 'login'
+            self.assertEqual(
+                (stats[LOGIN].evaluations, stats[LOGIN].hits, stats[LOGIN].skipped),
+                (2, 1, 2),
+            )
+            # Process has no indexed value and is evaluated for every event
+            self.assertEqual(
+                (
+                    stats[PROCESS].evaluations,
+                    stats[PROCESS].hits,
+                    stats[PROCESS].skipped,
+                ),
+                (4, 1, 0),
+            )
+        self.assertGreater(self.profile.rule_stats()[PROCESS].seconds, 0)
+
+    def test_rule_short_circuits(self):
+        """test for counting the evaluations decided before all predicates of a rule ran"""
+        stats = self.profile.rule_stats()
+        # Both Login evaluations need the regular expression to decide
+        self.assertEqual(stats[LOGIN].short_circuits, 0)
+        # Process is decided by the name alone unless it ends with .exe
+        self.assertEqual(stats[PROCESS].short_circuits, 3)
+        self.assertTrue(
+            all(
+                stats.short_circuits == 0
+                for stats in self.counted.profile.rule_stats().values()
+            )
+        )
+
+    def test_counters_only(self):
+        """test that without a sample nothing is timed"""
+        profile = self.counted.profile
+        self.assertEqual((profile.events, profile.sampled), (4, 0))
+        self.assertTrue(
+            all(stats.seconds == 0 for stats in profile.rule_stats().values())
+        )
+        self.assertDictEqual(profile.predicate_stats(), {})
+
+    def test_sampling(self):
+        """test that every sample-th event is timed and all of them are counted"""
+        ruleset = RuleSet.from_collection(
+            SigmaCollection.from_yaml(RULES), profile=True, profile_sample=3
+        )
+        for event in EVENTS * 2:
+            ruleset.match(event)
+        profile = ruleset.profile
+        self.assertEqual((profile.events, profile.sampled), (8, 3))
+        self.assertEqual(profile.rule_stats()[PROCESS].evaluations, 8)
+        self.assertEqual(profile.predicate_stats()["endswith"].evaluations, 3)
+        with self.assertRaises(ValueError):
+            RuleSet.from_collection(
+                SigmaCollection.from_yaml(RULES), profile=True, profile_sample=-1
+            )
+
+    def test_predicates(self):
+        """test for the evaluation and hit counters of each predicate operator"""
+        stats = self.profile.predicate_stats()
+        self.assertListEqual(sorted(stats), ["endswith", "eq", "lt", "match"])
+        self.assertEqual((stats["match"].evaluations, stats["match"].hits), (2, 1))
+        self.assertEqual(
+            (stats["endswith"].evaluations, stats["endswith"].hits), (4, 1)
+        )
+        # The pid test is skipped unless the name ends with .exe
+        self.assertEqual((stats["lt"].evaluations, stats["lt"].short_circuits), (1, 3))
+        self.assertEqual(stats["endswith"].short_circuits, 0)
+
+    def test_predicate_short_circuits(self):
+        """test that operators only ever skipped by short-circuiting are reported"""
+        ruleset = RuleSet.from_collection(
+            SigmaCollection.from_yaml(RULES),
+            prefilter=False,
+            profile=True,
+            profile_sample=1,
+        )
+        ruleset.match(EVENTS[3])
+        stats = ruleset.profile.predicate_stats()
+        self.assertEqual(
+            (stats["match"].evaluations, stats["match"].short_circuits), (0, 1)
+        )
+        self.assertEqual(ruleset.profile.rule_stats()[LOGIN].short_circuits, 1)
+
+    def test_top(self):
+        """test for ranking rules by a counter and reporting the top ones"""
+        self.assertListEqual(
+            [ident for ident, _ in self.profile.top(key="evaluations")],
+            [PROCESS, LOGIN],
+        )
+        report = self.profile.report(1).splitlines()
+        self.assertEqual(len(report), 3)
+        self.assertEqual(report[0], "4 events, 4 sampled")
+        self.assertEqual(report[2].split()[-1], self.profile.top(1)[0][0])
+
+    def test_export(self):
+        """test for exporting the counters as JSON and Prometheus text"""
+        data = json.loads(json.dumps(self.profile.to_dict()))
+        self.assertEqual((data["events"], data["sampled"]), (4, 4))
+        self.assertEqual(data["rules"][LOGIN]["evaluations"], 2)
+        self.assertEqual(data["rules"][PROCESS]["short_circuits"], 3)
+        self.assertEqual(data["predicates"]["lt"]["short_circuits"], 3)
+        self.assertNotIn("skipped", data["predicates"]["match"])
+
+        text = self.profile.prometheus()
+        self.assertIn("dictquery_events_total 4", text)
+        self.assertIn("# TYPE dictquery_rule_seconds_total counter", text)
+        self.assertIn(f'dictquery_rule_hits_total{{rule="{LOGIN}"}} 1', text)
+        self.assertIn('dictquery_predicate_evaluations_total{op="match"} 2', text)
+        self.assertIn(
+            f'dictquery_rule_short_circuits_total{{rule="{PROCESS}"}} 3', text
+        )
+        self.assertIn('dictquery_predicate_short_circuits_total{op="lt"} 3', text)
+
+    def test_reset(self):
+        """test that resetting zeroes the counters the rule set keeps incrementing"""
+        self.profile.reset()
+        self.assertEqual((self.profile.events, self.profile.sampled), (0, 0))
+        self.assertTrue(
+            all(stats.evaluations == 0 for stats in self.profile.rule_stats().values())
+        )
+        self.assertDictEqual(self.profile.predicate_stats(), {})
+        self.ruleset.match(EVENTS[0])
+        self.assertEqual(self.profile.rule_stats()[LOGIN].hits, 1)
+
+    def test_pickle(self):
+        """test that a pickled rule set is profiled the same way with fresh counters"""
+        ruleset = pickle.loads(pickle.dumps(self.ruleset))
+        self.assertIsNotNone(ruleset.profile)
+        self.assertEqual(ruleset.profile.sample, 1)
+        self.assertEqual(ruleset.profile.rule_stats()[LOGIN].evaluations, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
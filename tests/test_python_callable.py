@@ -0,0 +1,396 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Python Callable Tests
+"""
+import unittest
+from unittest import mock
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery import runtime
+from sigma.backends.dictquery.compiler import PythonCallableCompiler
+from sigma.backends.dictquery.expression import CONTAINS
+from sigma.backends.dictquery.expression import ENDSWITH
+from sigma.backends.dictquery.expression import LIKE
+from sigma.backends.dictquery.expression import STARTSWITH
+from sigma.backends.dictquery.expression import And
+from sigma.backends.dictquery.expression import Predicate
+
+
+class PythonCallableTest(unittest.TestCase):
+    """
+    PythonCallableTest - Tests for the python_callable output format
+    """
+
+    def compile_rule(self, yaml):
+        """
+        compile_rule - convert a YAML blob with the python_callable format and return its function
+        """
+        sigma_rule = SigmaCollection.from_yaml(yaml)
+        functions = DictQueryBackend().convert(sigma_rule, "python_callable")
+        self.assertEqual(len(functions), 1)
+        return functions[0]
+
+    def assert_matches(self, yaml, matching, not_matching):
+        """
+        assert_matches - check the compiled rule against matching and non-matching events
+        """
+        match = self.compile_rule(yaml)
+        for event in matching:
+            with self.subTest(event=event):
+                self.assertIs(match(event), True)
+        for event in not_matching:
+            with self.subTest(event=event):
+                self.assertIs(match(event), False)
+
+    def test_python_callable_and_or(self):
+        """test for AND and OR expressions"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel1:
+                fieldA: valueA
+                fieldB: valueB
+            sel2:
+                fieldC: valueC
+            condition: 1 of sel*
+        """
+        self.assert_matches(
+            yaml,
+            [{"fieldA": "valueA", "fieldB": "valueB"}, {"fieldC": "valueC"}],
+            [{"fieldA": "valueA"}, {"fieldC": "valueA"}, {}],
+        )
+
+    def test_python_callable_in_expression(self):
+        """test for IN expressions with strings and numbers"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA:
+                    - valueA
+                    - valueB
+                fieldB:
+                    - 1
+                    - 2
+            condition: sel
+        """
+        self.assert_matches(
+            yaml,
+            [{"fieldA": "valueB", "fieldB": 2}, {"fieldA": "valueA", "fieldB": 1.0}],
+            [
+                {"fieldA": "valueC", "fieldB": 1},
+                {"fieldA": "valueA", "fieldB": "1"},
+                {"fieldA": ["valueA"], "fieldB": 1},
+            ],
+        )
+
+    def test_python_callable_like(self):
+        """test for contains, startswith, endswith and wildcard matching"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA|contains: foo
+                fieldB|startswith: bar
+                fieldC|endswith: baz
+                fieldD: 'a?c'
+            condition: sel
+        """
+        event = {"fieldA": "xfoox", "fieldB": "barx", "fieldC": "xbaz", "fieldD": "abc"}
+        self.assert_matches(
+            yaml,
+            [event],
+            [
+                dict(event, fieldA="Foo"),
+                dict(event, fieldB="xbar"),
+                dict(event, fieldC="bazx"),
+                dict(event, fieldD="abbc"),
+            ],
+        )
+
+    def test_python_callable_string_operators(self):
+        """test that pure prefix, suffix and substring patterns skip glob matching"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA|contains: foo
+                fieldB|startswith: bar
+                fieldC|endswith: baz
+                fieldD: 'a*c'
+                fieldE|contains: '[x]'
+            condition: sel
+        """
+        expression = DictQueryBackend(reorder=False).convert(
+            SigmaCollection.from_yaml(yaml), "expression"
+        )[0]
+        self.assertEqual(
+            expression,
+            And(
+                (
+                    Predicate(CONTAINS, "fieldA", "foo"),
+                    Predicate(STARTSWITH, "fieldB", "bar"),
+                    Predicate(ENDSWITH, "fieldC", "baz"),
+                    Predicate(LIKE, "fieldD", "a*c"),
+                    Predicate(LIKE, "fieldE", "*[x]*"),
+                )
+            ),
+        )
+
+    def test_python_callable_case_insensitive(self):
+        """test case-insensitive matching with case folded operands"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA|contains: Foo
+                fieldB:
+                    - Bar
+                    - baz
+                fieldC|re: ^abc
+                fieldD: 'a?C'
+            condition: sel
+        """
+        event = {"fieldA": "xFOOx", "fieldB": "BAZ", "fieldC": "ABCD", "fieldD": "Abc"}
+        rules = SigmaCollection.from_yaml(yaml)
+        match = DictQueryBackend(case_sensitive=False).convert(
+            rules, "python_callable"
+        )[0]
+        self.assertIs(match(event), True)
+        self.assertIs(match(dict(event, fieldB="qux")), False)
+        self.assertIs(self.compile_rule(yaml)(event), False)
+
+    def test_python_callable_regex(self):
+        """test for regular expressions, anchored at the start like dictquery's MATCH"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA|re: foo.*bar
+            condition: sel
+        """
+        self.assert_matches(
+            yaml,
+            [{"fieldA": "foo-bar"}, {"fieldA": "foobarbaz"}],
+            [{"fieldA": "xfoobar"}],
+        )
+
+    def test_python_callable_compare_and_not(self):
+        """test for numeric comparisons and negation"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                process.pid|gte: 10
+            exclude:
+                process.pid|gt: 100
+            condition: sel and not exclude
+        """
+        self.assert_matches(
+            yaml,
+            [{"process": {"pid": 10}}, {"process": {"pid": 100.0}}],
+            [{"process": {"pid": 9}}, {"process": {"pid": 101}}, {"process": {}}],
+        )
+
+    def test_python_callable_exists(self):
+        """test for field existence, which follows dictquery's truthiness check"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                fieldA|exists: true
+            exclude:
+                fieldB|exists: true
+            condition: sel and not exclude
+        """
+        self.assert_matches(
+            yaml,
+            [{"fieldA": "x"}, {"fieldA": 1, "fieldB": ""}],
+            [{"fieldA": "x", "fieldB": "y"}, {"fieldA": ""}, {}],
+        )
+
+    def test_python_callable_cidr(self):
+        """test for |cidr expressions, matched like the expanded LIKE patterns"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                field|cidr: 192.168.0.0/16
+            condition: sel
+        """
+        self.assert_matches(
+            yaml,
+            [{"field": "192.168.1.1"}],
+            [{"field": "192.169.1.1"}, {"field": None}, {"field": "192.168.1.1:80"}],
+        )
+
+    def test_python_callable_cidr_ipv6(self):
+        """test for IPv6 and non-octet aligned |cidr networks, tested as addresses"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                field|cidr:
+                    - 172.16.0.0/12
+                    - 2001:db8:ab0::/44
+            condition: sel
+        """
+        self.assert_matches(
+            yaml,
+            [
+                {"field": "172.31.255.255"},
+                {"field": "2001:db8:abf::1"},
+                {"field": "2001:DB8:AB0::"},
+            ],
+            [{"field": "172.32.0.0"}, {"field": "2001:db8:ac0::"}, {"field": "::"}],
+        )
+
+    def test_python_callable_nested_lists(self):
+        """test for dotted fields resolved through lists of objects"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                process.name: proc1
+            condition: sel
+        """
+        self.assert_matches(
+            yaml,
+            [
+                {"process": {"name": "proc1"}},
+                {"process": [{"name": "proc2"}, {"name": "proc1"}]},
+            ],
+            [
+                {"process": {"name": "proc2"}},
+                {"process": "proc1"},
+                {"process.name": "proc1"},
+            ],
+        )
+
+    def test_python_callable_shared_path_prefix(self):
+        """test that a path prefix shared by several fields is walked once per call"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel:
+                process.name|startswith: proc
+                process.parent.pid|lt: 10
+            filter:
+                process.parent.name: init
+            condition: sel and not filter
+        """
+        calls = []
+
+        def get(event, keys):
+            """record the path looked up"""
+            calls.append(keys)
+            return runtime.query_value(event, keys)
+
+        with mock.patch.dict(PythonCallableCompiler.helpers, {"_get": get}):
+            match = self.compile_rule(yaml)
+        event = {"process": {"name": "proc1", "parent": {"name": "x", "pid": 1}}}
+        self.assertIs(match(event), True)
+        self.assertListEqual(calls, [("process",)])
+        self.assertIs(
+            match({"process": [{"name": "proc1"}, {"parent": [{"pid": 1}, 2]}]}), True
+        )
+        self.assertIs(match(dict(event, process=[[event["process"]]])), False)
+        self.assertIs(match({"process": {"name": "proc1", "parent": "x"}}), False)
+
+    def test_python_callable_shared_subexpression(self):
+        """test that a repeated sub-expression is evaluated once per call"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            sel1:
+                fieldA|re: foo.*
+            sel2:
+                fieldB: b
+            sel3:
+                fieldC: c
+            condition: (sel1 and sel2) or (sel1 and sel3)
+        """
+        calls = []
+
+        def match(values, regex):
+            """record the values matched"""
+            calls.append(values)
+            return runtime.match(values, regex)
+
+        with mock.patch.dict(PythonCallableCompiler.helpers, {"_match": match}):
+            function = DictQueryBackend(simplify=False).convert(
+                SigmaCollection.from_yaml(yaml), "python_callable"
+            )[0]
+        self.assertIs(function({"fieldA": "foox", "fieldB": "x", "fieldC": "c"}), True)
+        self.assertEqual(len(calls), 1)
+        self.assertIs(function({"fieldA": "bar", "fieldB": "b", "fieldC": "c"}), False)
+        self.assertEqual(len(calls), 2)
+
+    def test_python_callable_keyword_not_supported(self):
+        """test that value-only conditions are rejected"""
+        yaml = """
+        title: Test
+        status: test
+        logsource:
+            category: test_category
+            product: test_product
+        detection:
+            keywords:
+                - foo
+            condition: keywords
+        """
+        with self.assertRaises(NotImplementedError):
+            self.compile_rule(yaml)
@@ -0,0 +1,90 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Regex Table Tests
+"""
+import re
+import unittest
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery import RuleSet
+from sigma.backends.dictquery.regex import RegexTable
+from sigma.backends.dictquery.regex import scoped
+
+RULES = """
+title: Rule One
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        fieldA|re|i: foo.*bar
+    condition: sel
+---
+title: Rule Two
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel1:
+        fieldA|re|i: foo.*bar
+    sel2:
+        fieldA|re: baz\\d
+    condition: 1 of sel*
+"""
+
+
+class RegexTableTest(unittest.TestCase):
+    """
+    RegexTableTest - Tests for the precompiled regular expression table
+    """
+
+    def test_regex_table_dedupes(self):
+        """test that each distinct pattern is compiled once for all rules"""
+        ruleset = RuleSet.from_collection(SigmaCollection.from_yaml(RULES))
+        self.assertEqual(len(ruleset.regexes), 2)
+        self.assertEqual(
+            ruleset.regexes.patterns["(?i)foo.*bar"].flags & re.IGNORECASE,
+            re.IGNORECASE,
+        )
+        self.assertListEqual(
+            ruleset.match({"fieldA": "FOO-BAR"}), ["Rule One", "Rule Two"]
+        )
+
+    def test_backend_regex_table(self):
+        """test that python_callable functions share the backend's table and honor flags"""
+        backend = DictQueryBackend()
+        functions = backend.convert(SigmaCollection.from_yaml(RULES), "python_callable")
+        self.assertEqual(len(backend.regexes), 2)
+        self.assertTrue(functions[0]({"fieldA": "Foo bar"}))
+        self.assertFalse(functions[0]({"fieldA": "x foo bar"}))
+
+    def test_scoped(self):
+        """test conversion of leading flag groups into scoped groups"""
+        self.assertEqual(scoped("(?i)abc"), "(?i:abc)")
+        self.assertEqual(scoped("abc"), "(?:abc)")
+
+    def test_regex_table_merge(self):
+        """test merged alternations report every matching pattern"""
+        table = RegexTable()
+        for pattern in ["(?i)foo", "f.o", "bar", "(a)\\1", "(?P<x>b)"]:
+            table.add("fieldA", pattern)
+        table.merge()
+        alternation, mergeable, separate = table.merged["fieldA"]
+        self.assertListEqual(mergeable, ["(?i)foo", "f.o", "bar"])
+        self.assertListEqual(separate, ["(a)\\1", "(?P<x>b)"])
+        self.assertListEqual(table.matching("fieldA", "foo"), ["(?i)foo", "f.o"])
+        self.assertListEqual(table.matching("fieldA", "FOO"), ["(?i)foo"])
+        self.assertListEqual(table.matching("fieldA", "bart"), ["bar", "(?P<x>b)"])
+        self.assertListEqual(table.matching("fieldA", "aa"), ["(a)\\1"])
+        self.assertListEqual(table.matching("fieldA", "zzz"), [])
+        self.assertListEqual(table.matching("fieldA", None), [])
+
+    def test_regex_table_unmerged_field(self):
+        """test matching on fields without a merged alternation"""
+        table = RegexTable.from_rules([], merge=True)
+        table.add("fieldB", "a+")
+        self.assertListEqual(table.matching("fieldB", "aa"), ["a+"])
+        self.assertListEqual(table.matching("fieldC", "aa"), [])
@@ -0,0 +1,156 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Rule Set Tests
+"""
+import unittest
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import DictQueryBackend
+from sigma.backends.dictquery import RuleSet
+from sigma.backends.dictquery.ruleset import RuleSetCompiler
+
+RULES = """
+title: Rule One
+id: 9f3e2b5c-1d4a-4c1e-9a57-000000000001
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname:
+            - eventone
+            - eventtwo
+        username|contains: test.user
+    condition: sel
+---
+title: Rule Two
+id: 9f3e2b5c-1d4a-4c1e-9a57-000000000002
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        eventname:
+            - eventone
+            - eventtwo
+    exclude:
+        process.pid|lt: 10
+    condition: sel and not exclude
+---
+title: Rule Three
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        process.name|startswith: proc
+    condition: sel
+"""
+
+
+class RuleSetTest(unittest.TestCase):
+    """
+    RuleSetTest - Tests for the ruleset output format
+    """
+
+    def setUp(self):
+        """
+        setUp - convert the test collection into a rule set
+        """
+        self.collection = SigmaCollection.from_yaml(RULES)
+        self.ruleset = DictQueryBackend().convert(self.collection, "ruleset")
+
+    def test_ruleset_rule_ids(self):
+        """test that rules are identified by id, or by title without one"""
+        self.assertIsInstance(self.ruleset, RuleSet)
+        self.assertListEqual(
+            self.ruleset.rule_ids,
+            [
+                "9f3e2b5c-1d4a-4c1e-9a57-000000000001",
+                "9f3e2b5c-1d4a-4c1e-9a57-000000000002",
+                "Rule Three",
+            ],
+        )
+
+    def test_ruleset_match(self):
+        """test that every matching rule is returned in collection order"""
+        event = {
+            "eventname": "eventone",
+            "username": "test.user1",
+            "process": {"name": "proc1", "pid": 20},
+        }
+        self.assertListEqual(
+            self.ruleset.match(event),
+            [
+                "9f3e2b5c-1d4a-4c1e-9a57-000000000001",
+                "9f3e2b5c-1d4a-4c1e-9a57-000000000002",
+                "Rule Three",
+            ],
+        )
+        event["process"]["pid"] = 5
+        event["username"] = "other"
+        self.assertListEqual(self.ruleset.match(event), ["Rule Three"])
+        self.assertListEqual(self.ruleset.match({}), [])
+
+    def test_ruleset_agrees_with_python_callable(self):
+        """test that the rule set matches the same rules as the per-rule functions"""
+        functions = DictQueryBackend().convert(self.collection, "python_callable")
+        events = [
+            {"eventname": "eventtwo", "username": "xtest.userx"},
+            {"eventname": "eventtwo", "process": {"pid": 3}},
+            {"eventname": "other", "process": [{"name": "x"}, {"name": "procA"}]},
+        ]
+        for event in events:
+            with self.subTest(event=event):
+                expected = [
+                    rule_id
+                    for rule_id, match in zip(self.ruleset.rule_ids, functions)
+                    if match(event)
+                ]
+                self.assertListEqual(self.ruleset.match(event), expected)
+
+    def test_ruleset_shares_subexpressions(self):
+        """test that repeated fields and selections are evaluated once"""
+        compiler = RuleSetCompiler()
+        compiler.share([expr for _, expr in self.ruleset.rules])
+        self.assertIn("eventname", compiler.fields)
+        self.assertEqual(len(compiler.nodes), 1)
+
+    def test_ruleset_case_insensitive(self):
+        """test case-insensitive matching, including the prefilters"""
+        event = {"eventname": "EventOne", "username": "Test.User1"}
+        self.assertListEqual(self.ruleset.match(event), [])
+        ruleset = RuleSet.from_collection(
+            self.collection, substring_prefilter=True, case_sensitive=False
+        )
+        self.assertListEqual(
+            ruleset.match(event),
+            [
+                "9f3e2b5c-1d4a-4c1e-9a57-000000000001",
+                "9f3e2b5c-1d4a-4c1e-9a57-000000000002",
+            ],
+        )
+        self.assertListEqual(
+            ruleset.match({"process": {"name": "PROC"}}), ["Rule Three"]
+        )
+
+    def test_ruleset_seeded_fields(self):
+        """test that fields resolved by the prefilters are not looked up again"""
+        compiler = RuleSetCompiler()
+        match = compiler.compile_rules(
+            self.ruleset.rule_ids,
+            [expr for _, expr in self.ruleset.rules],
+            seeded={"eventname"},
+        )
+        event = {"eventname": "other", "username": "test.user1"}
+        hits = match(event, set(), {("eventname",): ["eventone"]})
+        self.assertListEqual(hits, self.ruleset.rule_ids[:2])
+        self.assertListEqual(match(event, set(), {}), [])
+
+    def test_ruleset_from_collection(self):
+        """test the from_collection shortcut"""
+        ruleset = RuleSet.from_collection(self.collection)
+        self.assertEqual(len(ruleset), 3)
@@ -0,0 +1,180 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Streaming Matcher Tests
+"""
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from contextlib import redirect_stdout
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import RuleSet
+from sigma.backends.dictquery.stream import is_gzip
+from sigma.backends.dictquery.stream import main
+from sigma.backends.dictquery.stream import match_source
+from sigma.backends.dictquery.stream import open_events
+from sigma.backends.dictquery.stream import read_events
+
+RULE_A = """
+title: Rule A
+id: 5013332f-8a70-4e04-bcc1-06a98a2cca2e
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        fieldA: valueA
+    condition: sel
+"""
+
+RULE_B = """
+title: Rule B
+id: 6013332f-8a70-4e04-bcc1-06a98a2cca2e
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        fieldB|contains: foo
+    condition: sel
+"""
+
+EVENTS = (
+    b'{"fieldA": "valueA"}\n'
+    b"\n"
+    b'{"fieldB": "xfoox", "fieldA": "valueA"}\n'
+    b'{"fieldA": "other"}\n'
+)
+
+
+class StreamTest(unittest.TestCase):
+    """
+    StreamTest - Tests for the streaming JSON lines matcher
+    """
+
+    def setUp(self):
+        """
+        setUp - build a rule set and a temporary directory for event files
+        """
+        self.ruleset = RuleSet.from_collection(
+            SigmaCollection.from_yaml(RULE_A + "---" + RULE_B)
+        )
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name: str, content: bytes) -> str:
+        """
+        path - write content to a file in the temporary directory and return its path
+        """
+        path = os.path.join(self.directory.name, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_read_events_offsets(self):
+        """test that events are read with the byte offset of their line"""
+        self.assertListEqual(
+            [offset for offset, _ in read_events(io.BytesIO(EVENTS))], [0, 22, 62]
+        )
+
+    def test_read_events_invalid(self):
+        """test that invalid lines raise with their offset unless skipped"""
+        stream = io.BytesIO(b'{"a": 1}\nnot json\n{"a": 2}\n')
+        with self.assertRaisesRegex(ValueError, "offset 9"):
+            list(read_events(stream))
+        stream.seek(0)
+        self.assertListEqual(
+            list(read_events(stream, skip_invalid=True)),
+            [(0, {"a": 1}), (18, {"a": 2})],
+        )
+
+    def test_match_source(self):
+        """test for matching plain, gzip compressed and in-memory sources"""
+        expected = [
+            (0, "5013332f-8a70-4e04-bcc1-06a98a2cca2e"),
+            (22, "5013332f-8a70-4e04-bcc1-06a98a2cca2e"),
+            (22, "6013332f-8a70-4e04-bcc1-06a98a2cca2e"),
+        ]
+        self.assertListEqual(
+            list(match_source(self.ruleset, self.path("events.jsonl", EVENTS))),
+            expected,
+        )
+        self.assertListEqual(
+            list(
+                match_source(
+                    self.ruleset, self.path("events.jsonl.gz", gzip.compress(EVENTS))
+                )
+            ),
+            expected,
+        )
+        self.assertListEqual(
+            list(match_source(self.ruleset, io.BytesIO(EVENTS))), expected
+        )
+
+    def test_is_gzip(self):
+        """test for detecting gzip compressed sources without consuming them"""
+        stream = io.BytesIO(gzip.compress(EVENTS))
+        self.assertTrue(is_gzip(stream))
+        self.assertEqual(stream.tell(), 0)
+        self.assertFalse(is_gzip(io.BufferedReader(io.BytesIO(EVENTS))))
+        with open_events(io.BytesIO(gzip.compress(EVENTS))) as events:
+            self.assertEqual(events.read(), EVENTS)
+
+    def test_main(self):
+        """test for the command line matcher"""
+        rules = os.path.join(self.directory.name, "rules")
+        os.mkdir(rules)
+        self.path(os.path.join("rules", "a.yml"), RULE_A.encode())
+        self.path(os.path.join("rules", "b.yml"), RULE_B.encode())
+        events = self.path("events.jsonl", EVENTS + b"not json\n")
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(main([rules, events, "--skip-invalid"]), 0)
+        self.assertListEqual(
+            [json.loads(line) for line in out.getvalue().splitlines()],
+            [
+                {
+                    "source": events,
+                    "offset": 0,
+                    "rule": "5013332f-8a70-4e04-bcc1-06a98a2cca2e",
+                },
+                {
+                    "source": events,
+                    "offset": 22,
+                    "rule": "5013332f-8a70-4e04-bcc1-06a98a2cca2e",
+                },
+                {
+                    "source": events,
+                    "offset": 22,
+                    "rule": "6013332f-8a70-4e04-bcc1-06a98a2cca2e",
+                },
+            ],
+        )
+
+    def test_main_profile(self):
+        """test for writing the profile of a command line run"""
+        rules = self.path("rule.yml", RULE_B.encode())
+        events = self.path("events.jsonl", EVENTS)
+        for name in ("profile.json", "profile.prom"):
+            profile = os.path.join(self.directory.name, name)
+            argv = [rules, events, "--profile", profile, "--profile-sample", "1"]
+            with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()) as err:
+                self.assertEqual(main(argv), 0)
+            self.assertIn("6013332f-8a70-4e04-bcc1-06a98a2cca2e", err.getvalue())
+            with open(profile) as f:
+                text = f.read()
+            if name.endswith(".json"):
+                rule = json.loads(text)["rules"]["6013332f-8a70-4e04-bcc1-06a98a2cca2e"]
+                self.assertEqual((rule["evaluations"], rule["hits"]), (3, 1))
+            else:
+                self.assertIn('dictquery_predicate_hits_total{op="contains"} 1', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Unqork Security - Threat Detection and Response - PySigma Dictquery Backend Substring Prefilter Tests
+"""
+import unittest
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.dictquery import RuleSet
+from sigma.backends.dictquery.expression import CONTAINS
+from sigma.backends.dictquery.expression import EQ
+from sigma.backends.dictquery.expression import LIKE
+from sigma.backends.dictquery.expression import STARTSWITH
+from sigma.backends.dictquery.expression import And
+from sigma.backends.dictquery.expression import Or
+from sigma.backends.dictquery.expression import Predicate
+from sigma.backends.dictquery.substring import AhoCorasick
+from sigma.backends.dictquery.substring import SubstringPrefilter
+from sigma.backends.dictquery.substring import glob_literal
+from sigma.backends.dictquery.substring import required_substrings
+
+RULES = """
+title: Whoami
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        CommandLine|contains:
+            - whoami
+            - net user
+    condition: sel
+---
+title: Powershell
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        Image|endswith: powershell.exe
+        CommandLine|startswith: '-enc'
+    condition: sel
+---
+title: Exact
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        Image: cmd.exe
+    condition: sel
+"""
+
+
+class SubstringPrefilterTest(unittest.TestCase):
+    """
+    SubstringPrefilterTest - Tests for the Aho-Corasick substring prefilter
+    """
+
+    def test_glob_literal(self):
+        """test extraction of the longest literal of a LIKE pattern"""
+        self.assertEqual(glob_literal("*foo*"), "foo")
+        self.assertEqual(glob_literal("foo*"), "foo")
+        self.assertEqual(glob_literal("a*bcd?e"), "bcd")
+        self.assertIsNone(glob_literal("*"))
+        self.assertIsNone(glob_literal("*[ab]*"))
+
+    def test_required_substrings(self):
+        """test which expressions carry a substring requirement"""
+        foo = Predicate(LIKE, "a", "*foo*")
+        bar = Predicate(LIKE, "b", "bar*")
+        eq = Predicate(EQ, "c", "x")
+        self.assertEqual(required_substrings(And((eq, foo))), {("a", "foo")})
+        self.assertEqual(
+            required_substrings(Or((foo, bar))), {("a", "foo"), ("b", "bar")}
+        )
+        self.assertIsNone(required_substrings(Or((foo, eq))))
+        prefix = Predicate(STARTSWITH, "d", "baz")
+        self.assertEqual(required_substrings(And((eq, prefix))), {("d", "baz")})
+        self.assertIsNone(required_substrings(Predicate(CONTAINS, "d", "")))
+
+    def test_aho_corasick(self):
+        """test that native and pure Python automata find all overlapping words"""
+        words = ["he", "she", "his", "hers", "s"]
+        for native in (True, False):
+            with self.subTest(native=native):
+                automaton = AhoCorasick(words, native=native)
+                self.assertEqual(automaton.search("ushers"), {"he", "she", "hers", "s"})
+                self.assertEqual(automaton.search("xyz"), set())
+                self.assertEqual(AhoCorasick([], native=native).search("abc"), set())
+
+    def test_substring_prefilter_candidates(self):
+        """test candidate rules for events"""
+        prefilter = SubstringPrefilter.from_rules(
+            [
+                ("whoami", Predicate(LIKE, "CommandLine", "*whoami*")),
+                ("net", Predicate(LIKE, "CommandLine", "*net user*")),
+                ("exact", Predicate(EQ, "Image", "cmd.exe")),
+            ]
+        )
+        self.assertListEqual(prefilter.unindexed, ["exact"])
+        self.assertEqual(
+            prefilter.candidates({"CommandLine": "whoami && net user x"}),
+            {"whoami", "net"},
+        )
+        self.assertEqual(prefilter.candidates({"CommandLine": 1}), set())
+
+    def test_substring_prefilter_ruleset(self):
+        """test that a substring prefiltered rule set matches like an unfiltered one"""
+        collection = SigmaCollection.from_yaml(RULES)
+        filtered = RuleSet.from_collection(collection, substring_prefilter=True)
+        unfiltered = RuleSet.from_collection(collection, prefilter=False)
+        self.assertListEqual(filtered.substring_prefilter.unindexed, [])
+        events = [
+            {"CommandLine": "cmd /c whoami", "Image": "cmd.exe"},
+            {"CommandLine": "-enc AAAA", "Image": "C:\\\\powershell.exe"},
+            {"CommandLine": "-enc whoami", "Image": "pwsh.exe"},
+            {"CommandLine": None},
+        ]
+        for event in events:
+            with self.subTest(event=event):
+                self.assertListEqual(filtered.match(event), unfiltered.match(event))
+        self.assertListEqual(filtered.match(events[0]), ["Whoami", "Exact"])